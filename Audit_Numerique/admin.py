@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     Utilisateur, Cooperative, Membre, Cotisation,
     Pret, Remboursement, Transaction, Message, 
-    Notification, Audit, Evenement
+    Notification, Audit, Evenement, BilanCooperative
 )
 
 @admin.register(Utilisateur)
@@ -23,6 +23,12 @@ class CooperativeAdmin(admin.ModelAdmin):
     list_filter = ('date_creation',)
     search_fields = ('nom', 'description')
 
+@admin.register(BilanCooperative)
+class BilanCooperativeAdmin(admin.ModelAdmin):
+    list_display = ('cooperative', 'nb_membres', 'total_cotisations', 'total_prets',
+                    'total_remboursements', 'solde', 'date_mise_a_jour')
+    search_fields = ('cooperative__nom',)
+
 @admin.register(Membre)
 class MembreAdmin(admin.ModelAdmin):
     list_display = ('utilisateur', 'cooperative', 'date_adhesion', 'actif')
@@ -37,9 +43,10 @@ class CotisationAdmin(admin.ModelAdmin):
 
 @admin.register(Pret)
 class PretAdmin(admin.ModelAdmin):
-    list_display = ('membre', 'montant', 'taux_interet', 'date_demande', 'date_echeance', 'statut')
+    list_display = ('membre', 'montant', 'solde_restant', 'taux_interet', 'date_demande', 'date_echeance', 'statut')
     list_filter = ('statut', 'date_demande', 'date_echeance')
     search_fields = ('membre__utilisateur__username', 'motif')
+    readonly_fields = ('montant_rembourse', 'solde_restant')
 
 @admin.register(Remboursement)
 class RemboursementAdmin(admin.ModelAdmin):
@@ -11,23 +11,19 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from .routing import websocket_urlpatterns
-
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Audit_Numerique.settings")
 
-"""application = get_asgi_application()"""
-
- # adapte 'app' à ton nom d’app
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')  # adapte
-
+# initialise Django (apps, modèles) avant d'importer les consumers et la vue chat async
 django_asgi_app = get_asgi_application()
 
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from .middleware import JWTAuthMiddleware  # noqa: E402
+from .routing import websocket_urlpatterns  # noqa: E402
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
-        URLRouter(websocket_urlpatterns)
+        JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
     ),
 })
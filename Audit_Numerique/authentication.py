@@ -0,0 +1,73 @@
+# authentication.py
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Cooperative, Membre, Utilisateur
+
+# champs de l'Utilisateur portés par le jeton : ceux que lisent les permissions
+CHAMPS_JETON = ('username', 'role', 'is_staff', 'is_superuser', 'is_active')
+
+
+def claims_utilisateur(user):
+    """Claims d'autorisation posés à l'émission : champs de CHAMPS_JETON et coopératives (membre actif ou admin)."""
+    claims = {champ: getattr(user, champ) for champ in CHAMPS_JETON}
+    claims['cooperatives'] = sorted(cooperatives_de(user))
+    return claims
+
+
+def _avec_claims(token, user):
+    for claim, valeur in claims_utilisateur(user).items():
+        token[claim] = valeur
+    return token
+
+
+def emettre_jetons(user):
+    """Paire refresh/access de `user` (login, register) ; le jeton d'accès hérite des claims."""
+    refresh = _avec_claims(RefreshToken.for_user(user), user)
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
+def rafraichir_acces(raw_refresh):
+    """Nouveau jeton d'accès, claims relus en base : un rôle modifié est pris en compte au prochain refresh."""
+    refresh = RefreshToken(raw_refresh)
+    user = Utilisateur.objects.get(pk=refresh[api_settings.USER_ID_CLAIM], is_active=True)
+    return str(_avec_claims(refresh, user).access_token)
+
+
+def utilisateur_depuis_jeton(token):
+    """
+    Utilisateur reconstruit sans requête à partir des claims : une vraie instance dont seuls
+    id et CHAMPS_JETON sont chargés. Le premier autre champ lu charge le reste (Utilisateur.refresh_from_db).
+    """
+    valeurs = {champ: token[champ] for champ in CHAMPS_JETON}
+    valeurs['id'] = Utilisateur._meta.pk.to_python(token[api_settings.USER_ID_CLAIM])  # simplejwt le sérialise en chaîne
+    # from_db attend les valeurs dans l'ordre des champs du modèle
+    champs = [f.attname for f in Utilisateur._meta.concrete_fields if f.attname in valeurs]
+    user = Utilisateur.from_db(None, champs, [valeurs[champ] for champ in champs])
+    user.depuis_jeton = True
+    user.cooperatives_jeton = set(token.get('cooperatives', ()))
+    return user
+
+
+def cooperatives_de(user):
+    """Coopératives où `user` est membre actif ou administrateur : claims du jeton, sinon base."""
+    cooperatives = getattr(user, 'cooperatives_jeton', None)
+    if cooperatives is not None:
+        return set(cooperatives)
+    cooperatives = set(Membre.objects.filter(utilisateur=user, actif=True).values_list('cooperative_id', flat=True))
+    cooperatives.update(Cooperative.objects.filter(admin=user).values_list('pk', flat=True))
+    return cooperatives
+
+
+class JWTClaimsAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication sans lecture de l'utilisateur : les jetons émis par emettre_jetons portent
+    rôle, statut et coopératives. Les jetons plus anciens (sans claim `role`) passent par la base.
+    La durée de vie courte du jeton d'accès borne le délai de prise en compte d'un changement de rôle.
+    """
+
+    def get_user(self, validated_token):
+        if 'role' not in validated_token:
+            return super().get_user(validated_token)
+        return utilisateur_depuis_jeton(validated_token)
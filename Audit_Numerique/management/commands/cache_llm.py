@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Sum
+
+from Audit_Numerique.models import ReponseLLM
+from Audit_Numerique.utils.llm_cache import get_response_cache
+
+
+class Command(BaseCommand):
+    help = "Statistiques du cache des réponses LLM (taux de succès, latence économisée) ; --purger pour l'élaguer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--purger", action="store_true",
+                            help="Supprime les entrées expirées et les moins récemment utilisées au-delà de la limite.")
+
+    def handle(self, *args, **options):
+        if options["purger"]:
+            self.stdout.write(f"{get_response_cache().purge()} entrée(s) supprimée(s).")
+
+        stats = ReponseLLM.objects.aggregate(
+            entrees=Count("pk"),
+            succes=Sum("nb_utilisations"),
+            economise_ms=Sum(ExpressionWrapper(F("nb_utilisations") * F("duree_ms"), output_field=IntegerField())),
+        )
+        succes = stats["succes"] or 0
+        # chaque entrée correspond à un appel manqué qui a dû aller jusqu'au fournisseur
+        appels = succes + stats["entrees"]
+        self.stdout.write(
+            f"Entrées : {stats['entrees']}\n"
+            f"Succès (niveau base) : {succes}\n"
+            f"Taux de succès : {succes / appels if appels else 0:.1%}\n"
+            f"Latence économisée : {(stats['economise_ms'] or 0) / 1000:.1f}s"
+        )
@@ -0,0 +1,19 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from Audit_Numerique.models import QuotaLLM
+from Audit_Numerique.utils.llm_limits import get_rate_limiter, llm_metrics
+
+
+class Command(BaseCommand):
+    help = "État partagé des appels LLM : jetons disponibles, disjoncteur, appelants en attente."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fermer", action="store_true",
+                            help="Referme le disjoncteur et remet les échecs consécutifs à zéro.")
+
+    def handle(self, *args, **options):
+        if options["fermer"]:
+            QuotaLLM.objects.filter(nom=get_rate_limiter().name).update(echecs=0, ouvert_jusqua=None)
+        self.stdout.write(json.dumps(llm_metrics(), indent=2, ensure_ascii=False))
@@ -0,0 +1,113 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from Audit_Numerique.models import Cooperative, Cotisation, Membre, ScoreAnomalie, Transaction, Utilisateur
+
+ENDPOINTS = {
+    "transactions": "/transactions/",
+    "cotisations": "/cotisations/",
+}
+
+
+def contenu(corps):
+    """Données d'une réponse, sans les liens de pagination (ils portent le paramètre fast=)."""
+    data = json.loads(corps)
+    return data["results"] if isinstance(data, dict) and "results" in data else data
+
+
+def percentile(valeurs, p):
+    ordonnees = sorted(valeurs)
+    return ordonnees[min(len(ordonnees) - 1, int(round(p / 100 * (len(ordonnees) - 1))))]
+
+
+class Command(BaseCommand):
+    help = ("Compare le chemin de lecture rapide (values() + orjson) au chemin serializer sur les "
+            "listes volumineuses : requêtes par seconde, p50/p99, et identité des réponses.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requetes", type=int, default=200, help="Requêtes mesurées par chemin et endpoint.")
+        parser.add_argument("--echauffement", type=int, default=10, help="Requêtes non mesurées avant chaque série.")
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Insère N transactions et N cotisations (annulées en fin de commande).")
+        parser.add_argument("--params", default="", help="Query string ajoutée aux deux chemins, ex. page_size=500.")
+        parser.add_argument("--endpoint", action="append", choices=sorted(ENDPOINTS),
+                            help="Endpoint à mesurer (répétable) ; par défaut tous.")
+
+    def handle(self, *args, **options):
+        client = Client()
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            if options["seed"]:
+                self.semer(options["seed"])
+            for nom in options["endpoint"] or sorted(ENDPOINTS):
+                url = ENDPOINTS[nom] + "?" + options["params"]
+                rapide = self.mesurer(client, url + "&fast=1", options)
+                serializer = self.mesurer(client, url + "&fast=0", options)
+                if contenu(rapide["corps"]) != contenu(serializer["corps"]):
+                    raise CommandError(f"{nom} : les deux chemins ne renvoient pas la même réponse.")
+                self.stdout.write(f"{nom} ({rapide['octets']} octets, réponses identiques)")
+                for chemin, mesure in (("serializer", serializer), ("rapide", rapide)):
+                    self.stdout.write(
+                        f"  {chemin:<10} {mesure['rps']:8.1f} req/s   p50 {mesure['p50']:7.2f} ms"
+                        f"   p99 {mesure['p99']:7.2f} ms"
+                    )
+                self.stdout.write(self.style.SUCCESS(
+                    f"  gain x{rapide['rps'] / serializer['rps']:.2f} en débit, "
+                    f"p99 {serializer['p99'] / rapide['p99']:.2f} fois plus bas"
+                ))
+            transaction.set_rollback(True)
+
+    def mesurer(self, client, url, options):
+        for _ in range(options["echauffement"]):
+            self.lire(client, url)
+        durees = []
+        debut = time.perf_counter()
+        for _ in range(options["requetes"]):
+            t0 = time.perf_counter()
+            corps = self.lire(client, url)
+            durees.append((time.perf_counter() - t0) * 1000)
+        total = time.perf_counter() - debut
+        return {
+            "rps": options["requetes"] / total, "p50": statistics.median(durees), "p99": percentile(durees, 99),
+            "corps": corps, "octets": len(corps),
+        }
+
+    def lire(self, client, url):
+        response = client.get(url, HTTP_ACCEPT="application/json")
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} : {response.status_code}")
+        return response.content
+
+    def semer(self, n):
+        maintenant = timezone.now()
+        cooperatives = Cooperative.objects.bulk_create(
+            Cooperative(nom=f"bench-{i}", description="") for i in range(3)
+        )
+        utilisateurs = Utilisateur.objects.bulk_create(
+            Utilisateur(username=f"bench-{i}", first_name="Membre", last_name=str(i)) for i in range(max(n // 50, 3))
+        )
+        membres = Membre.objects.bulk_create(
+            Membre(utilisateur=u, cooperative=cooperatives[i % len(cooperatives)]) for i, u in enumerate(utilisateurs)
+        )
+        Cotisation.objects.bulk_create(
+            Cotisation(membre=membres[i % len(membres)], montant=1000 + i % 500,
+                       statut=("validee", "en_attente")[i % 2], date_paiement=maintenant - timedelta(minutes=i))
+            for i in range(n)
+        )
+        transactions = Transaction.objects.bulk_create(
+            Transaction(membre=membres[i % len(membres)], montant=i % 500 + 0.5,
+                        type=Transaction.TYPE_CHOICES[i % len(Transaction.TYPE_CHOICES)][0],
+                        description="Mesure de lecture", reference=f"BENCH-{i}",
+                        date_transaction=maintenant - timedelta(minutes=i))
+            for i in range(n)
+        )
+        ScoreAnomalie.objects.bulk_create(
+            ScoreAnomalie(transaction=t, score=0.9, motifs=["montant_atypique"]) for t in transactions[::10]
+        )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Audit_Numerique.models import Cooperative, BilanCooperative
+
+
+class Command(BaseCommand):
+    help = "Reconstruit (ou vérifie avec --verifier) la table des bilans à partir des écritures."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cooperative", type=int, action="append",
+                            help="Limiter à une coopérative (répétable).")
+        parser.add_argument("--verifier", action="store_true",
+                            help="Compare sans écrire ; échoue si un bilan diverge.")
+
+    def handle(self, *args, **options):
+        cooperatives = Cooperative.objects.order_by("pk").values_list("pk", flat=True)
+        if options["cooperative"]:
+            cooperatives = cooperatives.filter(pk__in=options["cooperative"])
+        stockes = {
+            b["cooperative_id"]: b
+            for b in BilanCooperative.objects.filter(cooperative_id__in=cooperatives).values()
+        }
+
+        ecarts = 0
+        for cooperative_id in cooperatives:
+            attendu = BilanCooperative.calculer(cooperative_id)
+            stocke = stockes.get(cooperative_id)
+            differences = {
+                champ: (stocke[champ] if stocke else None, valeur)
+                for champ, valeur in attendu.items()
+                if not stocke or stocke[champ] != valeur
+            }
+            if differences:
+                ecarts += 1
+                self.stdout.write(f"Coopérative {cooperative_id} : {differences}")
+            if not options["verifier"]:
+                BilanCooperative.objects.update_or_create(cooperative_id=cooperative_id, defaults=attendu)
+
+        if options["verifier"]:
+            if ecarts:
+                raise CommandError(f"{ecarts} bilan(s) divergent(s).")
+            self.stdout.write(self.style.SUCCESS("Tous les bilans sont cohérents."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(cooperatives)} bilan(s) reconstruit(s), {ecarts} corrigé(s)."
+            ))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Q
+
+from Audit_Numerique.models import Utilisateur, CompteurNonLus
+
+
+class Command(BaseCommand):
+    help = "Reconstruit (ou vérifie avec --verifier) les compteurs de notifications et messages non lus."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--utilisateur", type=int, action="append",
+                            help="Limiter à un utilisateur (répétable).")
+        parser.add_argument("--verifier", action="store_true",
+                            help="Compare sans écrire ; échoue si un compteur diverge.")
+
+    def handle(self, *args, **options):
+        utilisateurs = Utilisateur.objects.order_by("pk")
+        if options["utilisateur"]:
+            utilisateurs = utilisateurs.filter(pk__in=options["utilisateur"])
+        # deux agrégats indépendants : une sous-requête chacun plutôt qu'une jointure croisée
+        attendus = {
+            pk: {"notifications": notifications, "messages": 0}
+            for pk, notifications in utilisateurs.annotate(
+                n=Count("notifications", filter=Q(notifications__lue=False))
+            ).values_list("pk", "n")
+        }
+        for pk, messages in utilisateurs.annotate(
+            n=Count("messages_recus", filter=Q(messages_recus__lu=False))
+        ).values_list("pk", "n"):
+            attendus[pk]["messages"] = messages
+        stockes = {
+            c["utilisateur_id"]: c
+            for c in CompteurNonLus.objects.filter(utilisateur_id__in=attendus).values(
+                "utilisateur_id", "notifications", "messages"
+            )
+        }
+
+        ecarts = 0
+        for pk, attendu in attendus.items():
+            stocke = stockes.get(pk)
+            if stocke is None and not any(attendu.values()):
+                continue  # pas encore de ligne : elle sera construite à la première lecture
+            if stocke is None or any(stocke[champ] != valeur for champ, valeur in attendu.items()):
+                ecarts += 1
+                self.stdout.write(f"Utilisateur {pk} : stocké {stocke and {k: stocke[k] for k in attendu}}, "
+                                  f"attendu {attendu}")
+                if not options["verifier"]:
+                    CompteurNonLus.objects.update_or_create(utilisateur_id=pk, defaults=attendu)
+
+        if options["verifier"]:
+            if ecarts:
+                raise CommandError(f"{ecarts} compteur(s) divergent(s).")
+            self.stdout.write(self.style.SUCCESS("Tous les compteurs de non-lus sont cohérents."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{ecarts} compteur(s) corrigé(s)."))
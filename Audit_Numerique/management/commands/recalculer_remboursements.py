@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from Audit_Numerique.models import Pret, Remboursement
+
+
+def cumul_remboursements():
+    """Somme des remboursements du prêt courant, en sous-requête (chemin lent, sert de référence)."""
+    return Coalesce(
+        Subquery(
+            Remboursement.objects.filter(pret=OuterRef("pk"))
+            .order_by().values("pret").annotate(total=Sum("montant")).values("total")
+        ),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class Command(BaseCommand):
+    help = ("Reconstruit (ou vérifie avec --verifier) montant_rembourse et solde_restant des prêts "
+            "à partir des remboursements.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pret", type=int, action="append", help="Limiter à un prêt (répétable).")
+        parser.add_argument("--verifier", action="store_true",
+                            help="Compare sans écrire ; échoue si un prêt diverge.")
+
+    def handle(self, *args, **options):
+        prets = Pret.objects.order_by("pk")
+        if options["pret"]:
+            prets = prets.filter(pk__in=options["pret"])
+
+        ecarts = []
+        lignes = prets.annotate(attendu=cumul_remboursements()).values_list(
+            "pk", "montant", "montant_rembourse", "solde_restant", "attendu"
+        )
+        for pk, montant, rembourse, solde, attendu in lignes.iterator(chunk_size=2000):
+            if rembourse != attendu or solde != montant - attendu:
+                ecarts.append(pk)
+                self.stdout.write(
+                    f"Prêt {pk} : remboursé {rembourse} (attendu {attendu}), "
+                    f"solde {solde} (attendu {montant - attendu})"
+                )
+
+        if options["verifier"]:
+            if ecarts:
+                raise CommandError(f"{len(ecarts)} prêt(s) divergent(s).")
+            self.stdout.write(self.style.SUCCESS("Tous les cumuls de remboursement sont cohérents."))
+            return
+
+        with transaction.atomic():
+            for debut in range(0, len(ecarts), 1000):
+                lot = Pret.objects.filter(pk__in=ecarts[debut:debut + 1000])
+                lot.update(montant_rembourse=cumul_remboursements())
+                lot.update(solde_restant=F("montant") - F("montant_rembourse"), date_mise_a_jour=timezone.now())
+        self.stdout.write(self.style.SUCCESS(f"{len(ecarts)} prêt(s) corrigé(s)."))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Audit_Numerique.models import SerieFinanciere
+
+
+class Command(BaseCommand):
+    help = ("Reconstruit (ou vérifie avec --verifier) les séries journalières et mensuelles "
+            "du tableau de bord à partir des cotisations, prêts et remboursements.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cooperative", type=int, action="append",
+                            help="Limiter à une coopérative (répétable).")
+        parser.add_argument("--verifier", action="store_true",
+                            help="Compare sans écrire ; échoue si une période diverge.")
+
+    def handle(self, *args, **options):
+        filtres, stockees = {}, SerieFinanciere.objects.all()
+        if options["cooperative"]:
+            filtres = {"cooperative__in": options["cooperative"]}
+            stockees = stockees.filter(cooperative_id__in=options["cooperative"])
+
+        attendues = {}
+        for type_, _ in SerieFinanciere.TYPE_CHOICES:
+            for granularite, _ in SerieFinanciere.GRANULARITE_CHOICES:
+                for ligne in SerieFinanciere.calculer(type_, granularite, **filtres):
+                    cle = (ligne["cooperative"], granularite, ligne["periode"], type_)
+                    attendues[cle] = (ligne["total"], ligne["nombre"])
+        actuelles = {
+            (s["cooperative_id"], s["granularite"], s["periode"], s["type"]): (s["total"], s["nombre"])
+            for s in stockees.values("cooperative_id", "granularite", "periode", "type", "total", "nombre")
+            if s["total"] or s["nombre"]
+        }
+
+        ecarts = 0
+        for cle in sorted(attendues.keys() | actuelles.keys(), key=str):
+            if attendues.get(cle) != actuelles.get(cle):
+                ecarts += 1
+                self.stdout.write(f"{cle} : {actuelles.get(cle)} -> {attendues.get(cle)}")
+
+        if options["verifier"]:
+            if ecarts:
+                raise CommandError(f"{ecarts} période(s) divergente(s).")
+            self.stdout.write(self.style.SUCCESS("Toutes les séries sont cohérentes."))
+            return
+
+        with transaction.atomic():
+            stockees.delete()
+            SerieFinanciere.objects.bulk_create(
+                SerieFinanciere(cooperative_id=cooperative_id, granularite=granularite, periode=periode,
+                                type=type_, total=total, nombre=nombre)
+                for (cooperative_id, granularite, periode, type_), (total, nombre) in attendues.items()
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(attendues)} période(s) reconstruite(s), {ecarts} corrigée(s)."
+        ))
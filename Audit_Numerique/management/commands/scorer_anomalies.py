@@ -0,0 +1,81 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from Audit_Numerique.models import Cooperative, Membre, Transaction, Utilisateur
+from Audit_Numerique.utils.anomalies import (
+    default_threshold, load_arrays, save_scores, score_arrays, score_transactions,
+)
+
+
+class Command(BaseCommand):
+    help = ("Calcule les scores d'anomalie de toutes les transactions, ou mesure la chaîne complète "
+            "(lecture, scoring, écriture des scores) sur N transactions synthétiques avec --benchmark N.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seuil", type=float, default=None)
+        parser.add_argument("--benchmark", type=int, metavar="N",
+                            help="Insère N transactions synthétiques, les score deux fois en base, puis annule tout.")
+
+    def handle(self, *args, **options):
+        seuil = default_threshold() if options["seuil"] is None else options["seuil"]
+        if options["benchmark"]:
+            return self.benchmark(options["benchmark"], seuil)
+        debut = time.perf_counter()
+        nb = score_transactions(threshold=seuil)
+        self.stdout.write(self.style.SUCCESS(
+            f"{nb} transaction(s) au-dessus du seuil {seuil} ({time.perf_counter() - debut:.1f}s)."
+        ))
+
+    def benchmark(self, n, seuil):
+        with transaction.atomic():
+            self.semer(n)
+            # premier passage : tous les scores sont créés ; second : seuls les changés et les suspects sont réécrits
+            for passage in ("initial", "relance"):
+                durees = {}
+                debut = time.perf_counter()
+                data = load_arrays()
+                durees["lecture"] = time.perf_counter() - debut
+                debut = time.perf_counter()
+                scores, components = score_arrays(
+                    data["montants"], data["timestamps"], data["members"], data["cooperatives"], data["types"]
+                )
+                durees["scoring"] = time.perf_counter() - debut
+                debut = time.perf_counter()
+                ecrits = save_scores(data["ids"], scores, components, seuil)
+                durees["écriture"] = time.perf_counter() - debut
+                total = sum(durees.values())
+                self.stdout.write(
+                    f"{passage:<8} {len(scores)} transactions en {total:.2f}s ({len(scores) / total:,.0f}/s) : "
+                    + ", ".join(f"{etape} {duree:.2f}s" for etape, duree in durees.items())
+                    + f" ; {ecrits} score(s) écrit(s), {int((scores >= seuil).sum())} au-dessus du seuil {seuil}."
+                )
+            transaction.set_rollback(True)
+
+    def semer(self, n):
+        rng = np.random.default_rng(0)
+        cooperatives = Cooperative.objects.bulk_create(
+            Cooperative(nom=f"benchmark-{i}", description="") for i in range(max(n // 10000, 1))
+        )
+        utilisateurs = Utilisateur.objects.bulk_create(
+            Utilisateur(username=f"benchmark-{i}") for i in range(max(n // 100, 10))
+        )
+        membres = Membre.objects.bulk_create(
+            Membre(utilisateur=u, cooperative=cooperatives[i % len(cooperatives)]) for i, u in enumerate(utilisateurs)
+        )
+        types = [code for code, _ in Transaction.TYPE_CHOICES]
+        Transaction.objects.bulk_create(
+            (
+                Transaction(membre=membres[m], montant=round(float(montant), 2), type=types[t],
+                            description="", reference=f"BENCH-{i}",
+                            date_transaction=datetime.fromtimestamp(ts, dt_timezone.utc))
+                for i, (m, t, montant, ts) in enumerate(zip(
+                    rng.integers(0, len(membres), n), rng.choice(4, n, p=[0.6, 0.15, 0.2, 0.05]),
+                    rng.lognormal(8, 0.6, n), rng.uniform(1.6e9, 1.7e9, n),
+                ))
+            ),
+            batch_size=5000,
+        )
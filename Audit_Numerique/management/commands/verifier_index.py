@@ -0,0 +1,120 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from Audit_Numerique.models import (
+    Utilisateur, Cooperative, Membre, Cotisation, Pret,
+    Transaction, Message, Notification, Audit,
+)
+
+PAGE = 51  # taille de page par défaut + 1, comme la pagination par curseur
+
+
+def cas_a_verifier():
+    """Combinaisons de filtres/tri réellement émises par les viewsets."""
+    return {
+        "transactions": Transaction.objects.order_by("-date_transaction", "-id")[:PAGE],
+        "transactions?membre": Transaction.objects.filter(membre_id=1).order_by("-date_transaction", "-id")[:PAGE],
+        "transactions?type": Transaction.objects.filter(type="pret").order_by("-date_transaction", "-id")[:PAGE],
+        "notifications": Notification.objects.order_by("-date_creation", "-id")[:PAGE],
+        "notifications?utilisateur&lue": Notification.objects.filter(utilisateur_id=1, lue=False)
+                                                     .order_by("-date_creation", "-id")[:PAGE],
+        "notifications?utilisateur&lue=true": Notification.objects.filter(utilisateur_id=1, lue=True)
+                                                          .order_by("-date_creation", "-id")[:PAGE],
+        "messages": Message.objects.order_by("-date_envoi", "-id")[:PAGE],
+        "messages?destinataire&lu": Message.objects.filter(destinataire_id=1, lu=False)
+                                           .order_by("-date_envoi", "-id")[:PAGE],
+        "messages?expediteur": Message.objects.filter(expediteur_id=1).order_by("-date_envoi", "-id")[:PAGE],
+        "audits": Audit.objects.order_by("-date_creation", "-id")[:PAGE],
+        "audits?type": Audit.objects.filter(type="financier").order_by("-date_creation", "-id")[:PAGE],
+        "cotisations?membre&statut": Cotisation.objects.filter(membre_id=1, statut="validee"),
+        "prets?statut&echeance": Pret.objects.filter(statut="en_cours", date_echeance__lt=timezone.now().date()),
+    }
+
+
+def scan_sequentiel(plan, table):
+    """Détecte un parcours complet de la table dans un plan PostgreSQL ou SQLite."""
+    if connection.vendor == "postgresql":
+        return re.search(rf'Seq Scan on "?{table}"?', plan) is not None
+    return re.search(rf"\bSCAN {table}\s*$", plan, re.MULTILINE) is not None
+
+
+def semer(n):
+    """Insère n lignes par table lue par les viewsets (au sein de la transaction courante), puis ANALYZE."""
+    maintenant = timezone.now()
+    utilisateurs = Utilisateur.objects.bulk_create(
+        Utilisateur(username=f"explain-{i}") for i in range(max(n // 100, 2))
+    )
+    cooperative = Cooperative.objects.create(nom="explain", description="")
+    membres = Membre.objects.bulk_create(Membre(utilisateur=u, cooperative=cooperative) for u in utilisateurs)
+
+    def date(i):
+        return maintenant - timedelta(minutes=i)
+
+    def pris(sequence, i):
+        return sequence[i % len(sequence)]
+
+    Cotisation.objects.bulk_create(
+        Cotisation(membre=pris(membres, i), montant=i % 500, statut=pris(["validee", "en_attente"], i))
+        for i in range(n)
+    )
+    Pret.objects.bulk_create(
+        Pret(membre=pris(membres, i), montant=i % 500, motif="", statut=pris(Pret.STATUT_CHOICES, i)[0],
+             date_echeance=date(i * 60).date())
+        for i in range(n)
+    )
+    Transaction.objects.bulk_create(
+        Transaction(membre=pris(membres, i), montant=i % 500, type=pris(Transaction.TYPE_CHOICES, i)[0],
+                    description="", reference=f"EXPLAIN-{i}", date_transaction=date(i))
+        for i in range(n)
+    )
+    Message.objects.bulk_create(
+        Message(expediteur=pris(utilisateurs, i), destinataire=pris(utilisateurs, i + 1), contenu="",
+                lu=i % 10 != 0, date_envoi=date(i))
+        for i in range(n)
+    )
+    Notification.objects.bulk_create(
+        Notification(utilisateur=pris(utilisateurs, i), type="systeme", contenu="", lue=i % 10 != 0,
+                     date_creation=date(i))
+        for i in range(n)
+    )
+    Audit.objects.bulk_create(
+        Audit(type=pris(Audit.TYPE_CHOICES, i)[0], description="", date_creation=date(i)) for i in range(n)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+class Command(BaseCommand):
+    help = ("Exécute EXPLAIN sur les filtres des viewsets et échoue si l'un d'eux "
+            "retombe sur un parcours séquentiel.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Insère N lignes par table (annulées en fin de commande) avant EXPLAIN.")
+
+    def handle(self, *args, **options):
+        echecs = []
+        with transaction.atomic():
+            if options["seed"]:
+                semer(options["seed"])
+            elif connection.vendor == "postgresql":
+                # sans données représentatives, on vérifie qu'un index est au moins utilisable
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for nom, queryset in cas_a_verifier().items():
+                plan = queryset.explain()
+                if scan_sequentiel(plan, queryset.model._meta.db_table):
+                    echecs.append(nom)
+                    self.stdout.write(self.style.ERROR(f"SEQ SCAN  {nom}\n{plan}"))
+                else:
+                    self.stdout.write(f"index     {nom}")
+            transaction.set_rollback(True)
+
+        if echecs:
+            raise CommandError(f"{len(echecs)} requête(s) en parcours séquentiel : {', '.join(echecs)}")
+        self.stdout.write(self.style.SUCCESS("Toutes les requêtes utilisent un index."))
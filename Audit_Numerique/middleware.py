@@ -0,0 +1,32 @@
+# middleware.py
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .authentication import JWTClaimsAuthentication
+
+
+@database_sync_to_async
+def _utilisateur_jwt(raw_token):
+    authentication = JWTClaimsAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError):
+        return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authentifie un WebSocket avec le JWT d'accès passé en `?token=` (un navigateur ne peut pas
+    poser d'en-tête Authorization sur un WebSocket). Sans token, l'utilisateur de session reste.
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = parse_qs(scope.get("query_string", b"").decode()).get("token")
+        if token:
+            user = await _utilisateur_jwt(token[0])
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
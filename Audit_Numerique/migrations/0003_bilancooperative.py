@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Audit_Numerique", "0002_alter_cooperative_date_creation_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BilanCooperative",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nb_membres", models.IntegerField(default=0)),
+                ("nb_membres_actifs", models.IntegerField(default=0)),
+                (
+                    "total_cotisations",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "total_prets",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "total_remboursements",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "solde",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("date_mise_a_jour", models.DateTimeField(auto_now=True)),
+                (
+                    "cooperative",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bilan",
+                        to="Audit_Numerique.cooperative",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Audit_Numerique", "0003_bilancooperative"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="audit",
+            index=models.Index(
+                fields=["date_creation", "id"], name="audit_date_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["date_envoi", "id"], name="message_date_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["date_creation", "id"], name="notification_date_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["date_transaction", "id"], name="transaction_date_id_idx"
+            ),
+        ),
+    ]
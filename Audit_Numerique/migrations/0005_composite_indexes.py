@@ -0,0 +1,79 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Audit_Numerique", "0004_cursor_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="audit",
+            index=models.Index(
+                fields=["type", "date_creation"], name="audit_type_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cotisation",
+            index=models.Index(
+                fields=["membre", "statut"], name="cotisation_membre_statut_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["destinataire", "lu", "date_envoi"],
+                name="message_dest_lu_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["expediteur", "date_envoi"], name="message_exp_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                condition=models.Q(("lu", False)),
+                fields=["destinataire", "date_envoi"],
+                name="message_non_lu_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["utilisateur", "lue", "date_creation"],
+                name="notif_user_lue_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("lue", False)),
+                fields=["utilisateur", "date_creation"],
+                name="notif_non_lue_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pret",
+            index=models.Index(
+                fields=["statut", "date_echeance"], name="pret_statut_echeance_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["membre", "date_transaction"],
+                name="transaction_membre_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["type", "date_transaction"], name="transaction_type_date_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Audit_Numerique", "0005_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CurseurAudit",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("dernier_id", models.BigIntegerField(default=0)),
+                (
+                    "derniere_date_transaction",
+                    models.DateTimeField(blank=True, null=True),
+                ),
+                ("date_mise_a_jour", models.DateTimeField(auto_now=True)),
+                (
+                    "cooperative",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="curseur_audit",
+                        to="Audit_Numerique.cooperative",
+                    ),
+                ),
+            ],
+        ),
+    ]
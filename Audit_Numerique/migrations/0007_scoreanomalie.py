@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Audit_Numerique", "0006_curseuraudit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoreAnomalie",
+            fields=[
+                (
+                    "transaction",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="score_anomalie",
+                        serialize=False,
+                        to="Audit_Numerique.transaction",
+                    ),
+                ),
+                ("score", models.FloatField(db_index=True)),
+                ("motifs", models.JSONField(default=list)),
+                (
+                    "date_calcul",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+    ]
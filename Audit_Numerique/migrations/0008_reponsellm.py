@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Audit_Numerique", "0007_scoreanomalie"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReponseLLM",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cle", models.CharField(max_length=64, unique=True)),
+                ("modele", models.CharField(max_length=50)),
+                ("temperature", models.FloatField()),
+                ("reponse", models.TextField()),
+                ("duree_ms", models.PositiveIntegerField(default=0)),
+                ("nb_utilisations", models.PositiveIntegerField(default=0)),
+                (
+                    "date_creation",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "date_acces",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                (
+                    "transaction",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reponses_llm",
+                        to="Audit_Numerique.transaction",
+                    ),
+                ),
+            ],
+        ),
+    ]
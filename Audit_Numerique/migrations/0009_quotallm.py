@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Audit_Numerique", "0008_reponsellm"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuotaLLM",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nom", models.CharField(max_length=50, unique=True)),
+                ("requetes", models.FloatField(default=0)),
+                ("jetons", models.FloatField(default=0)),
+                (
+                    "date_remplissage",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("en_attente", models.IntegerField(default=0)),
+                ("echecs", models.PositiveIntegerField(default=0)),
+                ("ouvert_jusqua", models.DateTimeField(blank=True, null=True)),
+                ("version", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
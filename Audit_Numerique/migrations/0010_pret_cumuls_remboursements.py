@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:38
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def initialiser_cumuls(apps, schema_editor):
+    """Un seul UPDATE : cumul des remboursements existants de chaque prêt."""
+    Pret = apps.get_model("Audit_Numerique", "Pret")
+    Remboursement = apps.get_model("Audit_Numerique", "Remboursement")
+    cumul = Coalesce(
+        Subquery(
+            Remboursement.objects.filter(pret=OuterRef("pk"))
+            .order_by().values("pret").annotate(total=Sum("montant")).values("total")
+        ),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    Pret.objects.update(montant_rembourse=cumul)
+    Pret.objects.update(solde_restant=F("montant") - F("montant_rembourse"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Audit_Numerique", "0009_quotallm"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pret",
+            name="montant_rembourse",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="pret",
+            name="solde_restant",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(initialiser_cumuls, migrations.RunPython.noop),
+    ]
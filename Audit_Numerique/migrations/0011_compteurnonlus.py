@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Audit_Numerique", "0010_pret_cumuls_remboursements"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CompteurNonLus",
+            fields=[
+                (
+                    "utilisateur",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="compteur_non_lus",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("notifications", models.IntegerField(default=0)),
+                ("messages", models.IntegerField(default=0)),
+                ("date_mise_a_jour", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
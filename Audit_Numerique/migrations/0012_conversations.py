@@ -0,0 +1,174 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:44
+
+from collections import defaultdict
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def initialiser_conversations(apps, schema_editor):
+    """Regroupe l'historique par paire d'utilisateurs : une lecture, puis quelques écritures par paire."""
+    Message = apps.get_model("Audit_Numerique", "Message")
+    Conversation = apps.get_model("Audit_Numerique", "Conversation")
+    ParticipantConversation = apps.get_model("Audit_Numerique", "ParticipantConversation")
+    fils = {}
+    messages = Message.objects.order_by("date_envoi", "id").values_list(
+        "pk", "expediteur_id", "destinataire_id", "date_envoi", "lu"
+    )
+    for pk, expediteur, destinataire, date, lu in messages.iterator(chunk_size=2000):
+        fil = fils.setdefault(tuple(sorted((expediteur, destinataire))), {"nb": 0, "non_lus": defaultdict(int)})
+        fil["nb"] += 1
+        fil["dernier"] = (pk, date)
+        if not lu:
+            fil["non_lus"][destinataire] += 1
+    for (a, b), fil in fils.items():
+        conversation = Conversation.objects.create(
+            utilisateur_a_id=a, utilisateur_b_id=b, dernier_message_id=fil["dernier"][0],
+            date_dernier_message=fil["dernier"][1], nb_messages=fil["nb"],
+        )
+        ParticipantConversation.objects.bulk_create([
+            ParticipantConversation(conversation=conversation, utilisateur_id=moi, correspondant_id=autre,
+                                    non_lus=fil["non_lus"][moi], date_dernier_message=fil["dernier"][1])
+            for moi, autre in {(a, b), (b, a)}
+        ])
+        Message.objects.filter(
+            Q(expediteur_id=a, destinataire_id=b) | Q(expediteur_id=b, destinataire_id=a)
+        ).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Audit_Numerique", "0011_compteurnonlus"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ParticipantConversation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("non_lus", models.IntegerField(default=0)),
+                (
+                    "date_dernier_message",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Conversation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "date_dernier_message",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("nb_messages", models.PositiveIntegerField(default=0)),
+                (
+                    "dernier_message",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="Audit_Numerique.message",
+                    ),
+                ),
+                (
+                    "utilisateur_a",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "utilisateur_b",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="conversation",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="messages",
+                to="Audit_Numerique.conversation",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["conversation", "date_envoi", "id"],
+                name="message_conv_date_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="participantconversation",
+            name="conversation",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="participants",
+                to="Audit_Numerique.conversation",
+            ),
+        ),
+        migrations.AddField(
+            model_name="participantconversation",
+            name="correspondant",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="participantconversation",
+            name="utilisateur",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="conversations",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="conversation",
+            unique_together={("utilisateur_a", "utilisateur_b")},
+        ),
+        migrations.AddIndex(
+            model_name="participantconversation",
+            index=models.Index(
+                fields=["utilisateur", "date_dernier_message", "id"],
+                name="participant_boite_idx",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="participantconversation",
+            unique_together={("conversation", "utilisateur")},
+        ),
+        migrations.RunPython(initialiser_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Audit_Numerique", "0012_conversations"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cooperative",
+            name="date_mise_a_jour",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name="cotisation",
+            name="date_mise_a_jour",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name="evenement",
+            name="date_mise_a_jour",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name="membre",
+            name="date_mise_a_jour",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name="pret",
+            name="date_mise_a_jour",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name="utilisateur",
+            name="date_mise_a_jour",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
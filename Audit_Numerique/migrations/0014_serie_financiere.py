@@ -0,0 +1,67 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Audit_Numerique", "0013_date_mise_a_jour"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SerieFinanciere",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "granularite",
+                    models.CharField(
+                        choices=[("jour", "Jour"), ("mois", "Mois")], max_length=5
+                    ),
+                ),
+                ("periode", models.DateField()),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("cotisation", "Cotisation"),
+                            ("pret", "Prêt"),
+                            ("remboursement", "Remboursement"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("nombre", models.IntegerField(default=0)),
+                (
+                    "cooperative",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="series",
+                        to="Audit_Numerique.cooperative",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("cooperative", "granularite", "periode", "type"),
+                        name="serie_cooperative_periode_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
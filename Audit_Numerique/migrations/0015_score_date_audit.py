@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:22
+
+from django.db import migrations, models
+
+
+def marquer_scores_audites(apps, schema_editor):
+    """Les scores déjà couverts par le curseur de leur coopérative ne repartent pas au LLM."""
+    CurseurAudit = apps.get_model("Audit_Numerique", "CurseurAudit")
+    ScoreAnomalie = apps.get_model("Audit_Numerique", "ScoreAnomalie")
+    for curseur in CurseurAudit.objects.all():
+        ScoreAnomalie.objects.filter(
+            transaction__membre__cooperative_id=curseur.cooperative_id,
+            transaction_id__lte=curseur.dernier_id,
+        ).update(date_audit=curseur.date_mise_a_jour)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Audit_Numerique", "0014_serie_financiere"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scoreanomalie",
+            name="date_audit",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="scoreanomalie",
+            index=models.Index(
+                condition=models.Q(("date_audit__isnull", True)),
+                fields=["score"],
+                name="score_a_auditer_idx",
+            ),
+        ),
+        migrations.RunPython(marquer_scores_audites, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Audit_Numerique", "0015_score_date_audit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pret",
+            name="statut_avant_remboursement",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("demande", "Demandé"),
+                    ("approuve", "Approuvé"),
+                    ("rejete", "Rejeté"),
+                    ("en_cours", "En cours"),
+                    ("rembourse", "Remboursé"),
+                    ("en_retard", "En retard"),
+                ],
+                default="",
+                max_length=20,
+            ),
+        ),
+    ]
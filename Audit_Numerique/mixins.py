@@ -0,0 +1,423 @@
+# mixins.py
+import csv
+import hashlib
+from functools import lru_cache, partial
+from itertools import chain
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import ISO_8601, serializers, status
+from rest_framework.decorators import action
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .permissions import IsAdmin, IsTresorier, cooperatives_gerees
+from .renderers import ORJSONRenderer
+from .serializers import DynamicFieldsModelSerializer, StatutMasseSerializer, _arbre
+from .utils.view_cache import get_view_cache, scope_key
+
+
+def _relation_path(prefix: str, field) -> str:
+    return prefix + field.source.replace(".", "__")
+
+
+def _plan(serializer, prefix: str = ""):
+    """
+    Walk the readable fields of a serializer and collect the ORM paths that nested
+    serializers will traverse: single objects are joined, many=True go to prefetch.
+    """
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*":
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            path = _relation_path(prefix, field)
+            prefetch.append(path)
+            sub_select, sub_prefetch = _plan(field.child, path + "__")
+            # below a prefetch every relation is resolved by the prefetch machinery
+            prefetch.extend(sub_select + sub_prefetch)
+        elif isinstance(field, serializers.BaseSerializer):
+            path = _relation_path(prefix, field)
+            select.append(path)
+            sub_select, sub_prefetch = _plan(field, path + "__")
+            select.extend(sub_select)
+            prefetch.extend(sub_prefetch)
+    return select, prefetch
+
+
+@lru_cache(maxsize=None)
+def serializer_relations(serializer_class):
+    """Return the (select_related, prefetch_related) paths needed by a serializer class."""
+    select, prefetch = _plan(serializer_class())
+    return tuple(select), tuple(prefetch)
+
+
+def _columns(serializer, prefix: str = ""):
+    """
+    ORM paths of the columns a ModelSerializer tree reads, for .only(). None as soon as a
+    field reads anything but a concrete column (method field, property, dotted source):
+    deferring would then cost a query per row.
+    """
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None:
+        return None
+    columns = [prefix + model._meta.pk.name]
+    for field in serializer.fields.values():
+        if field.write_only or isinstance(field, serializers.ListSerializer):
+            continue  # many=True relations are loaded by their own prefetch query
+        if field.source == "*" or "." in field.source:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete:
+            return None
+        columns.append(prefix + field.source)
+        if isinstance(field, serializers.BaseSerializer):
+            nested = _columns(field, prefix + field.source + "__")
+            if nested is None:
+                return None
+            columns.extend(nested)
+    return columns
+
+
+def _apply(queryset, select, prefetch):
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def optimize_queryset(queryset, serializer_class):
+    """Apply the joins/prefetches a serializer needs so nested *_detail fields cost no query per row."""
+    return _apply(queryset, *serializer_relations(serializer_class))
+
+
+def optimize_for_serializer(queryset, serializer):
+    """
+    Same for a serializer instance restricted by ?fields=/?expand= (DynamicFieldsModelSerializer):
+    only the expanded relations are joined and only the columns it reads are fetched.
+    """
+    queryset = _apply(queryset, *_plan(serializer))
+    columns = _columns(serializer)
+    return queryset.only(*columns) if columns else queryset
+
+
+class SerializerPrefetchMixin:
+    """
+    Viewset mixin: plans select_related/prefetch_related from the serializer tree
+    returned by get_serializer_class(), so list endpoints run a constant number of queries.
+    A GET carrying ?fields= or ?expand= is planned from the restricted serializer instead.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.request
+        if request is not None and request.method in ("GET", "HEAD") and (
+                "fields" in request.query_params or "expand" in request.query_params):
+            serializer = self.get_serializer()
+            if isinstance(serializer, DynamicFieldsModelSerializer):
+                return optimize_for_serializer(queryset, serializer)
+        return optimize_queryset(queryset, self.get_serializer_class())
+
+
+class _Echo:
+    """File-like object whose write() just returns the line, for csv.writer in a generator."""
+
+    def write(self, value):
+        return value
+
+
+class CSVExportMixin:
+    """
+    Adds a GET `export/` action that streams the filtered list as CSV.
+    Rows come from `values_list()` over a server-side cursor (`iterator(chunk_size=...)`),
+    so memory stays flat and the header is sent before the first row is fetched.
+    Viewsets declare `export_fields`: {csv column: ORM path}.
+    """
+    export_fields = {}
+    export_chunk_size = 2000
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = (
+            queryset.select_related(None).prefetch_related(None)
+            .values_list(*self.export_fields.values())
+            .iterator(chunk_size=self.export_chunk_size)
+        )
+        writer = csv.writer(_Echo())
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in chain([self.export_fields.keys()], rows)),
+            content_type='text/csv; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.basename}.csv"'
+        return response
+
+
+class BulkStatutMixin:
+    """
+    Adds a POST `statut/` action: {"ids": [...], "statut": "<cible>"} moves many rows at once.
+    Eligible rows (allowed source statut, within the caller's cooperatives unless staff) are
+    locked and read in one query, then changed by a single UPDATE. QuerySet.update skips the
+    signals, so the viewset applies their side effects for the whole set in `apres_statut()`.
+    Viewsets declare `transitions_statut` {cible: statuts de départ}, `cooperative_statut`
+    (ORM path to the row's cooperative) and `champs_statut` (extra columns for apres_statut).
+    """
+    transitions_statut = {}
+    cooperative_statut = 'membre__cooperative_id'
+    champs_statut = ()
+
+    def valeurs_statut(self, statut):
+        """Columns written by the UPDATE (auto_now is not applied by QuerySet.update)."""
+        return {'statut': statut, 'date_mise_a_jour': timezone.now()}
+
+    def apres_statut(self, statut, lignes):
+        """Side effects of the transition, for every moved row at once (inside the transaction)."""
+
+    @action(detail=False, methods=['post'], url_path='statut', permission_classes=[IsTresorier | IsAdmin])
+    def changer_statut(self, request):
+        serializer = StatutMasseSerializer(data=request.data, context={'transitions': self.transitions_statut})
+        serializer.is_valid(raise_exception=True)
+        ids, statut = set(serializer.validated_data['ids']), serializer.validated_data['statut']
+
+        model = self.queryset.model
+        queryset = model.objects.filter(pk__in=ids, statut__in=self.transitions_statut[statut])
+        cooperatives = cooperatives_gerees(request.user)
+        if cooperatives is not None:
+            queryset = queryset.filter(**{f'{self.cooperative_statut}__in': cooperatives})
+        with transaction.atomic():
+            lignes = list(queryset.select_for_update(of=('self',)).values(
+                'pk', 'statut', self.cooperative_statut, *self.champs_statut
+            ))
+            if lignes:
+                model.objects.filter(pk__in=[ligne['pk'] for ligne in lignes]).update(**self.valeurs_statut(statut))
+                self.apres_statut(statut, lignes)
+        modifies = {ligne['pk'] for ligne in lignes}
+        return Response({'statut': statut, 'modifies': len(modifies), 'ignores': sorted(ids - modifies)})
+
+
+class VersionedCacheMixin:
+    """
+    Viewset mixin: list/retrieve answered from the versioned view cache (utils/view_cache.py).
+    Viewsets declare `cache_models`, every model their serialized output reads, and
+    `cache_scope` ("public" when the response does not depend on the caller, "user" otherwise).
+    """
+    cache_models = ()
+    cache_scope = 'public'
+
+    def _cached(self, name, request, kwargs, compute):
+        return get_view_cache().serve(
+            f'{type(self).__name__}.{name}', self.cache_models, scope_key(request, self.cache_scope),
+            request, kwargs, compute,
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self._cached('list', request, kwargs, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached('retrieve', request, kwargs, partial(super().retrieve, request, *args, **kwargs))
+
+
+class ConditionalGetMixin:
+    """
+    Viewset mixin: list/retrieve carry an ETag and answer 304 Not Modified to a matching
+    If-None-Match before anything is serialized. The ETag hashes the query string with the
+    row count and the latest `etag_fields` timestamps of the filtered queryset (one aggregate).
+    Viewsets declare `etag_fields`: date_mise_a_jour of the model and of every relation
+    their serializer nests (a renamed cooperative changes the ETag of its members).
+    Put it before VersionedCacheMixin so a revalidation costs neither the cache nor the serializer.
+    """
+    etag_fields = ('date_mise_a_jour',)
+
+    def etag(self, request, queryset):
+        queryset = queryset.select_related(None).prefetch_related(None).order_by()
+        valeurs = queryset.aggregate(
+            nb=Count('pk'), **{f'max_{i}': Max(champ) for i, champ in enumerate(self.etag_fields)}
+        )
+        raw = repr((request.get_full_path(), request.accepted_media_type, sorted(valeurs.items())))
+        return '"' + hashlib.sha1(raw.encode('utf-8')).hexdigest() + '"'
+
+    def _conditional(self, request, queryset, compute):
+        etag = self.etag(request, queryset)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = compute()
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, self.filter_queryset(self.get_queryset()),
+                                 partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: kwargs[lookup]})
+        except (TypeError, ValueError, DjangoValidationError):
+            # malformed pk (/cooperatives/abc/): 404, like DRF's get_object_or_404
+            raise Http404
+        return self._conditional(request, queryset, partial(super().retrieve, request, *args, **kwargs))
+
+
+# to_representation of these fields returns a values() value unchanged
+_IDENTITY_REPRESENTATIONS = {
+    klass.to_representation for klass in (
+        serializers.CharField, serializers.IntegerField, serializers.BooleanField, serializers.ChoiceField,
+    )
+}
+
+
+def _iso_datetime(tz):
+    def convert(value):
+        # DateTimeField.to_representation (ISO 8601) with the timezone looked up once per response
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+    return convert
+
+
+def _converter(field, tz):
+    """Callable turning a values() value into the field's output, None when it is output as is."""
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        # values() already gives the pk, not the related object the field expects
+        return field.pk_field.to_representation if field.pk_field is not None else None
+    representation = type(field).to_representation
+    if representation in _IDENTITY_REPRESENTATIONS:
+        return None
+    if representation is serializers.JSONField.to_representation and not field.binary:
+        return None
+    if (representation is serializers.DateTimeField.to_representation and tz is not None
+            and not hasattr(field, "timezone")
+            and str(getattr(field, "format", api_settings.DATETIME_FORMAT)).lower() == ISO_8601):
+        return _iso_datetime(tz)
+    return field.to_representation
+
+
+def _bind(plan, tz):
+    """Replace the fields of a cached plan by the converters of the current response."""
+    return [
+        (name, column, _bind(sub, tz) if isinstance(sub, list) else _converter(sub, tz))
+        for name, column, sub in plan
+    ]
+
+
+def _values_plan(serializer, prefix: str = ""):
+    """
+    Output plan of a ModelSerializer tree for the values() fast path: a list of
+    (name, column, field) for plain fields and (name, pk column, sub-plan) for nested
+    serializers, in the serializer's field order. None as soon as a field reads anything
+    values() cannot provide (method field, property, dotted source, many=True relation)
+    or a serializer overrides to_representation.
+    """
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None or type(serializer).to_representation is not serializers.Serializer.to_representation:
+        return None
+    plan = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.ListSerializer) or field.source == "*" or "." in field.source:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        path = prefix + field.source
+        if isinstance(field, serializers.BaseSerializer):
+            if not (model_field.many_to_one or model_field.one_to_one):
+                return None
+            nested = _values_plan(field, path + "__")
+            if nested is None:
+                return None
+            # a missing related row (NULL FK, no reverse one-to-one) shows as a NULL pk
+            plan.append((name, f"{path}__{field.Meta.model._meta.pk.name}", nested))
+        elif isinstance(field, serializers.RelatedField) and not isinstance(field, serializers.PrimaryKeyRelatedField):
+            return None
+        elif model_field.concrete and not model_field.many_to_many:
+            plan.append((name, path, field))
+        else:
+            return None
+    return plan
+
+
+def _plan_columns(plan):
+    for _, column, sub in plan:
+        yield column
+        if isinstance(sub, list):
+            yield from _plan_columns(sub)
+
+
+def _shape(plan, row):
+    data = {}
+    for name, column, sub in plan:
+        value = row[column]
+        if value is None:
+            data[name] = None
+        elif sub is None:
+            data[name] = value
+        elif isinstance(sub, list):
+            data[name] = _shape(sub, row)
+        else:
+            data[name] = sub(value)
+    return data
+
+
+@lru_cache(maxsize=256)
+def fast_list_plan(serializer_class, fields=None, expand=None):
+    """
+    (plan, columns) of a serializer class for the values() fast path, None when it does not
+    apply. `fields`/`expand` are the raw ?fields=/?expand= values of the request. Plans keep
+    the bound fields, which only read their own options, so they are shared across requests.
+    """
+    kwargs = {}
+    if issubclass(serializer_class, DynamicFieldsModelSerializer):
+        kwargs = {"champs": _arbre(fields) if fields is not None else None,
+                  "expand": _arbre(expand) if expand is not None else None}
+    plan = _values_plan(serializer_class(**kwargs))
+    if plan is None:
+        return None
+    return plan, tuple(dict.fromkeys(_plan_columns(plan)))
+
+
+class FastListMixin:
+    """
+    Viewset mixin: read-only fast path for list. Rows come from values() over the columns
+    (joins included) the serializer tree reads and are shaped into the dicts the serializer
+    would return, without instantiating it per row; ORJSONRenderer renders the response.
+    Viewsets opt in with `fast_list = True`; ?fast=0 forces the serializer path (comparisons,
+    benchmarks). Serializers reading anything values() cannot provide keep the regular path.
+    """
+    fast_list = False
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+
+    def get_fast_plan(self):
+        params = self.request.query_params
+        if not self.fast_list or params.get("fast") == "0":
+            return None
+        return fast_list_plan(self.get_serializer_class(), params.get("fields"), params.get("expand"))
+
+    def list(self, request, *args, **kwargs):
+        fast_plan = self.get_fast_plan()
+        if fast_plan is None:
+            return super().list(request, *args, **kwargs)
+        plan, columns = fast_plan
+        plan = _bind(plan, timezone.get_current_timezone() if settings.USE_TZ else None)
+        queryset = self.filter_queryset(self.get_queryset()).select_related(None).prefetch_related(None)
+        if self.paginator is not None and hasattr(self.paginator, "get_ordering"):
+            # the cursor is read from the ordering columns of the last row
+            ordering = self.paginator.get_ordering(request, queryset, self)
+            columns = tuple(dict.fromkeys(columns + tuple(f.lstrip("-") for f in ordering) + ("id",)))
+        rows = queryset.values(*columns)
+        page = self.paginate_queryset(rows)
+        data = [_shape(plan, row) for row in (rows if page is None else page)]
+        return Response(data) if page is None else self.get_paginated_response(data)
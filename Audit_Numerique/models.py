@@ -1,4 +1,10 @@
-from django.db import models
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction as db_transaction
+from django.db.models import Case, Count, DateField, DateTimeField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, TruncDate, TruncMonth
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
@@ -20,6 +26,7 @@ class Utilisateur(AbstractUser):
     telephone        = models.CharField(max_length=20, blank=True, null=True)
     date_inscription = models.DateTimeField(default=timezone.now)
     actif            = models.BooleanField(default=True)
+    date_mise_a_jour = models.DateTimeField(auto_now=True, db_index=True)
 
     groups = None
     user_permissions = None
@@ -27,6 +34,14 @@ class Utilisateur(AbstractUser):
     def __str__(self):
         return f"{self.username}"
 
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # instance reconstruite depuis un jeton (authentication.py) : le premier champ différé lu
+        # recharge toute la ligne en une requête, claims compris (un save() n'écrira pas un rôle périmé)
+        if fields is not None and getattr(self, 'depuis_jeton', False):
+            self.depuis_jeton = False
+            fields = [f.attname for f in self._meta.concrete_fields]
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
 
 class Cooperative(models.Model):
     """Informations sur les coopératives enregistrées"""
@@ -35,17 +50,212 @@ class Cooperative(models.Model):
     date_creation = models.DateField(auto_now_add=True)
     admin = models.ForeignKey(Utilisateur, on_delete=models.SET_NULL, null=True,
                               related_name='cooperatives_administrees')
+    # horodatage de dernière écriture : ETag des listes et détails (mixins.ConditionalGetMixin)
+    date_mise_a_jour = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.nom
 
 
+class BilanCooperative(models.Model):
+    """
+    Soldes agrégés d'une coopérative, tenus à jour par les signaux à chaque écriture
+    (membres, cotisations, prêts, remboursements) pour servir les statistiques sans agrégat.
+    Les mises à jour de masse (QuerySet.update) ne passent pas par les signaux :
+    `manage.py recalculer_bilans` reconstruit et vérifie la table.
+    """
+    STATUTS_PRETS_EN_COURS = ('approuve', 'en_cours')
+
+    cooperative = models.OneToOneField(Cooperative, on_delete=models.CASCADE, related_name='bilan')
+    nb_membres = models.IntegerField(default=0)
+    nb_membres_actifs = models.IntegerField(default=0)
+    total_cotisations = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_prets = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_remboursements = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    solde = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    date_mise_a_jour = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Bilan {self.cooperative} ({self.solde})"
+
+    @classmethod
+    def calculer(cls, cooperative_id):
+        """Recalcule les agrégats à partir des tables sources (chemin lent, sert de référence)."""
+        membres = Membre.objects.filter(cooperative_id=cooperative_id)
+        total_cotisations = Cotisation.objects.filter(
+            membre__cooperative_id=cooperative_id, statut='validee'
+        ).aggregate(total=Sum('montant'))['total'] or 0
+        total_prets = Pret.objects.filter(
+            membre__cooperative_id=cooperative_id, statut__in=cls.STATUTS_PRETS_EN_COURS
+        ).aggregate(total=Sum('montant'))['total'] or 0
+        total_remboursements = Remboursement.objects.filter(
+            pret__membre__cooperative_id=cooperative_id
+        ).aggregate(total=Sum('montant'))['total'] or 0
+        return {
+            'nb_membres': membres.count(),
+            'nb_membres_actifs': membres.filter(actif=True).count(),
+            'total_cotisations': total_cotisations,
+            'total_prets': total_prets,
+            'total_remboursements': total_remboursements,
+            'solde': total_cotisations - total_prets + total_remboursements,
+        }
+
+    @classmethod
+    def recalculer(cls, cooperative_id):
+        bilan, _ = cls.objects.update_or_create(
+            cooperative_id=cooperative_id, defaults=cls.calculer(cooperative_id)
+        )
+        return bilan
+
+    @classmethod
+    def pour(cls, cooperative):
+        """Bilan de la coopérative, reconstruit à la volée s'il n'existe pas encore."""
+        try:
+            return cls.objects.get(cooperative=cooperative)
+        except cls.DoesNotExist:
+            return cls.recalculer(cooperative.pk)
+
+    @classmethod
+    def appliquer(cls, cooperative_id, **deltas):
+        """Applique des variations atomiques (F()) sur les compteurs d'une coopérative."""
+        deltas = {champ: valeur for champ, valeur in deltas.items() if valeur}
+        if cooperative_id is None or not deltas:
+            return
+        solde = (deltas.get('total_cotisations', 0) - deltas.get('total_prets', 0)
+                 + deltas.get('total_remboursements', 0))
+        maj = {champ: F(champ) + valeur for champ, valeur in deltas.items()}
+        if solde:
+            maj['solde'] = F('solde') + solde
+        cls.objects.filter(cooperative_id=cooperative_id).update(date_mise_a_jour=timezone.now(), **maj)
+
+
+class SerieFinanciere(models.Model):
+    """
+    Totaux et nombres d'opérations par coopérative, type de flux et période (jour, mois),
+    tenus à jour par les signaux comme le bilan : les graphiques du tableau de bord lisent
+    quelques lignes par période, quelle que soit la profondeur de l'historique.
+    Une période absente est calculée depuis les tables sources à sa première écriture ;
+    `manage.py recalculer_series` reconstruit et vérifie la table.
+    """
+    GRANULARITE_CHOICES = [
+        ('jour', 'Jour'),
+        ('mois', 'Mois'),
+    ]
+
+    TYPE_CHOICES = [
+        ('cotisation', 'Cotisation'),
+        ('pret', 'Prêt'),
+        ('remboursement', 'Remboursement'),
+    ]
+
+    # un prêt compte dans la série de sa date d'approbation dès qu'il est accordé, remboursé ou non
+    STATUTS_PRETS_ACCORDES = ('approuve', 'en_cours', 'rembourse', 'en_retard')
+
+    cooperative = models.ForeignKey(Cooperative, on_delete=models.CASCADE, related_name='series')
+    granularite = models.CharField(max_length=5, choices=GRANULARITE_CHOICES)
+    periode = models.DateField()  # premier jour de la période
+    type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    nombre = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # sert aussi la lecture d'une plage : coopérative, granularité, puis periode BETWEEN
+            models.UniqueConstraint(fields=['cooperative', 'granularite', 'periode', 'type'],
+                                    name='serie_cooperative_periode_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.cooperative_id} {self.type} {self.granularite} {self.periode} : {self.total}"
+
+    @staticmethod
+    def periodes(jour):
+        """(granularité, début de période) des périodes contenant `jour`."""
+        return (('jour', jour), ('mois', jour.replace(day=1)))
+
+    @staticmethod
+    def jour(date):
+        """
+        Jour local d'une date d'opération telle qu'un save() l'a acceptée : datetime conscient
+        ou naïf (heure du fuseau par défaut, comme à l'écriture), chaîne ISO ou date.
+        """
+        if isinstance(date, datetime.date) and not isinstance(date, datetime.datetime):
+            return date
+        date = DateTimeField().to_python(date)
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date, timezone.get_default_timezone())
+        return timezone.localdate(date)
+
+    @classmethod
+    def sources(cls, type):
+        """(lignes comptées, chemin de la coopérative, date de l'opération) d'un type de flux."""
+        if type == 'cotisation':
+            return Cotisation.objects.filter(statut='validee'), 'membre__cooperative_id', F('date_paiement')
+        if type == 'pret':
+            return (Pret.objects.filter(statut__in=cls.STATUTS_PRETS_ACCORDES), 'membre__cooperative_id',
+                    Coalesce('date_approbation', 'date_demande'))
+        return Remboursement.objects.all(), 'pret__membre__cooperative_id', F('date_paiement')
+
+    @classmethod
+    def calculer(cls, type, granularite, **filtres):
+        """
+        Agrégats recalculés depuis les tables sources (chemin lent, sert de référence) :
+        lignes {cooperative, periode, total, nombre}. Les périodes suivent le fuseau courant,
+        comme SerieFinanciere.jour() dans appliquer_lot().
+        """
+        lignes, chemin, date = cls.sources(type)
+        tronque = TruncDate(date) if granularite == 'jour' else TruncMonth(date, output_field=DateField())
+        return (lignes.annotate(cooperative=F(chemin), periode=tronque)
+                .filter(**filtres).order_by()
+                .values('cooperative', 'periode')
+                .annotate(total=Sum('montant'), nombre=Count('pk')))
+
+    @classmethod
+    def recalculer(cls, cooperative_id, type, granularite, periode):
+        ligne = next(iter(cls.calculer(type, granularite, cooperative=cooperative_id, periode=periode)), None)
+        cls.objects.update_or_create(
+            cooperative_id=cooperative_id, granularite=granularite, periode=periode, type=type,
+            defaults={'total': ligne['total'] if ligne else 0, 'nombre': ligne['nombre'] if ligne else 0},
+        )
+
+    @classmethod
+    def appliquer(cls, cooperative_id, type, date, montant, nombre):
+        """Variation d'une opération (nombre = 1 pour un ajout, -1 pour un retrait) sur ses périodes."""
+        cls.appliquer_lot(type, [(cooperative_id, date, montant, nombre)])
+
+    @classmethod
+    def appliquer_lot(cls, type, operations):
+        """
+        Variations atomiques (F()) d'un lot d'opérations (cooperative_id, date, montant, nombre),
+        regroupées d'abord par période : un UPDATE par période touchée, pas par opération.
+        Appelé après l'écriture : une période encore absente est calculée, le calcul l'inclut déjà.
+        """
+        deltas = defaultdict(lambda: [Decimal(0), 0])
+        for cooperative_id, date, montant, nombre in operations:
+            if cooperative_id is None or date is None:
+                continue
+            for granularite, periode in cls.periodes(cls.jour(date)):
+                delta = deltas[cooperative_id, granularite, periode]
+                delta[0] += Decimal(str(montant)) * (1 if nombre > 0 else -1)
+                delta[1] += nombre
+        for (cooperative_id, granularite, periode), (total, nombre) in deltas.items():
+            if not total and not nombre:
+                continue
+            maj = cls.objects.filter(
+                cooperative_id=cooperative_id, granularite=granularite, periode=periode, type=type,
+            ).update(total=F('total') + total, nombre=F('nombre') + nombre)
+            # un retrait sur une période absente (coopérative supprimée en cascade) n'a rien à retirer
+            if not maj and nombre >= 0:
+                cls.recalculer(cooperative_id, type, granularite, periode)
+
+
 class Membre(models.Model):
     """Association entre utilisateurs et coopératives"""
     utilisateur = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='adhesions')
     cooperative = models.ForeignKey(Cooperative, on_delete=models.CASCADE, related_name='membres')
     date_adhesion = models.DateField(auto_now_add=True)
     actif = models.BooleanField(default=True)
+    date_mise_a_jour = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('utilisateur', 'cooperative')
@@ -73,10 +283,31 @@ class Cotisation(models.Model):
     date_paiement = models.DateTimeField(default=timezone.now)
     type = models.CharField(max_length=20, choices=TYPE_CHOICES, default='reguliere')
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    # les UPDATE de masse (transitions de statut) le posent explicitement
+    date_mise_a_jour = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['membre', 'statut'], name='cotisation_membre_statut_idx')]
 
     def __str__(self):
         return f"Cotisation de {self.membre.utilisateur} - {self.montant} ({self.date_paiement.strftime('%d/%m/%Y')})"
 
+    def save(self, *args, **kwargs):
+        # l'écriture COT-<id> d'une validation (signals.py) est créée dans la même transaction
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def ecriture(cls, pk, montant, membre_id, type):
+        """Transaction comptable COT-<id> d'une cotisation validée (référence unique : à insérer avec ignore_conflicts)."""
+        return Transaction(
+            type='cotisation',
+            montant=montant,
+            membre_id=membre_id,
+            description=f"Cotisation {dict(cls.TYPE_CHOICES).get(type, type)}",
+            reference=f"COT-{pk}",
+        )
+
 
 class Pret(models.Model):
     """Gère les prêts accordés aux membres"""
@@ -97,10 +328,82 @@ class Pret(models.Model):
     date_echeance = models.DateField(null=True, blank=True)
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='demande')
     motif = models.TextField()
+    # cumuls tenus par UPDATE F() à chaque remboursement (signals.py) ;
+    # `manage.py recalculer_remboursements` les reconstruit et les vérifie
+    montant_rembourse = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    solde_restant = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # statut en vigueur quand le prêt a été soldé, rétabli si un remboursement est annulé
+    statut_avant_remboursement = models.CharField(max_length=20, choices=STATUT_CHOICES, blank=True, default='')
+    # auto_now ne couvre pas les UPDATE F() : appliquer_remboursement et les bascules de statut le posent
+    date_mise_a_jour = models.DateTimeField(auto_now=True, db_index=True)
+
+    CHAMPS_REMBOURSEMENT = ('montant_rembourse', 'solde_restant', 'statut_avant_remboursement')
+
+    class Meta:
+        indexes = [models.Index(fields=['statut', 'date_echeance'], name='pret_statut_echeance_idx')]
 
     def __str__(self):
         return f"Prêt de {self.montant} à {self.membre.utilisateur} ({self.statut})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._memoriser_statut()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._memoriser_statut()
+
+    def _memoriser_statut(self):
+        if 'statut' in self.__dict__:
+            self._statut_charge = self.statut
+
+    def _statut_modifie(self):
+        """Statut différent de celui lu en base (ou instance non chargée depuis la base)."""
+        if 'statut' not in self.__dict__:
+            return False
+        return not hasattr(self, '_statut_charge') or self.statut != self._statut_charge
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.solde_restant = Decimal(str(self.montant)) - Decimal(str(self.montant_rembourse))
+            super().save(*args, **kwargs)
+            self._memoriser_statut()
+            return
+        # une instance chargée avant un remboursement ne doit écraser ni les cumuls à jour
+        # ni le statut qu'il a pu basculer (rembourse) : le statut ne part que s'il a été modifié
+        if kwargs.get('update_fields') is None:
+            update_fields = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.CHAMPS_REMBOURSEMENT
+                and (f.name != 'statut' or self._statut_modifie())
+            ]
+        else:
+            update_fields = list(kwargs['update_fields'])
+        recalculer_solde = 'montant' in update_fields and 'solde_restant' not in update_fields
+        if recalculer_solde:
+            self.solde_restant = Decimal(str(self.montant)) - F('montant_rembourse')
+            update_fields.append('solde_restant')
+        kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        if recalculer_solde:
+            # le statut a pu basculer dans les signaux (solde nul ou redevenu positif)
+            self.refresh_from_db(fields=self.CHAMPS_REMBOURSEMENT + ('statut',))
+        else:
+            self._memoriser_statut()
+
+    @classmethod
+    def appliquer_remboursement(cls, pret_id, montant):
+        """Reporte un remboursement (une annulation si montant < 0) par UPDATE F(), sans agrégat."""
+        if pret_id is None or not montant:
+            return
+        cls.objects.filter(pk=pret_id).update(
+            montant_rembourse=F('montant_rembourse') + montant,
+            solde_restant=F('solde_restant') - montant,
+            date_mise_a_jour=timezone.now(),
+        )
+
 
 class Remboursement(models.Model):
     """Suivi des remboursements de prêts"""
@@ -119,6 +422,11 @@ class Remboursement(models.Model):
     def __str__(self):
         return f"Remboursement de {self.montant} pour prêt #{self.pret.id}"
 
+    def save(self, *args, **kwargs):
+        # les cumuls du prêt (signals.py) sont mis à jour dans la même transaction que l'insertion
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Transaction(models.Model):
     """Historique de toutes les transactions financières"""
@@ -136,18 +444,208 @@ class Transaction(models.Model):
     description = models.TextField()
     reference = models.CharField(max_length=50, unique=True)
 
+    class Meta:
+        indexes = [
+            # pagination par curseur (date, id)
+            models.Index(fields=['date_transaction', 'id'], name='transaction_date_id_idx'),
+            models.Index(fields=['membre', 'date_transaction'], name='transaction_membre_date_idx'),
+            models.Index(fields=['type', 'date_transaction'], name='transaction_type_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.type} - {self.montant} ({self.date_transaction.strftime('%d/%m/%Y')})"
 
 
+class ScoreAnomalie(models.Model):
+    """Score d'anomalie calculé localement (utils/anomalies.py) avant tout appel au LLM"""
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, primary_key=True,
+                                       related_name='score_anomalie')
+    score = models.FloatField(db_index=True)
+    motifs = models.JSONField(default=list)
+    date_calcul = models.DateTimeField(default=timezone.now)
+    # renseignée par l'audit nocturne dans la transaction qui écrit l'Audit ; un score sans
+    # date est à auditer, quel que soit l'ordre de commit des transactions
+    date_audit = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # file de l'audit nocturne : seuls les scores pas encore audités sont indexés
+            models.Index(fields=['score'], name='score_a_auditer_idx',
+                         condition=models.Q(date_audit__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"Score {self.score:.2f} pour transaction #{self.transaction_id}"
+
+
+class ReponseLLM(models.Model):
+    """Cache persistant des réponses du LLM (second niveau derrière le LRU en mémoire)"""
+    cle = models.CharField(max_length=64, unique=True)
+    modele = models.CharField(max_length=50)
+    temperature = models.FloatField()
+    reponse = models.TextField()
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, null=True, blank=True,
+                                    related_name='reponses_llm')
+    duree_ms = models.PositiveIntegerField(default=0)
+    nb_utilisations = models.PositiveIntegerField(default=0)
+    date_creation = models.DateTimeField(default=timezone.now)
+    date_acces = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Réponse {self.modele} ({self.cle[:12]})"
+
+
+class QuotaLLM(models.Model):
+    """
+    État partagé entre processus (gunicorn, Celery) des appels au fournisseur LLM :
+    seaux à jetons requêtes/minute et tokens/minute, et disjoncteur.
+    """
+    nom = models.CharField(max_length=50, unique=True)
+    requetes = models.FloatField(default=0)
+    jetons = models.FloatField(default=0)
+    date_remplissage = models.DateTimeField(default=timezone.now)
+    en_attente = models.IntegerField(default=0)
+    echecs = models.PositiveIntegerField(default=0)
+    ouvert_jusqua = models.DateTimeField(null=True, blank=True)
+    # verrou optimiste : chaque prélèvement vérifie que personne n'a écrit entre-temps
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Quota {self.nom}"
+
+
+class Conversation(models.Model):
+    """
+    Fil de messages entre deux utilisateurs (utilisateur_a.id <= utilisateur_b.id), tenu à jour
+    à chaque envoi (signals.py) : dernier message et nombre de messages.
+    La boîte de réception se lit dans ParticipantConversation, une ligne par participant.
+    """
+    utilisateur_a = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='+')
+    utilisateur_b = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='+')
+    dernier_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True,
+                                        related_name='+')
+    date_dernier_message = models.DateTimeField(default=timezone.now)
+    nb_messages = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('utilisateur_a', 'utilisateur_b')
+
+    def __str__(self):
+        return f"Conversation {self.utilisateur_a_id} ↔ {self.utilisateur_b_id}"
+
+    @classmethod
+    def entre(cls, expediteur_id, destinataire_id, date=None):
+        """Conversation de la paire (créée avec ses participants au premier message)."""
+        a, b = sorted((expediteur_id, destinataire_id))
+        date = date or timezone.now()
+        with db_transaction.atomic():
+            conversation, creee = cls.objects.get_or_create(
+                utilisateur_a_id=a, utilisateur_b_id=b, defaults={'date_dernier_message': date}
+            )
+            if creee:
+                ParticipantConversation.objects.bulk_create([
+                    ParticipantConversation(conversation=conversation, utilisateur_id=moi, correspondant_id=autre,
+                                            date_dernier_message=date)
+                    for moi, autre in {(a, b), (b, a)}
+                ])
+        return conversation
+
+    @classmethod
+    def ajouter(cls, message):
+        """Report d'un nouveau message : deux UPDATE, quel que soit l'historique."""
+        date = Value(message.date_envoi, output_field=DateTimeField())
+        plus_recent = Q(dernier_message__isnull=True) | Q(date_dernier_message__lte=message.date_envoi)
+        cls.objects.filter(pk=message.conversation_id).update(
+            nb_messages=F('nb_messages') + 1,
+            dernier_message=Case(When(plus_recent, then=Value(message.pk)), default=F('dernier_message'),
+                                 output_field=models.BigIntegerField()),
+            date_dernier_message=Greatest('date_dernier_message', date),
+        )
+        ParticipantConversation.objects.filter(conversation_id=message.conversation_id).update(
+            date_dernier_message=Greatest('date_dernier_message', date),
+            non_lus=Case(
+                When(utilisateur_id=message.destinataire_id, then=F('non_lus') + (0 if message.lu else 1)),
+                default=F('non_lus'),
+            ),
+        )
+
+    @classmethod
+    def marquer(cls, conversation_id, destinataire_id, delta):
+        """Variation des non-lus du destinataire (delta < 0 à la lecture)."""
+        if conversation_id and delta:
+            ParticipantConversation.objects.filter(
+                conversation_id=conversation_id, utilisateur_id=destinataire_id
+            ).update(non_lus=F('non_lus') + delta)
+
+    @classmethod
+    def recompter_non_lus(cls, utilisateur_id):
+        """Après une lecture en masse : un UPDATE recompte les conversations de l'utilisateur qui avaient des non-lus."""
+        non_lus = Message.objects.filter(
+            conversation_id=OuterRef('conversation_id'), destinataire_id=utilisateur_id, lu=False
+        ).order_by().values('conversation_id').annotate(n=Count('pk')).values('n')
+        ParticipantConversation.objects.filter(utilisateur_id=utilisateur_id, non_lus__gt=0).update(
+            non_lus=Coalesce(Subquery(non_lus), 0)
+        )
+
+    @classmethod
+    def retirer(cls, message):
+        """Report d'une suppression ; le dernier message n'est recherché que s'il vient d'être supprimé."""
+        cls.objects.filter(pk=message.conversation_id).update(nb_messages=F('nb_messages') - 1)
+        if not message.lu:
+            cls.marquer(message.conversation_id, message.destinataire_id, -1)
+        if cls.objects.filter(pk=message.conversation_id, dernier_message__isnull=True).exists():
+            dernier = Message.objects.filter(conversation_id=message.conversation_id).order_by(
+                '-date_envoi', '-id'
+            ).values('pk', 'date_envoi').first()
+            if dernier:
+                cls.objects.filter(pk=message.conversation_id).update(
+                    dernier_message_id=dernier['pk'], date_dernier_message=dernier['date_envoi']
+                )
+
+
+class ParticipantConversation(models.Model):
+    """Entrée de la boîte de réception d'un utilisateur : une par conversation, avec ses non-lus."""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='participants')
+    utilisateur = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='conversations')
+    correspondant = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='+')
+    non_lus = models.IntegerField(default=0)
+    # copie de Conversation.date_dernier_message : la boîte se lit sur un seul index
+    date_dernier_message = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('conversation', 'utilisateur')
+        indexes = [
+            models.Index(fields=['utilisateur', 'date_dernier_message', 'id'], name='participant_boite_idx'),
+        ]
+
+    def __str__(self):
+        return f"Conversation {self.conversation_id} de {self.utilisateur_id}"
+
+
 class Message(models.Model):
     """Système de messagerie interne"""
     expediteur = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='messages_envoyes')
     destinataire = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='messages_recus')
+    # renseignée à l'envoi par les signaux
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, null=True, blank=True,
+                                     related_name='messages')
     contenu = models.TextField()
     date_envoi = models.DateTimeField(default=timezone.now)
     lu = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # fil d'une conversation, pagination par curseur (date, id)
+            models.Index(fields=['conversation', 'date_envoi', 'id'], name='message_conv_date_idx'),
+            # pagination par curseur (date, id)
+            models.Index(fields=['date_envoi', 'id'], name='message_date_id_idx'),
+            models.Index(fields=['destinataire', 'lu', 'date_envoi'], name='message_dest_lu_date_idx'),
+            models.Index(fields=['expediteur', 'date_envoi'], name='message_exp_date_idx'),
+            # boîte de réception : seuls les messages non lus sont indexés
+            models.Index(fields=['destinataire', 'date_envoi'], name='message_non_lu_idx',
+                         condition=models.Q(lu=False)),
+        ]
+
     def __str__(self):
         return f"Message de {self.expediteur} à {self.destinataire} ({self.date_envoi.strftime('%d/%m/%Y')})"
 
@@ -168,10 +666,68 @@ class Notification(models.Model):
     date_creation = models.DateTimeField(default=timezone.now)
     lue = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # pagination par curseur (date, id)
+            models.Index(fields=['date_creation', 'id'], name='notification_date_id_idx'),
+            models.Index(fields=['utilisateur', 'lue', 'date_creation'], name='notif_user_lue_date_idx'),
+            # badge et liste des non lues : seules les notifications non lues sont indexées
+            models.Index(fields=['utilisateur', 'date_creation'], name='notif_non_lue_idx',
+                         condition=models.Q(lue=False)),
+        ]
+
     def __str__(self):
         return f"Notification {self.type} pour {self.utilisateur} ({self.date_creation.strftime('%d/%m/%Y')})"
 
 
+class CompteurNonLus(models.Model):
+    """
+    Nombre de notifications et de messages non lus d'un utilisateur (badge de l'interface),
+    tenu par des UPDATE F() à la création et à la lecture (signals.py, pipeline de notifications).
+    Reconstruit à la demande, ou dès qu'un compteur négatif trahit une dérive ;
+    `manage.py recalculer_non_lus` vérifie toute la table.
+    """
+    utilisateur = models.OneToOneField(Utilisateur, on_delete=models.CASCADE, primary_key=True,
+                                       related_name='compteur_non_lus')
+    notifications = models.IntegerField(default=0)
+    messages = models.IntegerField(default=0)
+    date_mise_a_jour = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Non lus de {self.utilisateur_id} : {self.notifications} notification(s), {self.messages} message(s)"
+
+    @classmethod
+    def calculer(cls, utilisateur_id):
+        return {
+            'notifications': Notification.objects.filter(utilisateur_id=utilisateur_id, lue=False).count(),
+            'messages': Message.objects.filter(destinataire_id=utilisateur_id, lu=False).count(),
+        }
+
+    @classmethod
+    def recalculer(cls, utilisateur_id):
+        compteur, _ = cls.objects.update_or_create(utilisateur_id=utilisateur_id, defaults=cls.calculer(utilisateur_id))
+        return compteur
+
+    @classmethod
+    def pour(cls, utilisateur_id):
+        """Compteurs de l'utilisateur ; reconstruits s'ils n'existent pas encore ou ont dérivé sous zéro."""
+        compteur = cls.objects.filter(utilisateur_id=utilisateur_id).first()
+        if compteur is None or compteur.notifications < 0 or compteur.messages < 0:
+            compteur = cls.recalculer(utilisateur_id)
+        return compteur
+
+    @classmethod
+    def appliquer(cls, utilisateur_id, **deltas):
+        """Variations atomiques (F()) ; la première écriture d'un utilisateur construit sa ligne."""
+        deltas = {champ: valeur for champ, valeur in deltas.items() if valeur}
+        if utilisateur_id is None or not deltas:
+            return
+        maj = {champ: F(champ) + valeur for champ, valeur in deltas.items()}
+        if not cls.objects.filter(utilisateur_id=utilisateur_id).update(date_mise_a_jour=timezone.now(), **maj):
+            # appelé après l'écriture : le calcul l'inclut déjà
+            cls.recalculer(utilisateur_id)
+
+
 class Audit(models.Model):
     """Enregistrement des activités d'audit"""
     TYPE_CHOICES = [
@@ -187,10 +743,28 @@ class Audit(models.Model):
     details = models.JSONField(default=dict)
     utilisateur = models.ForeignKey(Utilisateur, on_delete=models.SET_NULL, null=True, related_name='audits')
 
+    class Meta:
+        indexes = [
+            # pagination par curseur (date, id)
+            models.Index(fields=['date_creation', 'id'], name='audit_date_id_idx'),
+            models.Index(fields=['type', 'date_creation'], name='audit_type_date_idx'),
+        ]
+
     def __str__(self):
         return f"Audit {self.type} - {self.date_creation.strftime('%d/%m/%Y')}"
 
 
+class CurseurAudit(models.Model):
+    """Dernière transaction auditée par coopérative (suivi ; la reprise repose sur ScoreAnomalie.date_audit)"""
+    cooperative = models.OneToOneField(Cooperative, on_delete=models.CASCADE, related_name='curseur_audit')
+    dernier_id = models.BigIntegerField(default=0)
+    derniere_date_transaction = models.DateTimeField(null=True, blank=True)
+    date_mise_a_jour = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Audit {self.cooperative} jusqu'à #{self.dernier_id}"
+
+
 class Evenement(models.Model):
     """Gestion du calendrier des événements"""
     titre = models.CharField(max_length=100)
@@ -198,6 +772,7 @@ class Evenement(models.Model):
     date_debut = models.DateTimeField(default=timezone.now)
     date_fin = models.DateTimeField(default=timezone.now)
     cooperative = models.ForeignKey(Cooperative, on_delete=models.CASCADE, related_name='evenements')
+    date_mise_a_jour = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.titre} ({self.date_debut.strftime('%d/%m/%Y')})"
\ No newline at end of file
@@ -0,0 +1,89 @@
+# pagination.py
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class DateCursorPagination(CursorPagination):
+    """
+    Keyset pagination for append-only tables. The cursor carries the (date, id) pair
+    of the last row served, so each page is an index range on (date, id):
+    no COUNT(*), no OFFSET, and deep pages cost the same as the first one.
+    Subclasses set `ordering` to their timestamp column followed by id.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        # `?ordering=` (OrderingFilter) picks the leading column; the id tie-breaker
+        # always follows in the same direction so that (column, id) is unique.
+        field = super().get_ordering(request, queryset, view)[0]
+        return (field, '-id' if field.startswith('-') else 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._keyset_filter(ordering, current_position))
+
+        # one extra row tells whether a following page exists
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following_position, current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _keyset_filter(self, ordering, position):
+        value, _, pk = position.rpartition('|')
+        field = ordering[0].lstrip('-')
+        op = 'lt' if ordering[0].startswith('-') else 'gt'
+        # `field <= value` bounds the index range, the OR only settles ties on id
+        return Q(**{f'{field}__{op}e': value}) & (Q(**{f'{field}__{op}': value}) | Q(**{f'id__{op}': pk}))
+
+    def _get_position_from_instance(self, instance, ordering):
+        pk = instance['id'] if isinstance(instance, dict) else instance.pk
+        return f"{super()._get_position_from_instance(instance, ordering)}|{pk}"
+
+
+class TransactionCursorPagination(DateCursorPagination):
+    ordering = ('-date_transaction', '-id')
+
+
+class DateCreationCursorPagination(DateCursorPagination):
+    ordering = ('-date_creation', '-id')
+
+
+class DateEnvoiCursorPagination(DateCursorPagination):
+    ordering = ('-date_envoi', '-id')
+
+
+class ConversationCursorPagination(DateCursorPagination):
+    """Boîte de réception : ordre fixe, le `?ordering=` de la vue porte sur les messages."""
+    ordering = ('-date_dernier_message', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
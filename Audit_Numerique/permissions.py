@@ -1,6 +1,8 @@
 # permissions.py
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .authentication import cooperatives_de
+
 class IsAdmin(BasePermission):
     def has_permission(self, req, view):
         return req.user and req.user.is_staff
@@ -16,3 +18,9 @@ class IsSecretaire(BasePermission):
 class ReadOnly(BasePermission):
     def has_permission(self, req, view):
         return req.method in SAFE_METHODS
+
+def cooperatives_gerees(user):
+    """Ids des coopératives où `user` agit (administrateur ou membre actif) ; None pour le personnel (toutes)."""
+    if user.is_staff:
+        return None
+    return cooperatives_de(user)
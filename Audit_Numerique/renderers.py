@@ -0,0 +1,26 @@
+# renderers.py
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# orjson ne connaît ni Decimal ni les chaînes paresseuses : il délègue à l'encodeur de DRF,
+# et les dates passent aussi par lui pour garder son format (millisecondes, suffixe Z)
+_drf_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer sur orjson : mêmes octets que le rendu DRF compact (UTF-8, types non natifs
+    confiés à l'encodeur DRF), plusieurs fois plus rapide sur les longues listes.
+    Un rendu indenté (Accept: application/json; indent=4) reste au JSONRenderer d'origine.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=_drf_default, option=self.options)
+        # comme DRF : U+2028/U+2029 échappés pour rester du JavaScript valide
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
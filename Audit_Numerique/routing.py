@@ -1,6 +1,7 @@
 from django.urls import re_path
-from .views import AuditConsumer
+from .views import AuditConsumer, ChatConsumer
 
 websocket_urlpatterns = [
+    re_path(r'^ws/chat/$', ChatConsumer.as_asgi()),
     re_path(r'^ws/$', AuditConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -3,12 +3,79 @@ from django.contrib.auth import authenticate
 from .models import (
     Utilisateur, Cooperative, Membre, Cotisation,
     Pret, Remboursement, Transaction, Message,
-    Notification, Audit, Evenement
+    Notification, Audit, Evenement, ScoreAnomalie, ParticipantConversation
 )
 
 User = Utilisateur()
 
-class UtilisateurSerializer(serializers.ModelSerializer):
+
+def _arbre(valeur):
+    """'a.b,c' -> {'a': {'b': {}}, 'c': {}}"""
+    arbre = {}
+    for chemin in filter(None, (valeur or '').split(',')):
+        noeud = arbre
+        for nom in chemin.strip().split('.'):
+            noeud = noeud.setdefault(nom, {})
+    return arbre
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    Base des serializers de lecture : ?fields=id,montant restreint les champs renvoyés,
+    ?expand=membre_detail.utilisateur_detail ajoute des sous-arbres *_detail (notation pointée).
+    Dès que l'un des deux paramètres est présent (GET), les sous-arbres non demandés ne sont
+    pas instanciés et SerializerPrefetchMixin ne charge que les colonnes lues ; sans paramètre,
+    la sortie est inchangée. `champs`/`expand` (arbres) s'imposent aux paramètres de la requête.
+    """
+
+    def __init__(self, *args, champs=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._champs, self._expand = champs, expand
+
+    def selection(self):
+        """(champs, expand) à appliquer, ou None pour tout sérialiser."""
+        if self._champs is not None or self._expand is not None:
+            return self._champs, self._expand or {}
+        request = self.context.get('request')
+        parent = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+        if request is None or parent is not None or request.method not in ('GET', 'HEAD'):
+            return None
+        params = request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None
+        return (_arbre(params['fields']) if 'fields' in params else None), _arbre(params.get('expand'))
+
+    def get_fields(self):
+        selection = self.selection()
+        if selection is None:
+            return super().get_fields()
+        champs, expand = selection
+        imbriques = {nom for nom, champ in self._declared_fields.items() if isinstance(champ, serializers.BaseSerializer)}
+
+        def retenu(nom):
+            if nom in imbriques:
+                return nom in expand or (champs is not None and nom in champs)
+            return champs is None or nom in champs
+
+        self._retenu = retenu
+        # ModelSerializer.get_fields copie tous les champs déclarés : on ne lui montre que les retenus
+        self._declared_fields = {nom: champ for nom, champ in type(self)._declared_fields.items() if retenu(nom)}
+        try:
+            fields = super().get_fields()
+        finally:
+            del self._declared_fields
+        for nom in imbriques & fields.keys():
+            enfant = fields[nom].child if isinstance(fields[nom], serializers.ListSerializer) else fields[nom]
+            if isinstance(enfant, DynamicFieldsModelSerializer):
+                enfant._champs = (champs or {}).get(nom) or None
+                enfant._expand = expand.get(nom, {})
+        return fields
+
+    def get_field_names(self, declared_fields, info):
+        noms = super().get_field_names(declared_fields, info)
+        retenu = getattr(self, '_retenu', None)
+        return noms if retenu is None else [nom for nom in noms if retenu(nom)]
+
+class UtilisateurSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Utilisateur
         fields = (
@@ -61,13 +128,13 @@ class LoginSerializer(serializers.Serializer):
         data["user"] = user
         return data
 
-class CooperativeSerializer(serializers.ModelSerializer):
+class CooperativeSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Cooperative
         fields = '__all__'
         read_only_fields = ['id', 'date_creation']
 
-class MembreSerializer(serializers.ModelSerializer):
+class MembreSerializer(DynamicFieldsModelSerializer):
     utilisateur = serializers.PrimaryKeyRelatedField(
         queryset=Utilisateur.objects.all(), write_only=True
     )
@@ -94,7 +161,7 @@ class MembreSerializer(serializers.ModelSerializer):
 
         return data
 
-class CotisationSerializer(serializers.ModelSerializer):
+class CotisationSerializer(DynamicFieldsModelSerializer):
     membre = serializers.PrimaryKeyRelatedField(
         queryset=Membre.objects.all(), write_only=True
     )
@@ -112,7 +179,35 @@ class CotisationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({"membre": "Le membre est requis."})
         return data
 
-class PretSerializer(serializers.ModelSerializer):
+class CotisationBulkSerializer(serializers.ModelSerializer):
+    """Ligne d'un import en masse : le membre est résolu par la vue en une seule requête."""
+    membre = serializers.IntegerField()
+
+    class Meta:
+        model = Cotisation
+        fields = ['membre', 'montant', 'date_paiement', 'type', 'statut']
+
+class MarquerLuSerializer(serializers.Serializer):
+    """Corps de mark_read : une liste d'ids et/ou tout ce qui précède un horodatage."""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=5000)
+    avant = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if not data.get("ids") and not data.get("avant"):
+            raise serializers.ValidationError("Fournir 'ids' ou 'avant'.")
+        return data
+
+class StatutMasseSerializer(serializers.Serializer):
+    """Transition de statut en masse ; la vue fournit les statuts cibles autorisés dans le contexte."""
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=5000)
+    statut = serializers.CharField()
+
+    def validate_statut(self, value):
+        if value not in self.context["transitions"]:
+            raise serializers.ValidationError(f"Transition vers '{value}' non autorisée.")
+        return value
+
+class PretSerializer(DynamicFieldsModelSerializer):
     membre = serializers.PrimaryKeyRelatedField(queryset=Membre.objects.all())
     # si tu veux le détail en lecture:
     membre_detail = MembreSerializer(source="membre", read_only=True)
@@ -120,9 +215,10 @@ class PretSerializer(serializers.ModelSerializer):
     class Meta:
         model  = Pret
         fields = '__all__'
-        read_only_fields = ('date_demande', 'date_approbation')
+        read_only_fields = ('date_demande', 'date_approbation', 'montant_rembourse', 'solde_restant',
+                            'statut_avant_remboursement')
 
-class RemboursementSerializer(serializers.ModelSerializer):
+class RemboursementSerializer(DynamicFieldsModelSerializer):
     pret = serializers.PrimaryKeyRelatedField(queryset=Pret.objects.all())
     pret_detail = PretSerializer(source="pret", read_only=True)
 
@@ -131,16 +227,22 @@ class RemboursementSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('date_paiement',)
 
-class TransactionSerializer(serializers.ModelSerializer):
+class ScoreAnomalieSerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model  = ScoreAnomalie
+        fields = ('score', 'motifs', 'date_calcul')
+
+class TransactionSerializer(DynamicFieldsModelSerializer):
     membre = serializers.PrimaryKeyRelatedField(queryset=Membre.objects.all())
     membre_detail = MembreSerializer(source="membre", read_only=True)
+    anomalie = ScoreAnomalieSerializer(source="score_anomalie", read_only=True)
 
     class Meta:
         model  = Transaction
         fields = '__all__'
         read_only_fields = ('date_transaction',)
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(DynamicFieldsModelSerializer):
     expediteur = serializers.PrimaryKeyRelatedField(
         queryset=Utilisateur.objects.all(), required=False
     )
@@ -153,7 +255,24 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('date_envoi',)
 
-class NotificationSerializer(serializers.ModelSerializer):
+class MessageApercuSerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model  = Message
+        fields = ('id', 'expediteur', 'contenu', 'date_envoi', 'lu')
+
+class ConversationSerializer(DynamicFieldsModelSerializer):
+    """Entrée de la boîte de réception : une ParticipantConversation de l'utilisateur connecté."""
+    id = serializers.IntegerField(source="conversation_id", read_only=True)
+    correspondant_detail = UtilisateurSerializer(source="correspondant", read_only=True)
+    dernier_message = MessageApercuSerializer(source="conversation.dernier_message", read_only=True)
+    nb_messages = serializers.IntegerField(source="conversation.nb_messages", read_only=True)
+
+    class Meta:
+        model  = ParticipantConversation
+        fields = ('id', 'correspondant', 'correspondant_detail', 'dernier_message',
+                  'date_dernier_message', 'non_lus', 'nb_messages')
+
+class NotificationSerializer(DynamicFieldsModelSerializer):
     utilisateur = serializers.PrimaryKeyRelatedField(
         queryset=Utilisateur.objects.all(), required=False
     )
@@ -164,7 +283,7 @@ class NotificationSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('date_creation',)
 
-class AuditSerializer(serializers.ModelSerializer):
+class AuditSerializer(DynamicFieldsModelSerializer):
     utilisateur = serializers.PrimaryKeyRelatedField(
         queryset=Utilisateur.objects.all(), required=False
     )
@@ -175,7 +294,7 @@ class AuditSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('date_creation',)
 
-class EvenementSerializer(serializers.ModelSerializer):
+class EvenementSerializer(DynamicFieldsModelSerializer):
     cooperative = serializers.PrimaryKeyRelatedField(queryset=Cooperative.objects.all())
     cooperative_detail = CooperativeSerializer(source="cooperative", read_only=True)
 
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 from decouple import config
 
@@ -93,6 +94,47 @@ CHANNEL_LAYERS = {
 
 OPENAI_API_KEY = config("OPENAI_API_KEY")
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
+# Taille maximale (tokens estimés) d'un paquet de transactions envoyé au LLM par l'audit nocturne
+AUDIT_CHUNK_TOKENS = 3000
+# Score (échelle z robuste) au-delà duquel une transaction est envoyée au LLM
+ANOMALIE_SEUIL = 3.5
+# Cache des réponses LLM (utils/llm_cache.py) : LRU en mémoire devant la table ReponseLLM
+LLM_CACHE_MEMORY_SIZE = 512
+LLM_CACHE_MAX_ENTRIES = 10000
+LLM_CACHE_TTL = timedelta(days=7)
+# Appels LLM simultanés par processus (vues async) et taille de la file d'attente avant 429
+LLM_MAX_CONCURRENT_CALLS = 4
+LLM_MAX_WAITING_CALLS = 16
+# explain_anomalies : taille (tokens estimés) d'un prompt groupé et prompts simultanés
+EXPLAIN_BATCH_TOKENS = 2500
+EXPLAIN_MAX_CONCURRENCY = 4
+# Débit autorisé chez le fournisseur, partagé entre tous les processus (table QuotaLLM)
+LLM_REQUESTS_PER_MINUTE = 60
+LLM_TOKENS_PER_MINUTE = 90000
+LLM_EXPECTED_COMPLETION_TOKENS = 500
+# Attente maximale d'un appel avant LLMBusy (429)
+LLM_RATE_MAX_WAIT = 30
+# Disjoncteur : ouvert après N échecs consécutifs, pendant N secondes
+LLM_BREAKER_FAILURES = 5
+LLM_BREAKER_COOLDOWN = 30
+# Pipeline des notifications : "celery" (un task par lot) ou "thread" (traitement dans le processus,
+# pour les tests et le développement sans worker) ; fenêtre de regroupement en secondes
+NOTIFICATIONS_PIPELINE = "celery"
+NOTIFICATIONS_WINDOW = 0.05
+NOTIFICATIONS_MAX_BATCH = 500
+# Cache des réponses de lecture (utils/view_cache.py), invalidé par versions de modèles :
+# mémoire du processus par défaut, Redis dès que plusieurs processus servent l'API (CACHE_REDIS_URL)
+CACHE_REDIS_URL = config("CACHE_REDIS_URL", default="")
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "reponses": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_REDIS_URL}
+        if CACHE_REDIS_URL else
+        {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "reponses", "OPTIONS": {"MAX_ENTRIES": 5000}}
+    ),
+}
+VIEW_CACHE_ALIAS = "reponses"
+VIEW_CACHE_TIMEOUT = 3600
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -148,11 +190,9 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
-from datetime import timedelta
-
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'Audit_Numerique.authentication.JWTClaimsAuthentication',  # rôle, statut et coopératives lus dans le jeton, sans requête
         'rest_framework.authentication.SessionAuthentication',  # Optionnel : pour l'interface d'admin et les vues basées sur des sessions
         'rest_framework.authentication.BasicAuthentication',  # Optionnel : pour d'autres types d'auth si nécessaire
     ],
@@ -160,7 +200,7 @@ REST_FRAMEWORK = {
 }
 
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(days=5),      # Durée de validité du token d'accès
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),  # Durée de validité du token d'accès (ses claims de rôle peuvent dater d'autant)
     'REFRESH_TOKEN_LIFETIME': timedelta(days=5),        # Durée de validité du token de rafraîchissement
     'ROTATE_REFRESH_TOKENS': False,                    # Si True, un nouveau refresh token est généré à chaque refresh
     'BLACKLIST_AFTER_ROTATION': False,                 # Si True, l'ancien refresh token est invalidé après rotation
@@ -192,5 +232,9 @@ SIMPLE_JWT = {
 }
 
 CHANNEL_LAYERS = {
-    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        # messages en attente par socket : au-delà, group_send abandonne pour ce client lent
+        "CONFIG": {"capacity": 500, "expiry": 60},
+    }
 }
\ No newline at end of file
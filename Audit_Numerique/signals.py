@@ -1,8 +1,18 @@
 # Audit_Numerique/signals.py
-from django.db.models.signals import post_save, post_migrate
+from decimal import Decimal
+
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
 from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from .models import Pret, Remboursement, Notification, Cotisation, Transaction
+from .models import (
+    Pret, Remboursement, Cotisation, Transaction,
+    Cooperative, Membre, BilanCooperative, Notification, Message, CompteurNonLus, Conversation, Evenement,
+    SerieFinanciere, ScoreAnomalie,
+)
+from .utils.llm_cache import get_response_cache
+from .utils.notifications import publish
+from .utils.view_cache import bump_version
 
 User = get_user_model()
 
@@ -26,48 +36,365 @@ def create_superadmin(sender, app_config, **kwargs):
 
 
 # ---------- Notifications & transactions ----------
+# Les notifications partent après commit vers le pipeline (utils/notifications.py) :
+# la requête ne paie qu'un queue.put, elles s'écrivent par lots en arrière-plan.
+# Les écritures comptables, elles, restent dans la transaction de la ligne qui les produit.
 @receiver(post_save, sender=Pret)
 def pret_notifications(sender, instance, created, **kwargs):
-    if created and instance.membre.cooperative.admin:
-        Notification.objects.create(
-            utilisateur=instance.membre.cooperative.admin,
-            type="pret",
-            contenu=f"Nouvelle demande de prêt de {instance.membre.utilisateur.get_full_name()} pour {instance.montant}."
-        )
-    elif not created and instance.statut in ["approuve", "rejete"]:
-        Notification.objects.create(
-            utilisateur=instance.membre.utilisateur,
-            type="pret",
-            contenu=f"Votre demande de prêt de {instance.montant} a été {instance.get_statut_display().lower()}."
-        )
+    precedent = getattr(instance, "_etat_bilan", None)
+    if created:
+        publish("pret_demande", pret=instance.pk, montant=str(instance.montant))
+    elif instance.statut in ["approuve", "rejete"] and (precedent is None or precedent["statut"] != instance.statut):
+        publish("pret_decision", pret=instance.pk, montant=str(instance.montant),
+                statut=instance.get_statut_display().lower())
+
+
+# seuls les prêts accordés et non soldés peuvent être soldés ; une demande ou un rejet ne bouge pas
+STATUTS_PRETS_SOLDABLES = ("approuve", "en_cours", "en_retard")
+
+
+def _maj_statut_remboursement(pret_id):
+    """
+    Bascule le statut d'après solde_restant, par UPDATE conditionnel (pas d'agrégat, pas de save()).
+    Un prêt soldé mémorise son statut précédent, rétabli si le solde redevient positif.
+    """
+    pret = Pret.objects.filter(pk=pret_id).values(
+        "statut", "statut_avant_remboursement", "montant", "solde_restant",
+        "membre__cooperative_id", "membre__utilisateur_id",
+    ).first()
+    if pret is None:
+        return None
+    if pret["solde_restant"] <= 0 and pret["statut"] in STATUTS_PRETS_SOLDABLES:
+        statut, avant = "rembourse", pret["statut"]
+    elif pret["solde_restant"] > 0 and pret["statut"] == "rembourse":
+        # remboursement annulé ou corrigé : statut d'avant le solde (approuvé pour les prêts soldés sans trace)
+        statut, avant = pret["statut_avant_remboursement"] or "approuve", ""
+    else:
+        return None
+    maj = Pret.objects.filter(pk=pret_id, statut=pret["statut"]).update(
+        statut=statut, statut_avant_remboursement=avant, date_mise_a_jour=timezone.now()
+    )
+    if not maj:
+        return None  # déjà basculé par une écriture concurrente
+    # QuerySet.update ne déclenche pas les signaux : on reporte nous-mêmes la variation au bilan
+    en_cours = BilanCooperative.STATUTS_PRETS_EN_COURS
+    BilanCooperative.appliquer(
+        pret["membre__cooperative_id"],
+        total_prets=(pret["montant"] if statut in en_cours else 0)
+        - (pret["montant"] if pret["statut"] in en_cours else 0),
+    )
+    if statut == "rembourse":
+        publish("notification", pret=pret_id, utilisateur=pret["membre__utilisateur_id"], type="remboursement",
+                contenu=f"Votre prêt de {pret['montant']} est désormais remboursé.")
+    return statut
+
+
+@receiver(post_save, sender=Pret)
+def maj_statut_apres_modification(sender, instance, created, **kwargs):
+    """Un montant corrigé peut solder (ou rouvrir) le prêt ; Pret.save relit ensuite le statut."""
+    precedent = getattr(instance, "_etat_bilan", None)
+    if precedent and precedent["montant"] != Decimal(str(instance.montant)):
+        _maj_statut_remboursement(instance.pk)
 
 
 @receiver(post_save, sender=Remboursement)
 def update_pret_status(sender, instance, created, **kwargs):
-    if not created:
+    # état précédent mémorisé par memoriser_etat_bilan (pre_save)
+    precedent = getattr(instance, "_etat_bilan", None)
+    actuel = _etat(Remboursement, instance)
+    if precedent == actuel:
         return
-    pret = instance.pret
-    total = pret.remboursements.aggregate(somme=Pret.Sum("montant"))["somme"] or 0
-    if total >= pret.montant:
-        pret.statut = "rembourse"
-        pret.save()
-        Notification.objects.create(
-            utilisateur=pret.membre.utilisateur,
-            type="remboursement",
-            contenu=f"Votre prêt de {pret.montant} est désormais remboursé."
-        )
+    if precedent:
+        Pret.appliquer_remboursement(precedent["pret_id"], -precedent["montant"])
+    Pret.appliquer_remboursement(actuel["pret_id"], actuel["montant"])
+    for pret_id in {actuel["pret_id"], precedent["pret_id"] if precedent else actuel["pret_id"]}:
+        _maj_statut_remboursement(pret_id)
+
+
+@receiver(post_delete, sender=Remboursement)
+def annuler_remboursement(sender, instance, origin=None, **kwargs):
+    # suppression en cascade d'un prêt (ou d'un membre) : le prêt disparaît aussi
+    if origin is not None and getattr(origin, "model", type(origin)) is not Remboursement:
+        return
+    Pret.appliquer_remboursement(instance.pret_id, -Decimal(str(instance.montant)))
+    _maj_statut_remboursement(instance.pret_id)
 
 
 @receiver(post_save, sender=Cotisation)
 def cotisation_transaction(sender, instance, created, **kwargs):
+    """Écriture comptable synchrone (Cotisation.save est atomique) : elle ne passe pas par le pipeline."""
     if created or instance.statut != "validee":
         return
-    ref = f"COT-{instance.id}"
-    if not Transaction.objects.filter(reference=ref).exists():
-        Transaction.objects.create(
-            type="cotisation",
-            montant=instance.montant,
-            membre=instance.membre,
-            description=f"Cotisation {instance.get_type_display()}",
-            reference=ref,
-        )
+    Transaction.objects.bulk_create([
+        Cotisation.ecriture(instance.pk, instance.montant, instance.membre_id, instance.type)
+    ], ignore_conflicts=True)
+
+
+# ---------- Bilan des coopératives ----------
+# Champs dont dépend la contribution d'une ligne au bilan de sa coopérative.
+CHAMPS_BILAN = {
+    Membre: ("cooperative_id", "actif"),
+    Cotisation: ("membre_id", "statut", "montant"),
+    Pret: ("membre_id", "statut", "montant"),
+    Remboursement: ("pret_id", "montant"),
+}
+
+# Champs dont dépend la place d'une ligne dans les séries du tableau de bord (compte ou non, période, montant).
+CHAMPS_SERIES = {
+    Cotisation: ("membre_id", "statut", "montant", "date_paiement"),
+    Pret: ("membre_id", "statut", "montant", "date_demande", "date_approbation"),
+    Remboursement: ("pret_id", "montant", "date_paiement"),
+}
+
+
+def _cooperative_du_membre(membre_id):
+    return Membre.objects.filter(pk=membre_id).values_list("cooperative_id", flat=True).first()
+
+
+def _contribution(sender, etat):
+    """Retourne (cooperative_id, variations) représentant la part d'une ligne dans le bilan."""
+    if sender is Membre:
+        return etat["cooperative_id"], {"nb_membres": 1, "nb_membres_actifs": 1 if etat["actif"] else 0}
+    if sender is Cotisation:
+        montant = etat["montant"] if etat["statut"] == "validee" else 0
+        return _cooperative_du_membre(etat["membre_id"]), {"total_cotisations": montant}
+    if sender is Pret:
+        montant = etat["montant"] if etat["statut"] in BilanCooperative.STATUTS_PRETS_EN_COURS else 0
+        return _cooperative_du_membre(etat["membre_id"]), {"total_prets": montant}
+    cooperative_id = Pret.objects.filter(pk=etat["pret_id"]).values_list(
+        "membre__cooperative_id", flat=True
+    ).first()
+    return cooperative_id, {"total_remboursements": etat["montant"]}
+
+
+def _etat(sender, instance):
+    etat = {champ: getattr(instance, champ) for champ in CHAMPS_BILAN[sender]}
+    if "montant" in etat:
+        etat["montant"] = Decimal(str(etat["montant"]))
+    return etat
+
+
+@receiver(post_save, sender=Cooperative)
+def creer_bilan(sender, instance, created, **kwargs):
+    if created:
+        BilanCooperative.objects.get_or_create(cooperative=instance)
+
+
+@receiver(pre_save, sender=Membre)
+@receiver(pre_save, sender=Cotisation)
+@receiver(pre_save, sender=Pret)
+@receiver(pre_save, sender=Remboursement)
+def memoriser_etat_bilan(sender, instance, update_fields=None, **kwargs):
+    """
+    Garde l'état en base avant écriture pour ne reporter que la différence (bilan et séries, une requête).
+    Un champ suivi hors de update_fields n'est pas écrit : l'instance reprend sa valeur en base
+    (ex. statut d'un prêt soldé entre-temps), sinon les deltas et les notifications la contrediraient.
+    """
+    instance._etat_bilan = instance._etat_series = None
+    if not instance.pk:
+        return
+    champs = dict.fromkeys(CHAMPS_BILAN[sender] + CHAMPS_SERIES.get(sender, ()))
+    etat = sender.objects.filter(pk=instance.pk).values(*champs).first()
+    if etat and update_fields is not None:
+        for champ in champs:
+            field = sender._meta.get_field(champ)
+            if field.name not in update_fields and field.attname not in update_fields:
+                setattr(instance, field.attname, etat[champ])
+    if etat:
+        instance._etat_bilan = {champ: etat[champ] for champ in CHAMPS_BILAN[sender]}
+        if sender in CHAMPS_SERIES:
+            instance._etat_series = {champ: etat[champ] for champ in CHAMPS_SERIES[sender]}
+
+
+@receiver(post_save, sender=Membre)
+@receiver(post_save, sender=Cotisation)
+@receiver(post_save, sender=Pret)
+@receiver(post_save, sender=Remboursement)
+def maj_bilan_enregistrement(sender, instance, **kwargs):
+    precedent = getattr(instance, "_etat_bilan", None)
+    actuel = _etat(sender, instance)
+    if precedent == actuel:
+        return
+    if sender is Membre and precedent and precedent["cooperative_id"] != actuel["cooperative_id"]:
+        # l'historique financier du membre change de coopérative : cas rare, on recalcule
+        BilanCooperative.recalculer(precedent["cooperative_id"])
+        BilanCooperative.recalculer(actuel["cooperative_id"])
+        return
+    cooperative_id, deltas = _contribution(sender, actuel)
+    if precedent:
+        ancienne_cooperative_id, anciens = _contribution(sender, precedent)
+        if ancienne_cooperative_id != cooperative_id:
+            BilanCooperative.appliquer(ancienne_cooperative_id, **{k: -v for k, v in anciens.items()})
+        else:
+            deltas = {k: v - anciens.get(k, 0) for k, v in deltas.items()}
+    BilanCooperative.appliquer(cooperative_id, **deltas)
+
+
+@receiver(post_delete, sender=Membre)
+@receiver(post_delete, sender=Cotisation)
+@receiver(post_delete, sender=Pret)
+@receiver(post_delete, sender=Remboursement)
+def maj_bilan_suppression(sender, instance, **kwargs):
+    cooperative_id, deltas = _contribution(sender, _etat(sender, instance))
+    BilanCooperative.appliquer(cooperative_id, **{k: -v for k, v in deltas.items()})
+
+
+
+# ---------- Séries du tableau de bord ----------
+TYPES_SERIES = {Cotisation: "cotisation", Pret: "pret", Remboursement: "remboursement"}
+
+
+def _etat_series(sender, instance):
+    etat = {champ: getattr(instance, champ) for champ in CHAMPS_SERIES[sender]}
+    etat["montant"] = Decimal(str(etat["montant"]))
+    return etat
+
+
+def _operation_serie(sender, etat):
+    """(cooperative_id, date, montant) d'une ligne dans sa série, None si elle n'y compte pas."""
+    if sender is Cotisation:
+        if etat["statut"] != "validee":
+            return None
+        return _cooperative_du_membre(etat["membre_id"]), etat["date_paiement"], etat["montant"]
+    if sender is Pret:
+        if etat["statut"] not in SerieFinanciere.STATUTS_PRETS_ACCORDES:
+            return None
+        date = etat["date_approbation"] or etat["date_demande"]
+        return _cooperative_du_membre(etat["membre_id"]), date, etat["montant"]
+    cooperative_id = Pret.objects.filter(pk=etat["pret_id"]).values_list(
+        "membre__cooperative_id", flat=True
+    ).first()
+    return cooperative_id, etat["date_paiement"], etat["montant"]
+
+
+@receiver(post_save, sender=Cotisation)
+@receiver(post_save, sender=Pret)
+@receiver(post_save, sender=Remboursement)
+def maj_series_enregistrement(sender, instance, **kwargs):
+    # état précédent mémorisé par memoriser_etat_bilan (pre_save)
+    precedent = getattr(instance, "_etat_series", None)
+    actuel = _etat_series(sender, instance)
+    if precedent == actuel:
+        return
+    operations = []
+    ancienne = _operation_serie(sender, precedent) if precedent else None
+    if ancienne:
+        operations.append((*ancienne, -1))
+    nouvelle = _operation_serie(sender, actuel)
+    if nouvelle:
+        operations.append((*nouvelle, 1))
+    # retrait et ajout dans la même période se compensent en un seul UPDATE
+    SerieFinanciere.appliquer_lot(TYPES_SERIES[sender], operations)
+
+
+@receiver(post_delete, sender=Cotisation)
+@receiver(post_delete, sender=Pret)
+@receiver(post_delete, sender=Remboursement)
+def maj_series_suppression(sender, instance, **kwargs):
+    operation = _operation_serie(sender, _etat_series(sender, instance))
+    if operation:
+        cooperative_id, date, montant = operation
+        SerieFinanciere.appliquer(cooperative_id, TYPES_SERIES[sender], date, montant, -1)
+
+# ---------- Compteurs de non-lus ----------
+# (champ utilisateur, champ lu, compteur) ; les notifications créées par lot passent par
+# le pipeline (utils/notifications.py), qui tient lui-même les compteurs.
+CHAMPS_NON_LUS = {
+    Notification: ("utilisateur_id", "lue", "notifications"),
+    Message: ("destinataire_id", "lu", "messages"),
+}
+
+
+def _non_lu(sender, etat):
+    champ_utilisateur, champ_lu, _ = CHAMPS_NON_LUS[sender]
+    return etat[champ_utilisateur], 0 if etat[champ_lu] else 1
+
+
+@receiver(pre_save, sender=Notification)
+@receiver(pre_save, sender=Message)
+def memoriser_etat_non_lus(sender, instance, **kwargs):
+    instance._etat_non_lus = None
+    if instance.pk:
+        instance._etat_non_lus = sender.objects.filter(pk=instance.pk).values(*CHAMPS_NON_LUS[sender][:2]).first()
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_save, sender=Message)
+def maj_non_lus_enregistrement(sender, instance, **kwargs):
+    champs = CHAMPS_NON_LUS[sender]
+    actuel = _non_lu(sender, {champ: getattr(instance, champ) for champ in champs[:2]})
+    precedent = getattr(instance, "_etat_non_lus", None)
+    precedent = _non_lu(sender, precedent) if precedent else None
+    if precedent == actuel:
+        return
+    if precedent:
+        CompteurNonLus.appliquer(precedent[0], **{champs[2]: -precedent[1]})
+    CompteurNonLus.appliquer(actuel[0], **{champs[2]: actuel[1]})
+    for utilisateur_id in {actuel[0], precedent[0] if precedent else actuel[0]}:
+        publish("non_lus", utilisateur=utilisateur_id)
+
+
+@receiver(post_delete, sender=Notification)
+@receiver(post_delete, sender=Message)
+def maj_non_lus_suppression(sender, instance, **kwargs):
+    champs = CHAMPS_NON_LUS[sender]
+    utilisateur_id, non_lu = _non_lu(sender, {champ: getattr(instance, champ) for champ in champs[:2]})
+    if non_lu:
+        CompteurNonLus.appliquer(utilisateur_id, **{champs[2]: -1})
+        publish("non_lus", utilisateur=utilisateur_id)
+
+
+# ---------- Conversations ----------
+@receiver(pre_save, sender=Message)
+def rattacher_conversation(sender, instance, **kwargs):
+    if instance.conversation_id is None:
+        instance.conversation = Conversation.entre(instance.expediteur_id, instance.destinataire_id,
+                                                   instance.date_envoi)
+
+
+@receiver(post_save, sender=Message)
+def maj_conversation(sender, instance, created, **kwargs):
+    if created:
+        Conversation.ajouter(instance)
+        return
+    # état précédent mémorisé par memoriser_etat_non_lus (pre_save)
+    precedent = getattr(instance, "_etat_non_lus", None)
+    if precedent and precedent["lu"] != instance.lu:
+        Conversation.marquer(instance.conversation_id, instance.destinataire_id, -1 if instance.lu else 1)
+
+
+@receiver(post_delete, sender=Message)
+def retirer_de_conversation(sender, instance, origin=None, **kwargs):
+    # suppression en cascade d'une conversation ou d'un utilisateur : rien à reporter
+    if origin is not None and getattr(origin, "model", type(origin)) is not Message:
+        return
+    Conversation.retirer(instance)
+
+
+# ---------- Cache des réponses LLM ----------
+@receiver(post_save, sender=Transaction)
+def invalider_explications(sender, instance, created, **kwargs):
+    """Une transaction modifiée rend caduques les explications mises en cache à son sujet."""
+    if not created:
+        get_response_cache().invalidate_transaction(instance.pk)
+
+
+@receiver(post_save, sender=Transaction)
+def remettre_en_audit(sender, instance, created, **kwargs):
+    """Une transaction modifiée après son audit repasse dans la file de l'audit nocturne (rescorée d'abord)."""
+    if not created:
+        ScoreAnomalie.objects.filter(transaction_id=instance.pk, date_audit__isnull=False).update(date_audit=None)
+
+
+# ---------- Cache des réponses de lecture ----------
+# modèles dont les versions entrent dans les clés de utils/view_cache.py (coopératives, membres, événements)
+@receiver(post_save, sender=Cooperative)
+@receiver(post_save, sender=Membre)
+@receiver(post_save, sender=Evenement)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=Cooperative)
+@receiver(post_delete, sender=Membre)
+@receiver(post_delete, sender=Evenement)
+@receiver(post_delete, sender=User)
+def invalider_reponses(sender, **kwargs):
+    bump_version(sender)
@@ -0,0 +1,20 @@
+from django.test import TestCase
+
+from Audit_Numerique.management.commands.verifier_index import cas_a_verifier, scan_sequentiel, semer
+
+# assez de lignes pour que le planificateur préfère un index à un parcours complet
+LIGNES = 5000
+
+
+class PlansDeRequeteTests(TestCase):
+    """Chaque combinaison filtre/tri des viewsets reste servie par un index (EXPLAIN)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        semer(LIGNES)
+
+    def test_aucun_parcours_sequentiel(self):
+        for nom, queryset in cas_a_verifier().items():
+            with self.subTest(nom):
+                plan = queryset.explain()
+                self.assertFalse(scan_sequentiel(plan, queryset.model._meta.db_table), f"{nom}\n{plan}")
@@ -0,0 +1,78 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from Audit_Numerique.models import (
+    Audit, Cooperative, Cotisation, Evenement, Membre, Message, Notification,
+    ParticipantConversation, Pret, Remboursement, ScoreAnomalie, Transaction, Utilisateur,
+)
+
+N = 5
+
+# le cache de réponses servirait la seconde lecture sans requête : on mesure le chemin complet
+SANS_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "reponses": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+
+
+@override_settings(CACHES=SANS_CACHE)
+class NombreDeRequetesTests(TestCase):
+    """Le nombre de requêtes d'une liste ne dépend pas du nombre de lignes (pas de N+1)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Utilisateur.objects.create_user(username="admin", password="x", is_staff=True)
+        cls.correspondant = Utilisateur.objects.create_user(username="correspondant", password="x")
+        cls.cooperative = Cooperative.objects.create(nom="Coop", description="", admin=cls.admin)
+        cls.membre = Membre.objects.create(utilisateur=cls.correspondant, cooperative=cls.cooperative)
+        cls.rangs = 0
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def semer(self, n):
+        """n lignes de plus dans chaque table lue par les listes."""
+        for _ in range(n):
+            type(self).rangs += 1
+            rang = self.rangs
+            utilisateur = Utilisateur.objects.create_user(username=f"u{rang}", password="x")
+            membre = Membre.objects.create(utilisateur=utilisateur, cooperative=self.cooperative)
+            for m in (membre, self.membre):
+                Cotisation.objects.create(membre=m, montant=10, statut="validee")
+                pret = Pret.objects.create(membre=m, montant=100, motif="", statut="approuve")
+                Remboursement.objects.create(pret=pret, montant=10)
+                transaction = Transaction.objects.create(membre=m, montant=10, type="cotisation",
+                                                         description="", reference=f"T-{rang}-{m.pk}")
+                ScoreAnomalie.objects.create(transaction=transaction, score=5, motifs=["test"])
+            Evenement.objects.create(titre="E", description="", cooperative=self.cooperative)
+            Notification.objects.create(utilisateur=self.admin, type="systeme", contenu="")
+            Audit.objects.create(type=Audit.TYPE_CHOICES[0][0], description="", utilisateur=utilisateur)
+            Message.objects.create(expediteur=utilisateur, destinataire=self.admin, contenu="")
+            Message.objects.create(expediteur=self.correspondant, destinataire=self.admin, contenu="")
+
+    def urls(self):
+        conversation = ParticipantConversation.objects.get(utilisateur=self.admin, correspondant=self.correspondant)
+        return [
+            "/utilisateurs/", "/cooperatives/", "/membres/", "/cotisations/", "/cotisations/?fast=0",
+            "/prets/", "/remboursements/", "/transactions/", "/transactions/?fast=0",
+            "/transactions/suspectes/?seuil=0", "/notifications/", "/evenements/", "/messages/",
+            "/messages/conversations/", f"/messages/conversations/{conversation.conversation_id}/", "/audits/",
+            f"/membres/{self.membre.pk}/cotisations/", f"/membres/{self.membre.pk}/prets/",
+            f"/membres/{self.membre.pk}/transactions/", f"/cooperatives/{self.cooperative.pk}/membres/",
+            f"/cooperatives/{self.cooperative.pk}/evenements/",
+        ]
+
+    def nombre_de_requetes(self, url):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200, url)
+        return len(requetes)
+
+    def test_nombre_de_requetes_constant(self):
+        self.semer(N)
+        attendus = {url: self.nombre_de_requetes(url) for url in self.urls()}
+        self.semer(3 * N)  # 4N lignes
+        for url, attendu in attendus.items():
+            with self.subTest(url=url), self.assertNumQueries(attendu):
+                self.client.get(url, HTTP_ACCEPT="application/json")
@@ -6,7 +6,7 @@ from rest_framework import routers
 
 from . import views
 from .routing import websocket_urlpatterns
-from .views import RolesView
+from .views import RolesView, LLMMetriquesView, CacheMetriquesView, NonLusView
 
 router = routers.DefaultRouter()
 router.register(r'utilisateurs', views.UtilisateurViewSet, basename='utilisateur')
@@ -41,4 +41,7 @@ urlpatterns = [
     path("chat/", views.chat, name="chat"),
     path('ws/', include(websocket_urlpatterns)),
     path('roles/', RolesView.as_view(), name='roles'),
+    path('llm/metriques/', LLMMetriquesView.as_view(), name='llm-metriques'),
+    path('cache/metriques/', CacheMetriquesView.as_view(), name='cache-metriques'),
+    path('me/unread/', NonLusView.as_view(), name='me-unread'),
 ]
@@ -0,0 +1,237 @@
+import logging
+from datetime import datetime
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, FloatField, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from Audit_Numerique.models import Transaction, ScoreAnomalie
+
+logger = logging.getLogger(__name__)
+
+# Every component is expressed on a robust z-score scale so a single threshold applies.
+Z_MAX = 10.0
+MIN_HISTORY = 5            # below this, a member/cooperative group has no meaningful distribution
+RELATIVE_FLOOR = 0.05      # amounts within 5% of the median are never outliers
+BURST_WINDOW = 3600        # seconds
+MOTIFS = ("montant_membre", "montant_cooperative", "iqr", "rafale", "types")
+
+
+def default_threshold() -> float:
+    return float(getattr(settings, "ANOMALIE_SEUIL", 3.5))
+
+
+def _dense(*keys: np.ndarray) -> np.ndarray:
+    """Dense group index (0..G-1) for the combination of integer key arrays."""
+    combined = np.zeros(len(keys[0]), dtype=np.int64)
+    for key in keys:
+        _, key = np.unique(key, return_inverse=True)
+        combined = combined * (int(key.max()) + 1 if len(key) else 1) + key
+    _, inverse = np.unique(combined, return_inverse=True)
+    return inverse.ravel()
+
+
+def _group_quantiles(values: np.ndarray, groups: np.ndarray, qs: Tuple[float, ...]) -> List[np.ndarray]:
+    """Per-group quantiles (linear interpolation) with a single sort."""
+    order = np.lexsort((values, groups))
+    v = values[order]
+    counts = np.bincount(groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    out = []
+    for q in qs:
+        pos = starts + q * (counts - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        out.append(v[lo] + (v[hi] - v[lo]) * (pos - lo))
+    return out
+
+
+def _robust_z(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """|x - median| / (1.4826 * MAD) within each group."""
+    (median,) = _group_quantiles(values, groups, (0.5,))
+    dev = np.abs(values - median[groups])
+    (mad,) = _group_quantiles(dev, groups, (0.5,))
+    scale = np.maximum(1.4826 * mad, RELATIVE_FLOOR * np.abs(median))[groups]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(scale > 0, dev / scale, np.where(dev > 0, Z_MAX, 0.0))
+    z[np.bincount(groups)[groups] < MIN_HISTORY] = 0.0
+    return np.minimum(z, Z_MAX)
+
+
+def _iqr_score(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """Distance beyond the Tukey fences, mapped onto the z scale (fence ≈ 2.7σ, 1 IQR ≈ 1.35σ)."""
+    q1, q3 = _group_quantiles(values, groups, (0.25, 0.75))
+    iqr = np.maximum(q3 - q1, RELATIVE_FLOOR * np.abs(q3))[groups]
+    low, high = (q1[groups] - 1.5 * iqr), (q3[groups] + 1.5 * iqr)
+    excess = np.maximum(values - high, low - values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        units = np.where(iqr > 0, excess / iqr, np.where(excess > 0, Z_MAX, 0.0))
+    score = np.where(excess > 0, 2.7 + 1.35 * units, 0.0)
+    score[np.bincount(groups)[groups] < MIN_HISTORY] = 0.0
+    return np.minimum(score, Z_MAX)
+
+
+def _burst_score(timestamps: np.ndarray, members: np.ndarray) -> np.ndarray:
+    """
+    Transactions of the same member in the preceding window, compared with the member's
+    average rate as a Poisson excess: (observed - expected) / sqrt(expected + 1).
+    """
+    m = _dense(members)
+    order = np.lexsort((timestamps, m))
+    ts = timestamps[order].astype(np.int64)
+    ms = m[order]
+    # (member, timestamp) packed in one monotonic int64 key -> one searchsorted for all windows
+    span = int(ts.max() - ts.min()) + 2 * BURST_WINDOW + 1 if len(ts) else 1
+    key = ms.astype(np.int64) * span + (ts - (ts.min() if len(ts) else 0))
+    in_window = np.arange(len(key)) - np.searchsorted(key, key - BURST_WINDOW, side="left") + 1
+
+    counts = np.bincount(ms)
+    ends = np.cumsum(counts)
+    first, last = ts[ends - counts], ts[ends - 1]
+    rate = counts / np.maximum(last - first, BURST_WINDOW)
+    expected = rate[ms] * BURST_WINDOW
+
+    score = np.empty(len(ts))
+    score[order] = (in_window - expected) / np.sqrt(expected + 1)
+    score[counts[m] < MIN_HISTORY] = 0.0
+    return np.clip(score, 0.0, Z_MAX)
+
+
+def _type_mix_score(members: np.ndarray, cooperatives: np.ndarray, types: np.ndarray) -> np.ndarray:
+    """Excess of a member's use of a type relative to the type's share in the cooperative."""
+    coop = _dense(cooperatives)
+    coop_type = _dense(cooperatives, types)
+    member = _dense(members)
+    member_type = _dense(members, types)
+    share = np.bincount(coop_type)[coop_type] / np.bincount(coop)[coop]
+    n_member = np.bincount(member)[member]
+    observed = np.bincount(member_type)[member_type]
+    expected = n_member * share
+    score = (observed - expected) / np.sqrt(expected + 1)
+    score[n_member < MIN_HISTORY] = 0.0
+    return np.clip(score, 0.0, Z_MAX)
+
+
+def score_arrays(montants: np.ndarray, timestamps: np.ndarray, members: np.ndarray,
+                 cooperatives: np.ndarray, types: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score every transaction over the full history at once.
+    Returns (score, components) where components has one column per entry of MOTIFS
+    and score is the row-wise maximum.
+    """
+    if not len(montants):
+        return np.zeros(0), np.zeros((0, len(MOTIFS)))
+    cooperative_type = _dense(cooperatives, types)
+    components = np.column_stack([
+        _robust_z(montants, _dense(members, types)),
+        _robust_z(montants, cooperative_type),
+        _iqr_score(montants, cooperative_type),
+        _burst_score(timestamps, members),
+        _type_mix_score(members, cooperatives, types),
+    ])
+    return components.max(axis=1), components
+
+
+def _columns(queryset, fields, dtypes, converters=None, chunk_size: int = 10000) -> List[np.ndarray]:
+    """
+    Stream values_list(*fields) by chunks of chunk_size rows; each column of a chunk goes
+    straight into a typed array (np.fromiter), optionally through a converter.
+    """
+    converters = converters or {}
+    rows = queryset.order_by().values_list(*fields).iterator(chunk_size=chunk_size)
+    parts = [[] for _ in fields]
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        for i, column in enumerate(zip(*chunk)):
+            convert = converters.get(i)
+            values = map(convert, column) if convert else column
+            parts[i].append(np.fromiter(values, dtype=dtypes[i], count=len(chunk)))
+    return [np.concatenate(part) if part else np.zeros(0, dtype=dtype) for part, dtype in zip(parts, dtypes)]
+
+
+def load_arrays(queryset=None, chunk_size: int = 10000) -> Dict[str, np.ndarray]:
+    queryset = Transaction.objects.all() if queryset is None else queryset
+    type_codes = {code: i for i, (code, _) in enumerate(Transaction.TYPE_CHOICES)}
+    ids, montants, timestamps, members, cooperatives, types = _columns(
+        # montant converti par la base : pas de Decimal intermédiaire
+        queryset.annotate(montant_float=Cast("montant", FloatField())),
+        ("id", "montant_float", "date_transaction", "membre_id", "membre__cooperative_id", "type"),
+        (np.int64, np.float64, np.float64, np.int64, np.int64, np.int64),
+        {2: datetime.timestamp, 5: lambda t: type_codes.get(t, len(type_codes))},
+        chunk_size,
+    )
+    return {
+        "ids": ids, "montants": montants, "timestamps": timestamps,
+        "members": members, "cooperatives": cooperatives, "types": types,
+    }
+
+
+def _stale(ids: np.ndarray, scores: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Rows to (re)write: no ScoreAnomalie yet, a different score, a score at or above the
+    threshold (motifs and date_calcul refreshed), or stored motifs that must be cleared.
+    """
+    known, stored, had_motifs = _columns(
+        ScoreAnomalie.objects.annotate(avec_motifs=ExpressionWrapper(~Q(motifs=[]), output_field=BooleanField())),
+        ("transaction_id", "score", "avec_motifs"),
+        (np.int64, np.float64, np.bool_),
+    )
+    if not len(known):
+        return np.ones(len(ids), dtype=bool)
+    order = np.argsort(known)
+    known, stored, had_motifs = known[order], stored[order], had_motifs[order]
+    pos = np.minimum(np.searchsorted(known, ids), len(known) - 1)
+    found = known[pos] == ids
+    return ~found | (stored[pos] != scores) | (scores >= threshold) | (found & had_motifs[pos])
+
+
+def save_scores(ids: np.ndarray, scores: np.ndarray, components: np.ndarray, threshold: float,
+                batch_size: int = 5000) -> int:
+    """Upsert the ScoreAnomalie rows that changed; returns how many were written."""
+    stale = _stale(ids, scores, threshold)
+    now = timezone.now()
+    names = np.asarray(MOTIFS)
+    flagged = components[stale] >= threshold
+    objs = (
+        ScoreAnomalie(transaction_id=int(id_), score=float(score), motifs=names[row].tolist(), date_calcul=now)
+        for id_, score, row in zip(ids[stale], scores[stale], flagged)
+    )
+    batch = []
+    for obj in objs:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            _upsert(batch)
+            batch = []
+    if batch:
+        _upsert(batch)
+    return int(stale.sum())
+
+
+def score_transactions(queryset=None, threshold: Optional[float] = None, batch_size: int = 5000) -> int:
+    """
+    Score the transactions (all by default, since member/cooperative baselines need the
+    full history), upsert the ScoreAnomalie rows that changed and return how many reach
+    the threshold.
+    """
+    threshold = default_threshold() if threshold is None else threshold
+    data = load_arrays(queryset)
+    scores, components = score_arrays(
+        data["montants"], data["timestamps"], data["members"], data["cooperatives"], data["types"]
+    )
+    written = save_scores(data["ids"], scores, components, threshold, batch_size)
+    nb = int((scores >= threshold).sum())
+    logger.info("Scored %s transactions (%s written), %s above %.2f", len(scores), written, nb, threshold)
+    return nb
+
+
+def _upsert(batch: List[ScoreAnomalie]) -> None:
+    ScoreAnomalie.objects.bulk_create(
+        batch, update_conflicts=True, unique_fields=["transaction"],
+        update_fields=["score", "motifs", "date_calcul"],
+    )
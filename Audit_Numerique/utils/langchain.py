@@ -1,11 +1,18 @@
 import os
+import json
 import time
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
 
+from asgiref.sync import async_to_sync, sync_to_async
 from django.conf import settings
 
-from Audit_Numerique.models import Transaction
+from Audit_Numerique.models import Transaction, ScoreAnomalie, Audit
+from Audit_Numerique.utils.llm_cache import cache_key, get_response_cache, timed
+from Audit_Numerique.utils.llm_limits import (
+    LLMBusy, LLMUnavailable, get_circuit_breaker, get_concurrency_limiter, get_rate_limiter,
+)
 
 # Try the new langchain-openai package first, fall back for compatibility
 try:
@@ -18,16 +25,21 @@ except Exception:
         from langchain.chat_models import ChatOpenAI  # type: ignore
 
 from langchain.prompts import ChatPromptTemplate
-from langchain.schema import HumanMessage
+from langchain.schema import HumanMessage, AIMessage, SystemMessage
 
-# Optional: import openai exceptions to detect quota errors (if openai is installed)
+# openai>=1 exceptions, to tell a provider 429 from any other failure. Without the package
+# the fallbacks are never raised, so nothing is mistaken for a rate limit.
 try:
-    import openai
-    from openai.error import RateLimitError, OpenAIError  # type: ignore
-except Exception:
-    openai = None
-    RateLimitError = Exception
-    OpenAIError = Exception
+    from openai import APIStatusError, OpenAIError, RateLimitError
+except ImportError:
+    class OpenAIError(Exception):
+        pass
+
+    class APIStatusError(OpenAIError):
+        status_code = None
+
+    class RateLimitError(APIStatusError):
+        pass
 
 logger = logging.getLogger(__name__)
 
@@ -87,32 +99,108 @@ def _extract_text_from_response(resp: Any) -> str:
         return ""
 
 
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for OpenAI models: good enough to bound a prompt
+    return len(text) // 4 + 1
+
+
+def _call_tokens(llm: ChatOpenAI, messages: list) -> int:
+    """Tokens a call is charged against the shared budget: prompt estimate plus expected completion."""
+    completion = getattr(llm, "max_tokens", None) or getattr(settings, "LLM_EXPECTED_COMPLETION_TOKENS", 500)
+    return sum(estimate_tokens(str(m.content)) for m in messages) + completion
+
+
+def _is_rate_limit(exc: Exception) -> bool:
+    """Only an actual provider 429 (rate limit or insufficient_quota) may throttle the shared bucket."""
+    if not isinstance(exc, APIStatusError):
+        return False
+    return exc.status_code == 429 or getattr(exc, "code", None) == "insufficient_quota"
+
+
 def _call_llm_with_retries(llm: ChatOpenAI, messages: list, max_retries: int = 3) -> str:
     """
-    Call the LLM with simple exponential backoff for rate-limit/quota errors.
+    Call the LLM through the shared rate limiter and circuit breaker (utils/llm_limits.py).
+    A rate-limit/quota error drains the shared bucket for an exponentially growing delay,
+    so every worker backs off together. Raises LLMUnavailable while the circuit is open
+    and LLMBusy when the budget is not available within LLM_RATE_MAX_WAIT seconds.
     """
+    limiter, breaker = get_rate_limiter(), get_circuit_breaker()
+    breaker.check()
+    tokens = _call_tokens(llm, messages)
     backoff = 1.0
     for attempt in range(1, max_retries + 1):
+        limiter.acquire(tokens)
         try:
             # use the newer __call__ style: pass a list of HumanMessage for chat models
             resp = llm(messages)
-            text = _extract_text_from_response(resp)
-            return text
         except Exception as exc:
-            # Detect common OpenAI rate limit/errors if openai package present
-            is_rate_limit = isinstance(exc, RateLimitError) or (hasattr(exc, "code") and getattr(exc, "code") == "insufficient_quota")
+            is_rate_limit = _is_rate_limit(exc)
             logger.warning("LLM call failed (attempt %s/%s): %s", attempt, max_retries, exc)
+            if is_rate_limit and attempt < max_retries:
+                limiter.throttled(backoff)
+                backoff *= 2
+                continue
+            breaker.record_failure()
             if is_rate_limit:
-                # If it's a quota/limit error, don't spam retries — wait and retry a few times
-                if attempt == max_retries:
-                    logger.exception("Rate limit / quota error after retries.")
-                    raise
-                time.sleep(backoff)
+                logger.exception("Rate limit / quota error after retries.")
+            else:
+                logger.exception("Unexpected error calling LLM")
+            raise
+        breaker.record_success()
+        return _extract_text_from_response(resp)
+
+
+async def _acall_llm_with_retries(llm: ChatOpenAI, messages: list, max_retries: int = 3) -> str:
+    """
+    Async twin of _call_llm_with_retries: native async provider call, the same shared
+    limiter and breaker, and waits that do not block the event loop.
+    """
+    limiter, breaker = get_rate_limiter(), get_circuit_breaker()
+    await breaker.acheck()
+    tokens = _call_tokens(llm, messages)
+    backoff = 1.0
+    for attempt in range(1, max_retries + 1):
+        await limiter.aacquire(tokens)
+        try:
+            resp = await llm.ainvoke(messages)
+        except Exception as exc:
+            is_rate_limit = _is_rate_limit(exc)
+            logger.warning("Async LLM call failed (attempt %s/%s): %s", attempt, max_retries, exc)
+            if is_rate_limit and attempt < max_retries:
+                await sync_to_async(limiter.throttled)(backoff)
                 backoff *= 2
                 continue
-            # For other errors, re-raise after logging
-            logger.exception("Unexpected error calling LLM")
+            await sync_to_async(breaker.record_failure)()
+            raise
+        await sync_to_async(breaker.record_success)()
+        return _extract_text_from_response(resp)
+
+
+def _cached_call_llm(llm: ChatOpenAI, messages: list, model_name: str, temperature: float,
+                     transaction_id: Optional[int] = None) -> str:
+    """
+    _call_llm_with_retries behind the response cache (in-process LRU + ReponseLLM table),
+    keyed on model, temperature and the normalized prompt. Errors are never cached.
+    While the circuit breaker is open, an expired cached answer is served if there is one.
+    """
+    cache = get_response_cache()
+    key = cache_key(model_name, temperature, "\n".join(m.content for m in messages))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        text, duration_ms = timed(_call_llm_with_retries, llm, messages)
+    except LLMUnavailable:
+        # degraded mode: an expired answer is better than none while the circuit is open
+        stale = cache.get_stale(key)
+        if stale is None:
             raise
+        return stale
+    cache.set(key, text, model_name, temperature, duration_ms=duration_ms, transaction_id=transaction_id)
+    return text
+
+
+UNAVAILABLE_MESSAGE = "L'assistant est momentanément indisponible, réessayez dans quelques instants."
 
 
 def chatbot_response(user_message: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.7) -> str:
@@ -124,8 +212,10 @@ def chatbot_response(user_message: str, model_name: str = "gpt-3.5-turbo", tempe
 
         # build a short chat message — ChatPromptTemplate is fine but simpler here
         messages = [HumanMessage(content=f"Vous êtes un assistant utile. Répondez à l'utilisateur : {user_message}")]
-        response_text = _call_llm_with_retries(llm, messages)
+        response_text = _cached_call_llm(llm, messages, model_name, temperature)
         return response_text
+    except LLMBusy:
+        return UNAVAILABLE_MESSAGE
     except RateLimitError as rle:
         # Friendly message when quota is exceeded
         logger.exception("OpenAI quota/rate limit error")
@@ -135,6 +225,93 @@ def chatbot_response(user_message: str, model_name: str = "gpt-3.5-turbo", tempe
         return f"Une erreur est survenue lors de la génération de la réponse: {exc}"
 
 
+async def achatbot_response(user_message: str, model_name: str = "gpt-3.5-turbo", temperature: float = 0.7) -> str:
+    """
+    Async chatbot_response: cached answers are served without touching the provider,
+    other calls go through the per-process concurrency limiter and the shared rate limiter.
+    Raises LLMBusy when the limiter queue is full, LLMUnavailable while the circuit is
+    open and no expired answer is cached.
+    """
+    messages = [HumanMessage(content=f"Vous êtes un assistant utile. Répondez à l'utilisateur : {user_message}")]
+    cache = get_response_cache()
+    key = cache_key(model_name, temperature, messages[0].content)
+    try:
+        cached = await sync_to_async(cache.get)(key)
+        if cached is not None:
+            return cached
+        llm = get_llm(temperature=temperature, model_name=model_name)
+        async with get_concurrency_limiter().slot():
+            started = time.perf_counter()
+            try:
+                response_text = await _acall_llm_with_retries(llm, messages)
+            except LLMUnavailable:
+                stale = await sync_to_async(cache.get_stale)(key)
+                if stale is None:
+                    raise
+                return stale
+            duration_ms = int((time.perf_counter() - started) * 1000)
+        await sync_to_async(cache.set)(key, response_text, model_name, temperature, duration_ms=duration_ms)
+        return response_text
+    except LLMBusy:
+        raise
+    except RateLimitError:
+        logger.exception("OpenAI quota/rate limit error")
+        return "Erreur : quota OpenAI dépassé ou problème de facturation. Vérifiez votre clé API et votre plan (https://platform.openai.com/account/billing)."
+    except Exception as exc:
+        logger.exception("Error while generating chatbot response")
+        return f"Une erreur est survenue lors de la génération de la réponse: {exc}"
+
+
+CHAT_SYSTEM_PROMPT = "Vous êtes un assistant utile."
+
+
+async def astream_chat(history: List[Tuple[str, str]], model_name: str = "gpt-3.5-turbo",
+                       temperature: float = 0.7) -> AsyncIterator[str]:
+    """
+    Yield the assistant answer piece by piece as the provider produces it.
+    `history` is a list of ("user" | "assistant", text) turns ending with the user question.
+    The concurrency slot is held while streaming; closing or cancelling the iterator
+    aborts the provider stream. Raises LLMBusy when the limiter queue is full or the
+    shared budget is exhausted, LLMUnavailable while the circuit is open.
+    """
+    messages = [SystemMessage(content=CHAT_SYSTEM_PROMPT)] + [
+        HumanMessage(content=text) if role == "user" else AIMessage(content=text) for role, text in history
+    ]
+    cache = get_response_cache()
+    key = cache_key(model_name, temperature, "\n".join(f"{m.type}:{m.content}" for m in messages))
+    cached = await sync_to_async(cache.get)(key)
+    if cached is not None:
+        yield cached
+        return
+
+    llm = get_llm(temperature=temperature, model_name=model_name)
+    limiter, breaker = get_rate_limiter(), get_circuit_breaker()
+    parts = []
+    async with get_concurrency_limiter().slot():
+        try:
+            await breaker.acheck()
+        except LLMUnavailable:
+            stale = await sync_to_async(cache.get_stale)(key)
+            if stale is None:
+                raise
+            yield stale
+            return
+        await limiter.aacquire(_call_tokens(llm, messages))
+        started = time.perf_counter()
+        try:
+            async for chunk in llm.astream(messages):
+                text = _extract_text_from_response(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+        except Exception:
+            await sync_to_async(breaker.record_failure)()
+            raise
+        await sync_to_async(breaker.record_success)()
+        duration_ms = int((time.perf_counter() - started) * 1000)
+    await sync_to_async(cache.set)(key, "".join(parts), model_name, temperature, duration_ms=duration_ms)
+
+
 def _transaction_to_dict(transaction: Transaction) -> Dict[str, Any]:
     """
     Convert a Django model instance to a plain dict (safe for prompts).
@@ -167,6 +344,11 @@ def explain_anomaly(transaction_id: int, model_name: str = "gpt-3.5-turbo") -> s
         return msg
 
     transaction_data = _transaction_to_dict(transaction)
+    # reuse the local pre-score (utils/anomalies.py) so the model knows what was flagged
+    score = ScoreAnomalie.objects.filter(transaction_id=transaction_id).values("score", "motifs").first()
+    if score:
+        transaction_data["score_anomalie"] = round(score["score"], 2)
+        transaction_data["motifs_anomalie"] = score["motifs"]
 
     prompt_template = (
         "Voici les détails d'une transaction anormale :\n\n{transaction}\n\n"
@@ -177,11 +359,176 @@ def explain_anomaly(transaction_id: int, model_name: str = "gpt-3.5-turbo") -> s
         llm = get_llm(model_name=model_name)
         formatted = prompt_template.format(transaction=transaction_data)
         messages = [HumanMessage(content=formatted)]
-        response_text = _call_llm_with_retries(llm, messages)
+        response_text = _cached_call_llm(llm, messages, model_name, llm.temperature, transaction_id=transaction.id)
         return response_text
+    except LLMBusy:
+        return UNAVAILABLE_MESSAGE
     except RateLimitError:
         logger.exception("OpenAI quota/rate limit error while explaining anomaly %s", transaction_id)
         return "Erreur : quota OpenAI dépassé ou problème de facturation lors de la génération de l'explication. Vérifiez votre clé API et votre plan."
     except Exception as exc:
         logger.exception("Error while explaining anomaly for transaction %s", transaction_id)
-        return f"Une erreur est survenue lors de l'explication de l'anomalie: {exc}"
\ No newline at end of file
+        return f"Une erreur est survenue lors de l'explication de l'anomalie: {exc}"
+
+
+BATCH_EXPLAIN_PROMPT = (
+    "Voici des transactions marquées comme anormales, une par ligne au format JSON :\n\n{transactions}\n\n"
+    "Pour chacune, explique pourquoi elle est anormale et propose des recommandations pratiques et actionnables. "
+    'Réponds uniquement en JSON : {{"<id>": "<explication>", ...}}'
+)
+
+
+def _transaction_line(transaction: Transaction) -> str:
+    data = {
+        "id": transaction.id,
+        "type": transaction.type,
+        "montant": str(transaction.montant),
+        "date": transaction.date_transaction.isoformat(),
+        "reference": transaction.reference,
+        "description": transaction.description[:300],
+        "membre": transaction.membre.utilisateur.username,
+        "cooperative": transaction.membre.cooperative.nom,
+    }
+    score = getattr(transaction, "score_anomalie", None)
+    if score is not None:
+        data["score_anomalie"] = round(score.score, 2)
+        data["motifs_anomalie"] = score.motifs
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _pack_prompts(lines: Dict[int, str], token_budget: int) -> List[Dict[int, str]]:
+    """Group transaction lines into batches whose estimated size stays under the budget."""
+    batches, batch, tokens = [], {}, 0
+    for transaction_id, line in lines.items():
+        cost = estimate_tokens(line)
+        if batch and tokens + cost > token_budget:
+            batches.append(batch)
+            batch, tokens = {}, 0
+        batch[transaction_id] = line
+        tokens += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _parse_explanations(text: str, expected: List[int]) -> Dict[int, str]:
+    """Explanations the model actually returned, by transaction id; missing ids are left out."""
+    try:
+        parsed = json.loads(text[text.index("{"):text.rindex("}") + 1])
+    except ValueError:
+        parsed = None
+    if not isinstance(parsed, dict):
+        return {}
+    explanations = {}
+    for transaction_id in expected:
+        value = parsed.get(str(transaction_id))
+        if value:
+            explanations[transaction_id] = str(value)
+    return explanations
+
+
+def _explanation_key(model_name: str, temperature: float, line: str) -> str:
+    # one cache entry per transaction line, whatever batch it was sent in
+    return cache_key(model_name, temperature, f"explication\n{line}")
+
+
+async def aexplain_anomalies(transaction_ids: List[int], model_name: str = "gpt-3.5-turbo",
+                             max_concurrency: Optional[int] = None,
+                             token_budget: Optional[int] = None) -> Tuple[Dict[int, str], Dict[int, str]]:
+    """
+    Explain many transactions at once: one query loads them with member and cooperative,
+    explanations already in the response cache are reused, the others are packed into
+    prompts up to `token_budget` tokens and the prompts run concurrently, at most
+    `max_concurrency` at a time. Each returned explanation is cached per transaction.
+    Returns (explanations, errors), both keyed by transaction id; errors are never cached.
+    """
+    max_concurrency = max_concurrency or getattr(settings, "EXPLAIN_MAX_CONCURRENCY", 4)
+    token_budget = token_budget or getattr(settings, "EXPLAIN_BATCH_TOKENS", 2500)
+
+    def load() -> Dict[int, str]:
+        transactions = Transaction.objects.filter(id__in=transaction_ids).select_related(
+            "membre__utilisateur", "membre__cooperative", "score_anomalie"
+        ).order_by("id")
+        return {t.id: _transaction_line(t) for t in transactions}
+
+    lines = await sync_to_async(load)()
+    errors: Dict[int, str] = {
+        transaction_id: f"Transaction with id={transaction_id} does not exist."
+        for transaction_id in transaction_ids if transaction_id not in lines
+    }
+    llm = get_llm(model_name=model_name)
+    cache = get_response_cache()
+    keys = {transaction_id: _explanation_key(model_name, llm.temperature, line)
+            for transaction_id, line in lines.items()}
+
+    def lookup(get, ids) -> Dict[int, str]:
+        found = {}
+        for transaction_id in ids:
+            text = get(keys[transaction_id])
+            if text is not None:
+                found[transaction_id] = text
+        return found
+
+    def store(explanations: Dict[int, str], duration_ms: int) -> None:
+        for transaction_id, text in explanations.items():
+            cache.set(keys[transaction_id], text, model_name, llm.temperature,
+                      duration_ms=duration_ms, transaction_id=transaction_id)
+
+    results = await sync_to_async(lookup)(cache.get, keys)
+    pending = {transaction_id: line for transaction_id, line in lines.items() if transaction_id not in results}
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def explain(batch: Dict[int, str]) -> Tuple[Dict[int, str], Dict[int, str]]:
+        messages = [HumanMessage(content=BATCH_EXPLAIN_PROMPT.format(transactions="\n".join(batch.values())))]
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                text = await _acall_llm_with_retries(llm, messages)
+            except LLMUnavailable as exc:
+                # degraded mode: expired explanations are better than none while the circuit is open
+                stale = await sync_to_async(lookup)(cache.get_stale, batch)
+                error = f"Une erreur est survenue lors de l'explication de l'anomalie: {exc}"
+                return stale, {transaction_id: error for transaction_id in batch if transaction_id not in stale}
+            except RateLimitError:
+                logger.exception("OpenAI quota/rate limit error while explaining anomalies %s", list(batch))
+                error = "Erreur : quota OpenAI dépassé ou problème de facturation lors de la génération de l'explication."
+                return {}, {transaction_id: error for transaction_id in batch}
+            except Exception as exc:
+                logger.exception("Error while explaining anomalies %s", list(batch))
+                error = f"Une erreur est survenue lors de l'explication de l'anomalie: {exc}"
+                return {}, {transaction_id: error for transaction_id in batch}
+            duration_ms = int((time.perf_counter() - started) * 1000)
+        explanations = _parse_explanations(text, list(batch))
+        await sync_to_async(store)(explanations, duration_ms // len(batch))
+        missing = "Aucune explication retournée par le modèle."
+        return explanations, {transaction_id: missing for transaction_id in batch if transaction_id not in explanations}
+
+    for explanations, failed in await asyncio.gather(*(explain(b) for b in _pack_prompts(pending, token_budget))):
+        results.update(explanations)
+        errors.update(failed)
+    return results, errors
+
+
+def explain_anomalies(transaction_ids: List[int], audit: Optional[Audit] = None,
+                      **kwargs) -> Tuple[Dict[int, str], Dict[int, str]]:
+    """
+    Synchronous entry point (Celery, shell) for aexplain_anomalies.
+    Explanations are stored under details["explications"] of `audit`, or of a new
+    financier Audit when none is given; failures go under details["erreurs_explication"]
+    until a later run explains them.
+    """
+    explanations, errors = async_to_sync(aexplain_anomalies)(list(transaction_ids), **kwargs)
+    if audit is None:
+        audit = Audit(type="financier", description=f"Explication de {len(explanations)} anomalie(s)")
+    details = dict(audit.details or {})
+    explications = dict(details.get("explications", {}), **{str(k): v for k, v in explanations.items()})
+    erreurs = {k: v for k, v in details.get("erreurs_explication", {}).items() if k not in explications}
+    erreurs.update({str(k): v for k, v in errors.items()})
+    details["explications"] = explications
+    if erreurs:
+        details["erreurs_explication"] = erreurs
+    else:
+        details.pop("erreurs_explication", None)
+    audit.details = details
+    audit.save()
+    return explanations, errors
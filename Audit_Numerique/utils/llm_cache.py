@@ -0,0 +1,164 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from Audit_Numerique.models import ReponseLLM
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case, whitespace and trailing punctuation so near-identical questions share a key."""
+    return re.sub(r"\s+", " ", prompt.strip().lower()).rstrip(" ?!.")
+
+
+def cache_key(model_name: str, temperature: float, prompt: str) -> str:
+    raw = f"{model_name}\x00{float(temperature)}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Two-tier response cache: an in-process LRU in front of the ReponseLLM table.
+    Entries expire after `ttl`; the memory tier holds `memory_size` entries and the
+    table is trimmed to `max_entries` (least recently used first) every `purge_every` writes.
+    Prompts embed the data they are about, so an edited transaction also changes the key:
+    stale entries left in other processes' memory tier are simply never hit again.
+    """
+
+    def __init__(self, memory_size: int = 512, ttl: timedelta = timedelta(days=7),
+                 max_entries: int = 10000, purge_every: int = 100):
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.purge_every = purge_every
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (response, expires, duration_ms, tx)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stale_hits": 0, "saved_ms": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        now = timezone.now()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[1] > now:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                self._stats["saved_ms"] += entry[2]
+            elif entry:
+                del self._memory[key]
+                entry = None
+        if entry:
+            return entry[0]
+
+        row = ReponseLLM.objects.filter(cle=key, date_creation__gt=now - self.ttl).values(
+            "pk", "reponse", "duree_ms", "date_creation", "transaction_id"
+        ).first()
+        if row is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        ReponseLLM.objects.filter(pk=row["pk"]).update(nb_utilisations=F("nb_utilisations") + 1, date_acces=now)
+        with self._lock:
+            self._stats["db_hits"] += 1
+            self._stats["saved_ms"] += row["duree_ms"]
+            self._remember(key, row["reponse"], row["date_creation"] + self.ttl, row["duree_ms"],
+                           row["transaction_id"])
+        return row["reponse"]
+
+    def get_stale(self, key: str) -> Optional[str]:
+        """Last known answer regardless of TTL: degraded mode while the provider is unavailable."""
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is None:
+            entry = ReponseLLM.objects.filter(cle=key).values_list("reponse", flat=True).first()
+        else:
+            entry = entry[0]
+        if entry is not None:
+            with self._lock:
+                self._stats["stale_hits"] += 1
+        return entry
+
+    def set(self, key: str, response: str, model_name: str, temperature: float,
+            duration_ms: int = 0, transaction_id: Optional[int] = None) -> None:
+        now = timezone.now()
+        ReponseLLM.objects.update_or_create(cle=key, defaults={
+            "modele": model_name, "temperature": float(temperature), "reponse": response,
+            "transaction_id": transaction_id, "duree_ms": duration_ms,
+            "date_creation": now, "date_acces": now,
+        })
+        with self._lock:
+            self._remember(key, response, now + self.ttl, duration_ms, transaction_id)
+            self._writes += 1
+            purge = self._writes % self.purge_every == 0
+        if purge:
+            self.purge()
+
+    def _remember(self, key, response, expires, duration_ms, transaction_id) -> None:
+        self._memory[key] = (response, expires, duration_ms, transaction_id)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def invalidate_transaction(self, transaction_id: int) -> int:
+        """Drop every cached answer built from this transaction (both tiers)."""
+        with self._lock:
+            for key in [k for k, entry in self._memory.items() if entry[3] == transaction_id]:
+                del self._memory[key]
+        deleted, _ = ReponseLLM.objects.filter(transaction_id=transaction_id).delete()
+        return deleted
+
+    def purge(self) -> int:
+        """Delete expired rows, then the least recently used ones above max_entries."""
+        deleted, _ = ReponseLLM.objects.filter(date_creation__lte=timezone.now() - self.ttl).delete()
+        cutoff = list(ReponseLLM.objects.order_by("-date_acces").values_list("date_acces", flat=True)[
+            self.max_entries:self.max_entries + 1
+        ])
+        if cutoff:
+            extra, _ = ReponseLLM.objects.filter(date_acces__lte=cutoff[0]).delete()
+            deleted += extra
+        return deleted
+
+    def stats(self) -> Dict[str, float]:
+        """Counters for this process: hits per tier, misses, hit ratio and LLM latency saved."""
+        with self._lock:
+            stats = dict(self._stats, memory_entries=len(self._memory))
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["db_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> LLMResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache(
+                memory_size=getattr(settings, "LLM_CACHE_MEMORY_SIZE", 512),
+                ttl=getattr(settings, "LLM_CACHE_TTL", timedelta(days=7)),
+                max_entries=getattr(settings, "LLM_CACHE_MAX_ENTRIES", 10000),
+            )
+        return _cache
+
+
+def timed(fn, *args, **kwargs):
+    """Run fn and return (result, elapsed milliseconds)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, int((time.perf_counter() - start) * 1000)
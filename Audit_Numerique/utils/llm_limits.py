@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from Audit_Numerique.models import QuotaLLM
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBusy(Exception):
+    """Raised when a provider call cannot even be queued; views answer 429."""
+
+
+class LLMUnavailable(LLMBusy):
+    """Raised while the circuit breaker is open; views answer 503 or serve a cached answer."""
+
+    def __init__(self, message: str = "Fournisseur LLM indisponible", retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMConcurrencyLimiter:
+    """
+    Per-process cap on in-flight provider calls for async code, with a bounded queue:
+    at most `max_concurrent` calls run, `max_waiting` more may wait, the rest fail fast.
+    One semaphore per event loop, since asyncio primitives are bound to their loop.
+    """
+
+    def __init__(self, max_concurrent: int, max_waiting: int):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.waiting = 0
+        self.running = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrent)
+        return semaphore
+
+    @asynccontextmanager
+    async def slot(self):
+        semaphore = self._semaphore()
+        if semaphore.locked() and self.waiting >= self.max_waiting:
+            raise LLMBusy("Trop de requêtes LLM en attente")
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            semaphore.release()
+
+
+_limiter: Optional[LLMConcurrencyLimiter] = None
+
+
+def get_concurrency_limiter() -> LLMConcurrencyLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = LLMConcurrencyLimiter(
+            max_concurrent=getattr(settings, "LLM_MAX_CONCURRENT_CALLS", 4),
+            max_waiting=getattr(settings, "LLM_MAX_WAITING_CALLS", 16),
+        )
+    return _limiter
+
+
+_quota_names = set()
+_quota_lock = threading.Lock()
+
+
+def _quota(name: str) -> QuotaLLM:
+    """Shared state row for a provider, created full on first use."""
+    quota = QuotaLLM.objects.filter(nom=name).first()
+    if quota is None:
+        quota, _ = QuotaLLM.objects.get_or_create(nom=name, defaults={
+            "requetes": getattr(settings, "LLM_REQUESTS_PER_MINUTE", 60),
+            "jetons": getattr(settings, "LLM_TOKENS_PER_MINUTE", 90000),
+        })
+    return quota
+
+
+def _ensure_quota(name: str) -> None:
+    if name in _quota_names:
+        return
+    with _quota_lock:
+        _quota(name)
+        _quota_names.add(name)
+
+
+class LLMRateLimiter:
+    """
+    Cross-process token bucket over the QuotaLLM row: one bucket for requests per minute,
+    one for tokens per minute, both refilled continuously and capped at one minute of budget.
+    A taker reads the row, computes the refill and writes it back only if `version` did not
+    move (optimistic lock), so it works on any database without SELECT FOR UPDATE.
+    When the provider throttles anyway, `throttled()` drains the shared bucket so every
+    process backs off together instead of retrying on its own schedule.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float, max_wait: float):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._stats = {"acquired": 0, "waits": 0, "wait_seconds": 0.0, "rejected": 0, "throttled": 0}
+
+    def _refill(self, quota: QuotaLLM, now: float):
+        elapsed = max(0.0, now - quota.date_remplissage.timestamp())
+        requests = min(self.requests_per_minute, quota.requetes + elapsed * self.requests_per_minute / 60)
+        tokens = min(self.tokens_per_minute, quota.jetons + elapsed * self.tokens_per_minute / 60)
+        return requests, tokens
+
+    def _take(self, tokens: float) -> float:
+        """Try to take one request and `tokens` tokens; return 0 on success or the seconds to wait."""
+        tokens = min(tokens, self.tokens_per_minute)
+        _ensure_quota(self.name)
+        for _ in range(10):
+            quota = QuotaLLM.objects.only("requetes", "jetons", "date_remplissage", "version").get(nom=self.name)
+            now = time.time()
+            requests, budget = self._refill(quota, now)
+            wait = max((1 - requests) * 60 / self.requests_per_minute,
+                       (tokens - budget) * 60 / self.tokens_per_minute, 0.0)
+            if wait > 0:
+                return wait
+            if QuotaLLM.objects.filter(pk=quota.pk, version=quota.version).update(
+                requetes=requests - 1, jetons=budget - tokens,
+                date_remplissage=datetime.fromtimestamp(now, tz=dt_timezone.utc), version=F("version") + 1,
+            ):
+                return 0.0
+        # another process won every round: try again shortly
+        return 0.05
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+
+    def _set_waiting(self, delta: int) -> None:
+        QuotaLLM.objects.filter(nom=self.name).update(en_attente=F("en_attente") + delta)
+
+    def _next_wait(self, wait: float, waited: float, max_wait: float) -> float:
+        if waited + wait > max_wait:
+            self._count(rejected=1)
+            raise LLMBusy(f"Quota LLM épuisé, attente estimée {wait:.0f}s")
+        # jitter so that waiting processes do not all come back at the same instant
+        return wait + random.uniform(0, min(1.0, 0.1 * wait + 0.05))
+
+    def acquire(self, tokens: float, max_wait: Optional[float] = None) -> None:
+        """Block until the budget allows the call; raise LLMBusy beyond `max_wait` seconds."""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        wait, waited = self._take(tokens), 0.0
+        if wait:
+            self._set_waiting(1)
+            try:
+                while wait:
+                    pause = self._next_wait(wait, waited, max_wait)
+                    time.sleep(pause)
+                    waited += pause
+                    wait = self._take(tokens)
+            finally:
+                self._set_waiting(-1)
+            self._count(waits=1, wait_seconds=waited)
+        self._count(acquired=1)
+
+    async def aacquire(self, tokens: float, max_wait: Optional[float] = None) -> None:
+        """acquire() for async callers: the database round trips run in a thread, waits do not block the loop."""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        take = sync_to_async(self._take)
+        wait, waited = await take(tokens), 0.0
+        if wait:
+            await sync_to_async(self._set_waiting)(1)
+            try:
+                while wait:
+                    pause = self._next_wait(wait, waited, max_wait)
+                    await asyncio.sleep(pause)
+                    waited += pause
+                    wait = await take(tokens)
+            finally:
+                await sync_to_async(self._set_waiting)(-1)
+            self._count(waits=1, wait_seconds=waited)
+        self._count(acquired=1)
+
+    def throttled(self, retry_after: float) -> None:
+        """The provider answered 429: no process may call again for `retry_after` seconds."""
+        _ensure_quota(self.name)
+        QuotaLLM.objects.filter(nom=self.name).update(
+            requetes=1 - retry_after * self.requests_per_minute / 60,
+            date_remplissage=timezone.now(), version=F("version") + 1,
+        )
+        self._count(throttled=1)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._stats)
+
+
+class LLMCircuitBreaker:
+    """
+    Circuit breaker shared through the QuotaLLM row. After `failure_threshold` consecutive
+    failures it opens for `cooldown` seconds and every call fails fast with LLMUnavailable.
+    Once the cooldown is over a single caller wins the conditional UPDATE and probes the
+    provider (half-open); its success closes the circuit, its failure reopens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, cooldown: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._stats = {"rejected": 0, "failures": 0, "opened": 0}
+
+    def check(self) -> None:
+        _ensure_quota(self.name)
+        open_until = QuotaLLM.objects.filter(nom=self.name).values_list("ouvert_jusqua", flat=True).first()
+        if open_until is None:
+            return
+        now = timezone.now()
+        if open_until <= now and QuotaLLM.objects.filter(nom=self.name, ouvert_jusqua=open_until).update(
+            ouvert_jusqua=now + timedelta(seconds=self.cooldown)
+        ):
+            logger.info("Circuit LLM %s semi-ouvert : appel d'essai", self.name)
+            return
+        with self._lock:
+            self._stats["rejected"] += 1
+        raise LLMUnavailable(retry_after=max(1.0, (open_until - now).total_seconds()))
+
+    async def acheck(self) -> None:
+        await sync_to_async(self.check)()
+
+    def record_success(self) -> None:
+        QuotaLLM.objects.filter(nom=self.name, echecs__gt=0).update(echecs=0, ouvert_jusqua=None)
+
+    def record_failure(self) -> None:
+        QuotaLLM.objects.filter(nom=self.name).update(echecs=F("echecs") + 1)
+        with self._lock:
+            self._stats["failures"] += 1
+        if QuotaLLM.objects.filter(nom=self.name, echecs__gte=self.failure_threshold).update(
+            ouvert_jusqua=timezone.now() + timedelta(seconds=self.cooldown)
+        ):
+            with self._lock:
+                self._stats["opened"] += 1
+            logger.warning("Circuit LLM %s ouvert pour %ss", self.name, self.cooldown)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._stats)
+
+
+_rate_limiter: Optional[LLMRateLimiter] = None
+_circuit_breaker: Optional[LLMCircuitBreaker] = None
+
+
+def get_rate_limiter() -> LLMRateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = LLMRateLimiter(
+            name=getattr(settings, "LLM_PROVIDER_NAME", "openai"),
+            requests_per_minute=getattr(settings, "LLM_REQUESTS_PER_MINUTE", 60),
+            tokens_per_minute=getattr(settings, "LLM_TOKENS_PER_MINUTE", 90000),
+            max_wait=getattr(settings, "LLM_RATE_MAX_WAIT", 30),
+        )
+    return _rate_limiter
+
+
+def get_circuit_breaker() -> LLMCircuitBreaker:
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = LLMCircuitBreaker(
+            name=getattr(settings, "LLM_PROVIDER_NAME", "openai"),
+            failure_threshold=getattr(settings, "LLM_BREAKER_FAILURES", 5),
+            cooldown=getattr(settings, "LLM_BREAKER_COOLDOWN", 30),
+        )
+    return _circuit_breaker
+
+
+def llm_metrics() -> Dict[str, object]:
+    """
+    Shared state (available budget, circuit state, callers waiting in every process)
+    plus the counters of this process.
+    """
+    limiter, breaker, concurrency = get_rate_limiter(), get_circuit_breaker(), get_concurrency_limiter()
+    _ensure_quota(limiter.name)
+    quota = QuotaLLM.objects.get(nom=limiter.name)
+    requests, tokens = limiter._refill(quota, time.time())
+    if quota.ouvert_jusqua is None:
+        state = "ferme"
+    elif quota.ouvert_jusqua > timezone.now():
+        state = "ouvert"
+    else:
+        state = "semi_ouvert"
+    return {
+        "fournisseur": quota.nom,
+        "requetes_disponibles": round(max(requests, 0.0), 2),
+        "jetons_disponibles": int(max(tokens, 0.0)),
+        "requetes_par_minute": limiter.requests_per_minute,
+        "jetons_par_minute": limiter.tokens_per_minute,
+        "en_attente": max(quota.en_attente, 0),
+        "circuit": state,
+        "echecs_consecutifs": quota.echecs,
+        "ouvert_jusqua": quota.ouvert_jusqua.isoformat() if quota.ouvert_jusqua else None,
+        "processus": {
+            "limiteur": limiter.stats(),
+            "disjoncteur": breaker.stats(),
+            "appels_en_cours": concurrency.running,
+            "appels_en_file": concurrency.waiting,
+        },
+    }
@@ -0,0 +1,287 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from Audit_Numerique.authentication import cooperatives_de
+from Audit_Numerique.models import CompteurNonLus, Notification, Pret
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[str, dict]
+
+
+# staff only: every audit of every cooperative
+AUDIT_GROUP = "audit_notifications"
+
+
+def user_group(user_id: int) -> str:
+    return f"user_{user_id}"
+
+
+def cooperative_group(cooperative_id: int) -> str:
+    return f"coop_{cooperative_id}"
+
+
+def groups_for(user) -> List[str]:
+    """Groups a socket of `user` joins: its own, its active cooperatives (member or admin), staff."""
+    groups = [user_group(user.pk)] + [cooperative_group(pk) for pk in sorted(cooperatives_de(user))]
+    if user.is_staff:
+        groups.append(AUDIT_GROUP)
+    return groups
+
+
+def push_event(groups: List[str], event: dict) -> None:
+    """Send one event to the interested groups only; sockets coalesce what they receive."""
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    send = async_to_sync(layer.group_send)
+    for group in groups:
+        try:
+            send(group, {"type": "evenement", "evenement": event})
+        except Exception:
+            logger.exception("Push vers %s impossible", group)
+
+
+# ---------- Event handlers: one call per kind and batch, a constant number of queries ----------
+
+def _pret_demande(payloads: List[dict]) -> List[Notification]:
+    prets = Pret.objects.select_related("membre__utilisateur", "membre__cooperative").in_bulk(
+        [p["pret"] for p in payloads]
+    )
+    notifications = []
+    for p in payloads:
+        pret = prets.get(p["pret"])
+        if pret is None or not pret.membre.cooperative.admin_id:
+            continue
+        notifications.append(Notification(
+            utilisateur_id=pret.membre.cooperative.admin_id,
+            type="pret",
+            contenu=f"Nouvelle demande de prêt de {pret.membre.utilisateur.get_full_name()} pour {p['montant']}.",
+        ))
+    return notifications
+
+
+def _pret_decision(payloads: List[dict]) -> List[Notification]:
+    utilisateurs = dict(Pret.objects.filter(pk__in=[p["pret"] for p in payloads]).values_list(
+        "pk", "membre__utilisateur_id"
+    ))
+    return [
+        Notification(
+            utilisateur_id=utilisateurs[p["pret"]],
+            type="pret",
+            contenu=f"Votre demande de prêt de {p['montant']} a été {p['statut']}.",
+        )
+        for p in payloads if p["pret"] in utilisateurs
+    ]
+
+
+def _notification(payloads: List[dict]) -> List[Notification]:
+    return [Notification(utilisateur_id=p["utilisateur"], type=p["type"], contenu=p["contenu"]) for p in payloads]
+
+
+def _unread_changed(payloads: List[dict]) -> List[Notification]:
+    """Nothing to write: process_events pushes the counters of these users after the batch."""
+    return []
+
+
+HANDLERS: Dict[str, Callable[[List[dict]], List[Notification]]] = {
+    "pret_demande": _pret_demande,
+    "pret_decision": _pret_decision,
+    "notification": _notification,
+    "non_lus": _unread_changed,
+}
+
+
+def process_events(events: List[Event]) -> int:
+    """
+    Run a batch of side effects: identical events are coalesced, each kind is handled in
+    one go, notifications are written with a single bulk_create and pushed to each user's
+    group in one channel-layer message. Returns the number of notifications created.
+    """
+    by_kind: Dict[str, List[dict]] = defaultdict(list)
+    seen = set()
+    for kind, payload in events:
+        key = (kind, tuple(sorted(payload.items())))
+        if key not in seen:
+            seen.add(key)
+            by_kind[kind].append(payload)
+
+    notifications: List[Notification] = []
+    with transaction.atomic():
+        for kind, payloads in by_kind.items():
+            notifications.extend(HANDLERS[kind](payloads))
+        Notification.objects.bulk_create(notifications)
+        # bulk_create ne déclenche pas les signaux : compteurs de non-lus tenus ici
+        created = Counter(n.utilisateur_id for n in notifications)
+        for user_id, count in created.items():
+            CompteurNonLus.appliquer(user_id, notifications=count)
+    _push(notifications)
+    _push_unread(set(created) | {p["utilisateur"] for p in by_kind.get("non_lus", [])})
+    return len(notifications)
+
+
+def _push_unread(user_ids) -> None:
+    """One read for every user of the batch, then one `non_lus` event per user group."""
+    if not user_ids:
+        return
+    counters = {c.pk: c for c in CompteurNonLus.objects.filter(utilisateur_id__in=user_ids)}
+    for user_id in user_ids:
+        counter = counters.get(user_id)
+        if counter is None or counter.notifications < 0 or counter.messages < 0:
+            counter = CompteurNonLus.recalculer(user_id)
+        push_event([user_group(user_id)], {
+            "type": "non_lus", "notifications": counter.notifications, "messages": counter.messages,
+        })
+
+
+def _push(notifications: List[Notification]) -> None:
+    layer = get_channel_layer()
+    if layer is None or not notifications:
+        return
+    per_user: Dict[int, List[dict]] = defaultdict(list)
+    for n in notifications:
+        per_user[n.utilisateur_id].append({
+            "id": n.pk, "type": n.type, "contenu": n.contenu,
+            "date_creation": n.date_creation.isoformat(), "lue": n.lue,
+        })
+    send = async_to_sync(layer.group_send)
+    for user_id, items in per_user.items():
+        try:
+            send(user_group(user_id), {"type": "notifications", "notifications": items})
+        except Exception:
+            logger.exception("Push des notifications vers %s impossible", user_group(user_id))
+
+
+class NotificationPipeline:
+    """
+    Process-local queue fed after commit. A daemon thread drains it, waits up to `window`
+    seconds for more events (at most `max_batch`) and hands the batch either to Celery
+    (one task per batch) or, in "thread" mode, processes it itself (tests, dev without worker).
+    Events still queued when the process exits are flushed by an atexit hook.
+    Best effort only: a killed process loses its queue, so only user-facing notifications
+    and pushes go through here, never writes the data depends on (ledger entries, totals).
+    """
+
+    def __init__(self, mode: str = "celery", window: float = 0.05, max_batch: int = 500):
+        self.mode = mode
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Event]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def put(self, event: Event) -> None:
+        self._queue.put(event)
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+                    self._thread.start()
+
+    def _drain(self, first: Event) -> List[Event]:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._drain(self._queue.get())
+            try:
+                self.dispatch(batch)
+            except Exception:
+                logger.exception("Échec du traitement de %s événement(s)", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def dispatch(self, batch: List[Event]) -> None:
+        if self.mode == "celery":
+            from Audit_Numerique.utils.tasks import traiter_evenements
+            traiter_evenements.delay([[kind, payload] for kind, payload in batch])
+            return
+        close_old_connections()
+        try:
+            process_events(batch)
+        finally:
+            close_old_connections()
+
+    def flush(self) -> None:
+        """Block until every queued event has been dispatched."""
+        self._queue.join()
+
+    def flush_on_exit(self) -> None:
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.dispatch(batch)
+
+
+_pipeline: Optional[NotificationPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> NotificationPipeline:
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = NotificationPipeline(
+                mode=getattr(settings, "NOTIFICATIONS_PIPELINE", "celery"),
+                window=getattr(settings, "NOTIFICATIONS_WINDOW", 0.05),
+                max_batch=getattr(settings, "NOTIFICATIONS_MAX_BATCH", 500),
+            )
+            atexit.register(_pipeline.flush_on_exit)
+        return _pipeline
+
+
+def publish(kind: str, **payload) -> None:
+    """
+    Queue a side effect once the current transaction commits (immediately in autocommit).
+    Costs the caller a queue.put: no query, no broker round trip.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Événement inconnu : {kind}")
+    transaction.on_commit(lambda: get_pipeline().put((kind, payload)))
+
+
+def publish_many(kind: str, payloads: List[dict]) -> None:
+    """publish() for a set-based write: a single on_commit hook queues the whole batch."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Événement inconnu : {kind}")
+    if not payloads:
+        return
+
+    def enqueue():
+        pipeline = get_pipeline()
+        if pipeline.mode == "celery":
+            # already a batch: straight to the broker, without the hop through the thread
+            for start in range(0, len(payloads), pipeline.max_batch):
+                batch = [(kind, payload) for payload in payloads[start:start + pipeline.max_batch]]
+                try:
+                    pipeline.dispatch(batch)
+                except Exception:
+                    logger.exception("Échec du traitement de %s événement(s)", len(batch))
+            return
+        for payload in payloads:
+            pipeline.put((kind, payload))
+
+    transaction.on_commit(enqueue)
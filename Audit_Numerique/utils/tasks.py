@@ -1,22 +1,156 @@
+import json
+import logging
+
 from celery import shared_task
-from langchain.chat_models import ChatOpenAI
+from django.conf import settings
+from django.db import transaction
 from langchain.prompts import ChatPromptTemplate
+from langchain.schema import HumanMessage
 
-from Audit_Numerique.models import Transaction, Audit
+from Audit_Numerique.models import Transaction, Audit, Cooperative, CurseurAudit, ScoreAnomalie
+from Audit_Numerique.utils.anomalies import score_transactions, default_threshold
+from Audit_Numerique.utils.langchain import get_llm, _call_llm_with_retries, estimate_tokens, explain_anomalies
+from Audit_Numerique.utils.notifications import AUDIT_GROUP, cooperative_group, process_events, push_event
 
+logger = logging.getLogger(__name__)
 
-@shared_task
+AUDIT_PROMPT = ChatPromptTemplate.from_template("""
+    Analyse ces transactions de la coopérative {cooperative} et détecte les anomalies.
+    Une transaction par ligne : id|date|type|montant|membre|reference|description
+    {transactions}
+    Réponds uniquement en JSON : {{"anomalies": [{{"id": <id>, "raison": "..."}}], "resume": "..."}}
+""")
+
+
+def _transaction_line(t: dict) -> str:
+    return "|".join(str(v) for v in (
+        t["id"], t["date_transaction"].isoformat(), t["type"], t["montant"],
+        t["membre_id"], t["reference"], t["description"][:120].replace("\n", " "),
+    ))
+
+
+def _chunks(rows, token_budget: int):
+    """Groupe des lignes consécutives tant que leur taille estimée reste sous le budget."""
+    chunk, tokens = [], 0
+    for row in rows:
+        line = _transaction_line(row)
+        cost = estimate_tokens(line)
+        if chunk and tokens + cost > token_budget:
+            yield chunk
+            chunk, tokens = [], 0
+        chunk.append((row, line))
+        tokens += cost
+    if chunk:
+        yield chunk
+
+
+def _parse_details(text: str) -> dict:
+    try:
+        details = json.loads(text[text.index("{"):text.rindex("}") + 1])
+        if isinstance(details, dict):
+            return details
+    except ValueError:
+        pass
+    return {"anomalies": [], "resume": text}
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
 def audit_transactions():
-    # Configurer le modèle LangChain
-    llm = ChatOpenAI(temperature=0.3, model_name="gpt-3.5-turbo")
-
-    transactions_to_audit = Transaction.objects.all().values()  # Exemple d'extraction
-    prompt = ChatPromptTemplate.from_template("""
-        Analyse ces transactions : {transactions} et détecte les anomalies.
-    """)
-    message = prompt.format(transactions=transactions_to_audit)
-    anomalies = llm.predict(message)
-
-    # Enregistrez les anomalies trouvées
-    Audit.objects.create(details=anomalies)
-    return anomalies
\ No newline at end of file
+    """
+    Audit incrémental : les transactions sont d'abord scorées localement
+    (utils/anomalies.py) ; pour chaque coopérative, seules les transactions au-dessus du
+    seuil dont le score n'a pas encore de date_audit sont lues (en flux, par id croissant)
+    et envoyées au LLM par paquets bornés en tokens. Chaque paquet écrit un Audit et date
+    ses scores dans la même transaction : une exécution interrompue reprend au paquet
+    suivant, et une transaction committée après une autre d'id supérieur n'est pas sautée
+    (pas de filigrane sur l'id, attribué à l'INSERT et non au COMMIT).
+    """
+    llm = get_llm(temperature=0.3, model_name="gpt-3.5-turbo")
+    token_budget = getattr(settings, "AUDIT_CHUNK_TOKENS", 3000)
+    seuil = default_threshold()
+    # les transactions arrivées après le scoring n'ont pas de score : elles attendront la prochaine exécution
+    resume = {"audits": 0, "transactions": 0, "suspectes": score_transactions(threshold=seuil)}
+
+    for cooperative in Cooperative.objects.order_by("pk").only("pk", "nom"):
+        rows = (
+            Transaction.objects
+            .filter(membre__cooperative=cooperative, score_anomalie__score__gte=seuil,
+                    score_anomalie__date_audit__isnull=True)
+            .order_by("id")
+            .values("id", "date_transaction", "type", "montant", "membre_id", "reference", "description")
+            .iterator(chunk_size=500)
+        )
+        curseur = None
+        for chunk in _chunks(rows, token_budget):
+            message = AUDIT_PROMPT.format(
+                cooperative=cooperative.nom,
+                transactions="\n".join(line for _, line in chunk),
+            )
+            details = _parse_details(_call_llm_with_retries(llm, [HumanMessage(content=message)]))
+            premiere, derniere = chunk[0][0], chunk[-1][0]
+            details.update({
+                "cooperative": cooperative.pk,
+                "premier_id": premiere["id"],
+                "dernier_id": derniere["id"],
+                "nb_transactions": len(chunk),
+            })
+            with transaction.atomic():
+                audit = Audit.objects.create(
+                    type="financier",
+                    description=(f"Audit automatique {cooperative.nom} : "
+                                 f"transactions #{premiere['id']} à #{derniere['id']}"),
+                    details=details,
+                )
+                ScoreAnomalie.objects.filter(
+                    transaction_id__in=[row["id"] for row, _ in chunk]
+                ).update(date_audit=audit.date_creation)
+                if curseur is None:
+                    curseur, _ = CurseurAudit.objects.get_or_create(cooperative=cooperative)
+                if derniere["id"] > curseur.dernier_id:
+                    curseur.dernier_id = derniere["id"]
+                    curseur.derniere_date_transaction = derniere["date_transaction"]
+                curseur.save(update_fields=["dernier_id", "derniere_date_transaction", "date_mise_a_jour"])
+            push_event([cooperative_group(cooperative.pk), AUDIT_GROUP], {
+                "type": "audit", "audit": audit.pk, "cooperative": cooperative.pk,
+                "description": audit.description, "nb_anomalies": len(details.get("anomalies", [])),
+            })
+            if _anomaly_ids(details):
+                expliquer_anomalies_audit.delay(audit.pk)
+            resume["audits"] += 1
+            resume["transactions"] += len(chunk)
+            logger.info("Audit %s : transactions %s-%s", cooperative.pk, premiere["id"], derniere["id"])
+
+    return resume
+
+
+def _anomaly_ids(details: dict) -> list:
+    """Ids des transactions relevées par le LLM (il peut en renvoyer sous forme de chaînes)."""
+    ids = []
+    for anomalie in details.get("anomalies", []):
+        try:
+            ids.append(int(anomalie["id"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return ids
+
+
+@shared_task
+def expliquer_anomalies_audit(audit_id):
+    """
+    Explique en lot les anomalies relevées par un Audit (mis en file par audit_transactions)
+    et enregistre les explications dans ses détails ; seules celles pas encore expliquées
+    sont demandées, une nouvelle exécution reprend donc les échecs.
+    """
+    audit = Audit.objects.get(pk=audit_id)
+    deja = audit.details.get("explications", {})
+    ids = [i for i in _anomaly_ids(audit.details) if str(i) not in deja]
+    if not ids:
+        return {"explications": 0, "erreurs": 0}
+    explanations, errors = explain_anomalies(ids, audit=audit)
+    return {"explications": len(explanations), "erreurs": len(errors)}
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
+def traiter_evenements(evenements):
+    """Lot de notifications publiées après commit (pipeline de utils/notifications.py)."""
+    return process_events([(kind, payload) for kind, payload in evenements])
@@ -0,0 +1,132 @@
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+
+def version_key(model) -> str:
+    return f"vc:version:{model._meta.label_lower}"
+
+
+class VersionedViewCache:
+    """
+    Cache of read responses (serialized data of 200 responses) keyed by endpoint, query
+    string, host, scope and the current version of every model the response is built from.
+    Writes bump the versions (post_save/post_delete, after commit), so an entry is never
+    served once one of its models changed; old entries are simply never looked up again and
+    age out. Versions live in the same backend: it must be shared (Redis) as soon as more
+    than one process serves requests, a process-local backend is only right for tests/dev.
+    """
+
+    def __init__(self, alias: str = "default", timeout: Optional[int] = 3600):
+        self.alias = alias
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def versions(self, models: Iterable) -> Dict[str, int]:
+        keys = [version_key(model) for model in models]
+        if not keys:
+            return {}
+        found = self.backend.get_many(keys)
+        for key in keys:
+            if key not in found:
+                # an evicted counter restarts from the clock, never from a value already used
+                self.backend.add(key, time.time_ns(), timeout=None)
+                found[key] = self.backend.get(key)
+        return found
+
+    def bump(self, model) -> None:
+        key = version_key(model)
+        try:
+            self.backend.incr(key)
+        except ValueError:
+            self.backend.add(key, time.time_ns(), timeout=None)
+
+    def key(self, endpoint: str, request, view_kwargs: dict, scope: str, versions: Dict[str, int]) -> str:
+        params = sorted((name, tuple(values)) for name, values in request.query_params.lists())
+        raw = repr((endpoint, request.get_host(), params, sorted(view_kwargs.items()), scope, sorted(versions.items())))
+        return "vc:entry:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def serve(self, endpoint: str, models: Iterable, scope: str, request, view_kwargs: dict, compute) -> Response:
+        key = self.key(endpoint, request, view_kwargs, scope, self.versions(models))
+        data = self.backend.get(key)
+        if data is not None:
+            self._count(endpoint, "hits")
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+        self._count(endpoint, "misses")
+        response = compute()
+        if response.status_code == 200 and response.data is not None:
+            self.backend.set(key, response.data, timeout=self.timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def _count(self, endpoint: str, field: str) -> None:
+        with self._lock:
+            self._stats[endpoint][field] += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Hits, misses and hit ratio per endpoint, for this process."""
+        with self._lock:
+            stats = {endpoint: dict(counts) for endpoint, counts in self._stats.items()}
+        for counts in stats.values():
+            lookups = counts["hits"] + counts["misses"]
+            counts["hit_ratio"] = counts["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache: Optional[VersionedViewCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_view_cache() -> VersionedViewCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = VersionedViewCache(
+                alias=getattr(settings, "VIEW_CACHE_ALIAS", "default"),
+                timeout=getattr(settings, "VIEW_CACHE_TIMEOUT", 3600),
+            )
+        return _cache
+
+
+def bump_version(model) -> None:
+    """Invalidate every cached response built from `model`, once the current transaction commits."""
+    transaction.on_commit(lambda: get_view_cache().bump(model))
+
+
+def scope_key(request, scope: str) -> str:
+    if scope == "user":
+        return f"user:{request.user.pk}" if request.user.is_authenticated else "anon"
+    return scope
+
+
+def cached_view(*models, scope: str = "public"):
+    """
+    Cache a GET view method (viewset action or APIView.get) against the versions of `models`.
+    `scope="public"` shares entries between callers (the response does not depend on them),
+    `scope="user"` keeps one entry per authenticated user.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            endpoint = f"{type(self).__name__}.{view_method.__name__}"
+            return get_view_cache().serve(
+                endpoint, models, scope_key(request, scope), request, kwargs,
+                lambda: view_method(self, request, *args, **kwargs),
+            )
+        return wrapper
+    return decorator
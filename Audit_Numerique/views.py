@@ -1,62 +1,234 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
 from marshmallow import ValidationError
 from rest_framework import viewsets, status, permissions, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
-from django.db.models import Sum, Q
+from django.utils.dateparse import parse_date
+from django.db import transaction
+from django.db.models import Q
 
 from . import serializers
 from .models import (
     Utilisateur, Cooperative, Membre, Cotisation,
     Pret, Remboursement, Transaction, Message,
-    Notification, Audit, Evenement
+    Notification, Audit, Evenement, BilanCooperative, CompteurNonLus, Conversation, ParticipantConversation,
+    SerieFinanciere,
 )
 from .serializers import (
     UtilisateurSerializer, LoginSerializer,
     CooperativeSerializer, MembreSerializer, CotisationSerializer,
     PretSerializer, RemboursementSerializer, TransactionSerializer,
     MessageSerializer, NotificationSerializer, AuditSerializer,
-    EvenementSerializer, RegistrationSerializer
+    EvenementSerializer, RegistrationSerializer, CotisationBulkSerializer, ConversationSerializer,
+    MarquerLuSerializer,
 )
+from .authentication import emettre_jetons, rafraichir_acces
 from .permissions import IsAdmin, IsSecretaire, IsTresorier, ReadOnly
+from .mixins import (
+    SerializerPrefetchMixin, CSVExportMixin, BulkStatutMixin, ConditionalGetMixin, VersionedCacheMixin,
+    FastListMixin, optimize_queryset,
+)
+from .pagination import (
+    TransactionCursorPagination, DateCreationCursorPagination, DateEnvoiCursorPagination,
+    ConversationCursorPagination,
+)
 
 from django.http import JsonResponse
-from .utils.langchain import chatbot_response
-from channels.generic.websocket import AsyncWebsocketConsumer
-import json
+from .utils.langchain import achatbot_response, astream_chat
+from .utils.llm_limits import LLMBusy, LLMUnavailable, llm_metrics
+from .utils.anomalies import default_threshold
+from .utils.notifications import groups_for, publish, publish_many
+from .utils.view_cache import cached_view, get_view_cache
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+import asyncio
+import logging
+from collections import deque
+from channels.db import database_sync_to_async
+
+logger = logging.getLogger(__name__)
 
 from rest_framework.views import APIView
 
 class RolesView(APIView):
     permission_classes = [AllowAny]
+    @cached_view()
     def get(self, request):
         return Response([{"key": k, "label": v} for k, v in Utilisateur.ROLE_CHOICES])
 
-class AuditConsumer(AsyncWebsocketConsumer):
+def _a_marquer(queryset, champ_date, donnees):
+    """Restreint une sélection de non-lus aux ids demandés et/ou à ce qui précède `avant`."""
+    if donnees.get('ids'):
+        queryset = queryset.filter(pk__in=donnees['ids'])
+    if donnees.get('avant'):
+        queryset = queryset.filter(**{f'{champ_date}__lte': donnees['avant']})
+    return queryset
+
+class NonLusView(APIView):
+    """Badge : notifications et messages non lus de l'utilisateur connecté (?recalculer=1 pour reconstruire)."""
+    permission_classes = [IsAuthenticated]
+    def get(self, request):
+        if request.query_params.get("recalculer"):
+            compteur = CompteurNonLus.recalculer(request.user.pk)
+        else:
+            compteur = CompteurNonLus.pour(request.user.pk)
+        return Response({"notifications": compteur.notifications, "messages": compteur.messages})
+
+class CacheMetriquesView(APIView):
+    """Succès et échecs du cache de réponses, par endpoint (compteurs de ce processus)."""
+    permission_classes = [IsAdmin]
+    def get(self, request):
+        return Response(get_view_cache().stats())
+
+class LLMMetriquesView(APIView):
+    """État du limiteur de débit et du disjoncteur des appels LLM (partagé entre processus)."""
+    permission_classes = [IsAdmin]
+    def get(self, request):
+        return Response(llm_metrics())
+
+class AuditConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Événements temps réel d'un utilisateur authentifié (session, ou JWT d'accès en ?token=).
+    Le socket rejoint user_<id>, coop_<id> pour chacune de ses coopératives et, pour le
+    personnel, audit_notifications : un événement ne coûte que ses destinataires.
+    Les événements reçus pendant FENETRE secondes partent en une seule trame
+    {"type": "lot", "evenements": [...]}. Au-delà de TAMPON_MAX événements en attente
+    (client lent), les plus anciens sont abandonnés et la trame porte "perdus" : le client
+    recharge alors son état par l'API.
+    """
+    FENETRE = 0.1
+    TAMPON_MAX = 200
+
     async def connect(self):
-        self.group_name = "audit_notifications"
-        await self.channel_layer.group_add(
-            self.group_name,
-            self.channel_name
-        )
+        self.groups_joined = []
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.tampon = deque(maxlen=self.TAMPON_MAX)
+        self.perdus = 0
+        self.envoi = None
+        self.groups_joined = await database_sync_to_async(groups_for)(user)
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
         await self.accept()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name
-        )
+        for group in self.groups_joined:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        if getattr(self, "envoi", None):
+            self.envoi.cancel()
+
+    def _empiler(self, evenement):
+        if len(self.tampon) == self.tampon.maxlen:
+            self.perdus += 1
+        self.tampon.append(evenement)
+        if self.envoi is None or self.envoi.done():
+            self.envoi = asyncio.ensure_future(self._vider())
+
+    async def _vider(self):
+        await asyncio.sleep(self.FENETRE)
+        # un client lent bloque send_json : ce qui arrive entre-temps part dans la trame suivante
+        while self.tampon:
+            trame = {"type": "lot", "evenements": list(self.tampon)}
+            self.tampon.clear()
+            if self.perdus:
+                trame["perdus"], self.perdus = self.perdus, 0
+            await self.send_json(trame)
+
+    async def evenement(self, event):
+        self._empiler(event["evenement"])
+
+    async def notifications(self, event):
+        for notification in event["notifications"]:
+            self._empiler(dict(notification, type="notification", categorie=notification["type"]))
 
     async def send_audit_notification(self, event):
-        await self.send(text_data=json.dumps({
-            "type": "audit",
-            "message": event["message"]
-        }))
+        self._empiler({"type": "audit", "message": event["message"]})
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Chatbot en streaming : plusieurs conversations multiplexées sur un même socket.
+    Client -> {"action": "message", "conversation": "<id>", "message": "..."}
+              {"action": "annuler", "conversation": "<id>"}
+    Serveur -> {"type": "debut" | "token" | "fin" | "annule" | "erreur", "conversation": "<id>", ...}
+    La déconnexion annule les générations en cours (et donc les flux côté fournisseur).
+    """
+    HISTORIQUE_MAX = 20  # tours conservés par conversation
+
+    async def connect(self):
+        self.conversations = {}  # id -> historique [(role, texte)]
+        self.generations = {}    # id -> asyncio.Task
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for task in self.generations.values():
+            task.cancel()
+
+    async def receive_json(self, content, **kwargs):
+        conversation = str(content.get("conversation", "defaut"))
+        action = content.get("action", "message")
+        if action == "annuler":
+            task = self.generations.get(conversation)
+            if task:
+                task.cancel()
+            return
+        message = (content.get("message") or "").strip()
+        if not message:
+            await self.send_json({"type": "erreur", "conversation": conversation, "message": "Aucun message fourni."})
+            return
+        if conversation in self.generations:
+            await self.send_json({"type": "erreur", "conversation": conversation,
+                                  "message": "Une réponse est déjà en cours pour cette conversation."})
+            return
+        self.generations[conversation] = asyncio.create_task(self.generer(conversation, message))
+
+    async def generer(self, conversation, message):
+        historique = self.conversations.setdefault(conversation, [])
+        historique.append(("user", message))
+        parts = []
+        try:
+            await self.send_json({"type": "debut", "conversation": conversation})
+            async for token in astream_chat(historique[-self.HISTORIQUE_MAX:]):
+                parts.append(token)
+                await self.send_json({"type": "token", "conversation": conversation, "contenu": token})
+            historique.append(("assistant", "".join(parts)))
+            await self.send_json({"type": "fin", "conversation": conversation})
+        except asyncio.CancelledError:
+            historique.pop()
+            await self._envoyer_si_ouvert({"type": "annule", "conversation": conversation})
+            raise
+        except LLMUnavailable:
+            historique.pop()
+            await self.send_json({"type": "erreur", "conversation": conversation, "code": 503,
+                                  "message": "Assistant momentanément indisponible, réessayez plus tard."})
+        except LLMBusy:
+            historique.pop()
+            await self.send_json({"type": "erreur", "conversation": conversation, "code": 429,
+                                  "message": "Assistant surchargé, réessayez dans quelques secondes."})
+        except Exception as exc:
+            historique.pop()
+            logger.exception("Erreur pendant le streaming du chatbot")
+            await self.send_json({"type": "erreur", "conversation": conversation, "message": str(exc)})
+        finally:
+            self.generations.pop(conversation, None)
+
+    async def _envoyer_si_ouvert(self, content):
+        try:
+            await self.send_json(content)
+        except Exception:
+            pass  # socket déjà fermé
 
-class UtilisateurViewSet(viewsets.ModelViewSet):
+
+class UtilisateurViewSet(SerializerPrefetchMixin, viewsets.ModelViewSet):
     queryset = Utilisateur.objects.all()
     serializer_class = UtilisateurSerializer
     #permission_classes = [AllowAny]
@@ -71,22 +243,27 @@ class UtilisateurViewSet(viewsets.ModelViewSet):
         serializer = LoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
         return Response({
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
+            **emettre_jetons(user),
             'user': UtilisateurSerializer(user).data
         })
 
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny])
+    def refresh(self, request):
+        """Nouveau jeton d'accès à partir du jeton de rafraîchissement ; rôle et coopératives relus en base."""
+        try:
+            access = rafraichir_acces(request.data.get('refresh', ''))
+        except (TokenError, KeyError, Utilisateur.DoesNotExist):
+            return Response({'error': 'Jeton de rafraîchissement invalide'}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({'access': access})
+
     @action(detail=False, methods=['post'], permission_classes=[AllowAny])
     def register(self, request):
         serializer = RegistrationSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
         return Response({
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
+            **emettre_jetons(user),
             'user': UtilisateurSerializer(user).data
         }, status=status.HTTP_201_CREATED)
 
@@ -118,7 +295,7 @@ class UtilisateurViewSet(viewsets.ModelViewSet):
         return Response({'success': 'Mot de passe changé avec succès'})
 
 
-class CooperativeViewSet(viewsets.ModelViewSet):
+class CooperativeViewSet(ConditionalGetMixin, VersionedCacheMixin, SerializerPrefetchMixin, viewsets.ModelViewSet):
     queryset = Cooperative.objects.all()
     serializer_class = CooperativeSerializer
     permission_classes = [AllowAny]
@@ -126,49 +303,94 @@ class CooperativeViewSet(viewsets.ModelViewSet):
     filterset_fields = ['nom', 'admin']
     search_fields = ['nom', 'description']
     ordering_fields = ['nom', 'date_creation']
+    cache_models = (Cooperative,)
 
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    @cached_view(Membre, Utilisateur, Cooperative)
     def membres(self, request, pk=None):
         cooperative = self.get_object()
-        membres = Membre.objects.filter(cooperative=cooperative)
+        membres = optimize_queryset(Membre.objects.filter(cooperative=cooperative), MembreSerializer)
         serializer = MembreSerializer(membres, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    @cached_view(Evenement, Cooperative)
     def evenements(self, request, pk=None):
         cooperative = self.get_object()
-        evenements = Evenement.objects.filter(cooperative=cooperative)
+        evenements = optimize_queryset(Evenement.objects.filter(cooperative=cooperative), EvenementSerializer)
         serializer = EvenementSerializer(evenements, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def statistiques(self, request, pk=None):
         cooperative = self.get_object()
-        nb_membres = Membre.objects.filter(cooperative=cooperative).count()
-        nb_membres_actifs = Membre.objects.filter(cooperative=cooperative, actif=True).count()
-        total_cotisations = Cotisation.objects.filter(
-            membre__cooperative=cooperative,
-            statut='validee'
-        ).aggregate(total=Sum('montant'))['total'] or 0
-        total_prets = Pret.objects.filter(
-            membre__cooperative=cooperative,
-            statut__in=['approuve', 'en_cours']
-        ).aggregate(total=Sum('montant'))['total'] or 0
-        total_remboursements = Remboursement.objects.filter(
-            pret__membre__cooperative=cooperative
-        ).aggregate(total=Sum('montant'))['total'] or 0
-        solde = float(total_cotisations) - float(total_prets) + float(total_remboursements)
+        bilan = BilanCooperative.pour(cooperative)
+        return Response({
+            'nb_membres': bilan.nb_membres,
+            'nb_membres_actifs': bilan.nb_membres_actifs,
+            'total_cotisations': bilan.total_cotisations,
+            'total_prets': bilan.total_prets,
+            'total_remboursements': bilan.total_remboursements,
+            'solde': bilan.solde
+        })
+
+    GRANULARITES = {'day': 'jour', 'month': 'mois'}
+    TIMESERIES_MAX_JOURS = 366
+
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny])
+    def timeseries(self, request, pk=None):
+        """
+        Séries du tableau de bord : ?granularity=day|month&from=AAAA-MM-JJ&to=AAAA-MM-JJ[&type=].
+        Lit uniquement SerieFinanciere (une plage d'index), le coût ne dépend pas de la profondeur
+        de l'historique. Par défaut : les 12 derniers mois, ou les 30 derniers jours.
+        """
+        params = request.query_params
+        granularite = self.GRANULARITES.get(params.get('granularity', 'month'))
+        if granularite is None:
+            return Response({'error': "granularity doit valoir 'day' ou 'month'."}, status=status.HTTP_400_BAD_REQUEST)
+        type_ = params.get('type')
+        if type_ is not None and type_ not in dict(SerieFinanciere.TYPE_CHOICES):
+            return Response({'error': f"Type inconnu : {type_}"}, status=status.HTTP_400_BAD_REQUEST)
+        bornes = {}
+        for nom in ('from', 'to'):
+            try:
+                bornes[nom] = parse_date(params[nom]) if params.get(nom) else None
+            except ValueError:
+                bornes[nom] = None
+            if params.get(nom) and bornes[nom] is None:
+                return Response({'error': f"Date invalide pour '{nom}' (AAAA-MM-JJ)."}, status=status.HTTP_400_BAD_REQUEST)
+        fin = bornes['to'] or timezone.localdate()
+        if granularite == 'mois':
+            mois = fin.year * 12 + fin.month - 12
+            debut = (bornes['from'] or fin.replace(year=mois // 12, month=mois % 12 + 1, day=1)).replace(day=1)
+        else:
+            debut = bornes['from'] or fin - timedelta(days=30)
+            if (fin - debut).days > self.TIMESERIES_MAX_JOURS:
+                return Response({'error': f"Au plus {self.TIMESERIES_MAX_JOURS} jours en granularité 'day'."},
+                                status=status.HTTP_400_BAD_REQUEST)
+        if debut > fin:
+            return Response({'error': "'from' doit précéder 'to'."}, status=status.HTTP_400_BAD_REQUEST)
+        if not str(pk).isdigit():
+            return Response({'error': 'Coopérative introuvable.'}, status=status.HTTP_404_NOT_FOUND)
+
+        lignes = SerieFinanciere.objects.filter(cooperative_id=pk, granularite=granularite, periode__range=(debut, fin))
+        if type_ is not None:
+            lignes = lignes.filter(type=type_)
+        series = {t: [] for t, _ in SerieFinanciere.TYPE_CHOICES if type_ in (None, t)}
+        for periode, t, total, nombre in lignes.order_by('periode', 'type').values_list('periode', 'type', 'total', 'nombre'):
+            series[t].append({'periode': periode, 'total': total, 'nombre': nombre})
+        if not any(series.values()) and not Cooperative.objects.filter(pk=pk).exists():
+            return Response({'error': 'Coopérative introuvable.'}, status=status.HTTP_404_NOT_FOUND)
         return Response({
-            'nb_membres': nb_membres,
-            'nb_membres_actifs': nb_membres_actifs,
-            'total_cotisations': total_cotisations,
-            'total_prets': total_prets,
-            'total_remboursements': total_remboursements,
-            'solde': solde
+            'cooperative': int(pk),
+            'granularity': params.get('granularity', 'month'),
+            'from': debut,
+            'to': fin,
+            'series': series,
         })
 
 
-class MembreViewSet(viewsets.ModelViewSet):
+class MembreViewSet(ConditionalGetMixin, SerializerPrefetchMixin, viewsets.ModelViewSet):
     queryset = Membre.objects.all()
     serializer_class = MembreSerializer
     permission_classes = [AllowAny]
@@ -176,6 +398,7 @@ class MembreViewSet(viewsets.ModelViewSet):
     filterset_fields = ['utilisateur', 'cooperative', 'actif']
     search_fields = ['utilisateur__username', 'utilisateur__first_name', 'utilisateur__last_name']
     ordering_fields = ['date_adhesion']
+    etag_fields = ('date_mise_a_jour', 'utilisateur__date_mise_a_jour', 'cooperative__date_mise_a_jour')
 
     def create(self, request, *args, **kwargs):
         print("Request data:", request.data)
@@ -192,36 +415,130 @@ class MembreViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def cotisations(self, request, pk=None):
         membre = self.get_object()
-        cotisations = Cotisation.objects.filter(membre=membre)
+        cotisations = optimize_queryset(Cotisation.objects.filter(membre=membre), CotisationSerializer)
         serializer = CotisationSerializer(cotisations, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def prets(self, request, pk=None):
         membre = self.get_object()
-        prets = Pret.objects.filter(membre=membre)
+        prets = optimize_queryset(Pret.objects.filter(membre=membre), PretSerializer)
         serializer = PretSerializer(prets, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def transactions(self, request, pk=None):
         membre = self.get_object()
-        transactions = Transaction.objects.filter(membre=membre)
+        transactions = optimize_queryset(Transaction.objects.filter(membre=membre), TransactionSerializer)
         serializer = TransactionSerializer(transactions, many=True)
         return Response(serializer.data)
 
 
-class CotisationViewSet(viewsets.ModelViewSet):
+class CotisationViewSet(ConditionalGetMixin, FastListMixin, BulkStatutMixin, CSVExportMixin, SerializerPrefetchMixin,
+                        viewsets.ModelViewSet):
     queryset = Cotisation.objects.all()
     serializer_class = CotisationSerializer
+    fast_list = True
     # permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['membre', 'type', 'statut']
     search_fields = ['membre__utilisateur__username', 'type']
     ordering_fields = ['date_paiement', 'montant']
-
-def chat(request):
+    etag_fields = ('date_mise_a_jour', 'membre__date_mise_a_jour', 'membre__utilisateur__date_mise_a_jour',
+                   'membre__cooperative__date_mise_a_jour')
+    export_fields = {
+        'id': 'id', 'membre': 'membre_id', 'utilisateur': 'membre__utilisateur__username',
+        'cooperative': 'membre__cooperative__nom', 'montant': 'montant',
+        'date_paiement': 'date_paiement', 'type': 'type', 'statut': 'statut',
+    }
+
+    transitions_statut = {'validee': ('en_attente',), 'rejetee': ('en_attente',)}
+    champs_statut = ('montant', 'date_paiement', 'membre_id', 'type')
+
+    BULK_MAX_LIGNES = 5000
+
+    def apres_statut(self, statut, lignes):
+        """Validation : bilan et séries crédités par coopérative, écritures COT-<id> en un INSERT (même transaction)."""
+        if statut != 'validee':
+            return
+        totaux = defaultdict(Decimal)
+        for ligne in lignes:
+            totaux[ligne['membre__cooperative_id']] += ligne['montant']
+        for cooperative_id, total in totaux.items():
+            BilanCooperative.appliquer(cooperative_id, total_cotisations=total)
+        SerieFinanciere.appliquer_lot('cotisation', [
+            (ligne['membre__cooperative_id'], ligne['date_paiement'], ligne['montant'], 1) for ligne in lignes
+        ])
+        Transaction.objects.bulk_create([
+            Cotisation.ecriture(ligne['pk'], ligne['montant'], ligne['membre_id'], ligne['type']) for ligne in lignes
+        ], ignore_conflicts=True)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Import en masse de cotisations collectées hors ligne.
+        Validation en une passe, un seul INSERT pour les cotisations et un pour les
+        transactions COT-<id> des lignes validées (les signaux par ligne sont court-circuités,
+        leurs effets — transactions et bilan — sont appliqués en lot).
+        """
+        debut = time.perf_counter()
+        lignes = request.data.get('cotisations') if isinstance(request.data, dict) else request.data
+        if not isinstance(lignes, list) or not lignes:
+            return Response({'error': 'Une liste de cotisations est requise.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(lignes) > self.BULK_MAX_LIGNES:
+            return Response({'error': f'Au plus {self.BULK_MAX_LIGNES} lignes par requête.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        ligne_serializer = CotisationBulkSerializer()
+        membres = Membre.objects.in_bulk(
+            {ligne.get('membre') for ligne in lignes if isinstance(ligne, dict) and str(ligne.get('membre', '')).isdigit()}
+        )
+        resultats, a_creer = [], []
+        for index, ligne in enumerate(lignes):
+            try:
+                donnees = ligne_serializer.run_validation(ligne)
+            except DRFValidationError as e:
+                resultats.append({'index': index, 'errors': e.detail})
+                continue
+            membre = membres.get(donnees.pop('membre'))
+            if membre is None:
+                resultats.append({'index': index, 'errors': {'membre': ['Membre introuvable.']}})
+                continue
+            resultats.append({'index': index})
+            a_creer.append((resultats[-1], Cotisation(membre=membre, **donnees)))
+
+        with transaction.atomic():
+            cotisations = Cotisation.objects.bulk_create([c for _, c in a_creer])
+            validees = [c for c in cotisations if c.statut == 'validee']
+            Transaction.objects.bulk_create([
+                Cotisation.ecriture(c.id, c.montant, c.membre_id, c.type) for c in validees
+            ])
+            totaux = defaultdict(Decimal)
+            for c in validees:
+                totaux[c.membre.cooperative_id] += c.montant
+            for cooperative_id, total in totaux.items():
+                BilanCooperative.appliquer(cooperative_id, total_cotisations=total)
+            SerieFinanciere.appliquer_lot('cotisation', [
+                (c.membre.cooperative_id, c.date_paiement, c.montant, 1) for c in validees
+            ])
+
+        for resultat, cotisation in a_creer:
+            resultat['id'] = cotisation.id
+        duree = time.perf_counter() - debut
+        return Response({
+            'crees': len(cotisations),
+            'rejetees': len(lignes) - len(cotisations),
+            'duree_ms': round(duree * 1000, 1),
+            'lignes_par_seconde': round(len(lignes) / duree) if duree else None,
+            'resultats': resultats,
+        }, status=status.HTTP_201_CREATED if cotisations else status.HTTP_400_BAD_REQUEST)
+
+async def chat(request):
+    """
+    Vue asynchrone : sous ASGI l'attente du LLM n'occupe aucun worker.
+    Les appels au fournisseur sont plafonnés par processus (429 si la file est pleine).
+    """
     # Récupérer le message envoyé par l'utilisateur
     user_message = request.GET.get("message", "")
 
@@ -229,19 +546,61 @@ def chat(request):
         return JsonResponse({"error": "Aucun message fourni."}, status=400)
 
     # Générer une réponse avec LangChain
-    response = chatbot_response(user_message)
+    try:
+        response = await achatbot_response(user_message)
+    except LLMUnavailable as exc:
+        response = JsonResponse({"error": "Assistant momentanément indisponible, réessayez plus tard."}, status=503)
+        response["Retry-After"] = str(int(exc.retry_after) or 1)
+        return response
+    except LLMBusy:
+        response = JsonResponse({"error": "Assistant surchargé, réessayez dans quelques secondes."}, status=429)
+        response["Retry-After"] = "5"
+        return response
 
     return JsonResponse({"response": response})
 
-class PretViewSet(viewsets.ModelViewSet):
+class PretViewSet(ConditionalGetMixin, BulkStatutMixin, CSVExportMixin, SerializerPrefetchMixin, viewsets.ModelViewSet):
     queryset = Pret.objects.all()
     serializer_class = PretSerializer
     permission_classes = [IsTresorier | IsAdmin | ReadOnly]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ["membre", "statut"]
-    ordering_fields = ["date_demande", "montant"]
-
-class RemboursementViewSet(viewsets.ModelViewSet):
+    ordering_fields = ["date_demande", "montant", "solde_restant"]
+    etag_fields = ("date_mise_a_jour", "membre__date_mise_a_jour", "membre__utilisateur__date_mise_a_jour",
+                   "membre__cooperative__date_mise_a_jour")
+    export_fields = {
+        "id": "id", "membre": "membre_id", "utilisateur": "membre__utilisateur__username",
+        "cooperative": "membre__cooperative__nom", "montant": "montant", "taux_interet": "taux_interet",
+        "date_demande": "date_demande", "date_approbation": "date_approbation",
+        "date_echeance": "date_echeance", "statut": "statut",
+        "montant_rembourse": "montant_rembourse", "solde_restant": "solde_restant",
+    }
+    transitions_statut = {"approuve": ("demande",), "rejete": ("demande",)}
+    champs_statut = ("montant",)
+
+    def valeurs_statut(self, statut):
+        valeurs = super().valeurs_statut(statut)
+        if statut == "approuve":
+            valeurs["date_approbation"] = self.date_approbation = valeurs["date_mise_a_jour"]
+        return valeurs
+
+    def apres_statut(self, statut, lignes):
+        """Décision : prêts approuvés portés au bilan et aux séries, une notification par emprunteur publiée en un lot."""
+        if statut == "approuve":
+            totaux = defaultdict(Decimal)
+            for ligne in lignes:
+                totaux[ligne["membre__cooperative_id"]] += ligne["montant"]
+            for cooperative_id, total in totaux.items():
+                BilanCooperative.appliquer(cooperative_id, total_prets=total)
+            SerieFinanciere.appliquer_lot("pret", [
+                (ligne["membre__cooperative_id"], self.date_approbation, ligne["montant"], 1) for ligne in lignes
+            ])
+        libelle = dict(Pret.STATUT_CHOICES)[statut].lower()
+        publish_many("pret_decision", [
+            {"pret": ligne["pk"], "montant": str(ligne["montant"]), "statut": libelle} for ligne in lignes
+        ])
+
+class RemboursementViewSet(SerializerPrefetchMixin, viewsets.ModelViewSet):
     queryset = Remboursement.objects.all()
     serializer_class = RemboursementSerializer
     permission_classes = [IsTresorier | IsAdmin | ReadOnly]
@@ -249,49 +608,132 @@ class RemboursementViewSet(viewsets.ModelViewSet):
     filterset_fields = ["pret", "methode_paiement"]
     ordering_fields = ["date_paiement", "montant"]
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(FastListMixin, CSVExportMixin, SerializerPrefetchMixin, viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
+    fast_list = True
     permission_classes = [IsTresorier | IsAdmin | ReadOnly]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ["membre", "type"]
     ordering_fields = ["date_transaction", "montant"]
-
-class NotificationViewSet(viewsets.ModelViewSet):
+    export_fields = {
+        "id": "id", "reference": "reference", "type": "type", "montant": "montant",
+        "date_transaction": "date_transaction", "membre": "membre_id",
+        "utilisateur": "membre__utilisateur__username", "cooperative": "membre__cooperative__nom",
+        "description": "description",
+    }
+    pagination_class = TransactionCursorPagination
+
+    @action(detail=False, methods=['get'])
+    def suspectes(self, request):
+        """Transactions dont le pré-score local (utils/anomalies.py) atteint le seuil (?seuil=)."""
+        try:
+            seuil = float(request.query_params.get('seuil', default_threshold()))
+        except ValueError:
+            return Response({'error': 'Seuil invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset()).filter(score_anomalie__score__gte=seuil)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class NotificationViewSet(SerializerPrefetchMixin, viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [IsSecretaire | IsAdmin | ReadOnly]  # ⇠ adapte si besoin
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ["utilisateur", "type", "lue"]
     ordering_fields = ["date_creation"]
-
-class EvenementViewSet(viewsets.ModelViewSet):
+    pagination_class = DateCreationCursorPagination
+
+    @action(detail=False, methods=["post"], permission_classes=[IsAuthenticated])
+    def mark_read(self, request):
+        """
+        Marque lues, en un seul UPDATE, les notifications de l'utilisateur connecté
+        ({"ids": [...]} et/ou {"avant": date}) ; le compteur de non-lus suit et n'est poussé qu'une fois.
+        """
+        serializer = MarquerLuSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queryset = _a_marquer(Notification.objects.filter(utilisateur=request.user, lue=False),
+                              "date_creation", serializer.validated_data)
+        with transaction.atomic():
+            nb = queryset.update(lue=True)
+            if nb:
+                # QuerySet.update ne passe pas par les signaux : compteur tenu ici
+                CompteurNonLus.appliquer(request.user.pk, notifications=-nb)
+                publish("non_lus", utilisateur=request.user.pk)
+        return Response({"marquees": nb})
+
+class EvenementViewSet(ConditionalGetMixin, VersionedCacheMixin, SerializerPrefetchMixin, viewsets.ModelViewSet):
     queryset = Evenement.objects.all()
     serializer_class = EvenementSerializer
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ["cooperative"]
     ordering_fields = ["date_debut", "date_fin"]
+    cache_models = (Evenement, Cooperative)
+    etag_fields = ("date_mise_a_jour", "cooperative__date_mise_a_jour")
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(SerializerPrefetchMixin, viewsets.ModelViewSet):
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ["expediteur", "destinataire", "lu"]
     ordering_fields = ["date_envoi"]
+    pagination_class = DateEnvoiCursorPagination
 
     def perform_create(self, serializer):
         # l’expéditeur = utilisateur connecté
         serializer.save(expediteur=self.request.user)
 
-class AuditViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def mark_read(self, request):
+        """
+        Marque lus, en un seul UPDATE, les messages reçus par l'utilisateur connecté
+        ({"ids": [...]} et/ou {"avant": date}) ; non-lus des conversations et compteur recalés ensuite.
+        """
+        serializer = MarquerLuSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queryset = _a_marquer(Message.objects.filter(destinataire=request.user, lu=False),
+                              'date_envoi', serializer.validated_data)
+        with transaction.atomic():
+            nb = queryset.update(lu=True)
+            if nb:
+                Conversation.recompter_non_lus(request.user.pk)
+                CompteurNonLus.appliquer(request.user.pk, messages=-nb)
+                publish("non_lus", utilisateur=request.user.pk)
+        return Response({'marques': nb})
+
+    @action(detail=False, methods=['get'])
+    def conversations(self, request):
+        """Boîte de réception : une entrée par correspondant, la plus récente d'abord (une requête par page)."""
+        queryset = optimize_queryset(
+            ParticipantConversation.objects.filter(utilisateur=request.user), ConversationSerializer
+        )
+        paginator = ConversationCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = ConversationSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path=r'conversations/(?P<conversation_id>\d+)')
+    def fil(self, request, conversation_id=None):
+        """Messages d'une conversation de l'utilisateur, par curseur (date_envoi, id)."""
+        if not ParticipantConversation.objects.filter(
+            conversation_id=conversation_id, utilisateur=request.user
+        ).exists():
+            return Response({'error': 'Conversation introuvable'}, status=status.HTTP_404_NOT_FOUND)
+        page = self.paginate_queryset(self.get_queryset().filter(conversation_id=conversation_id))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class AuditViewSet(SerializerPrefetchMixin, viewsets.ModelViewSet):
     queryset = Audit.objects.all()
     serializer_class = AuditSerializer
     permission_classes = [IsAdmin | ReadOnly]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ["type", "utilisateur"]
     ordering_fields = ["date_creation"]
+    pagination_class = DateCreationCursorPagination
 
     def perform_create(self, serializer):
         serializer.save(utilisateur=self.request.user if self.request.user.is_authenticated else None)
\ No newline at end of file